@@ -0,0 +1,118 @@
+import asyncio
+from collections import deque
+from typing import Any, List, Optional
+from inference_pool import ModelPool
+
+
+class MicroBatcher:
+    """
+    Динамический микро-батчинг для одной стадии конвейера.
+    Одновременные запросы собираются в батч, пока он не наберёт max_batch_size
+    элементов или не истечёт max_wait_ms с момента прихода первого из них.
+    Батч выполняется одним проходом модели в пуле стадии, результаты
+    раздаются ожидающим запросам.
+    """
+
+    def __init__(
+        self,
+        pool: ModelPool,
+        method: str,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+    ):
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be positive, got {max_batch_size}")
+
+        self.pool = pool
+        self.method = method
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        # Элементы очереди: (время постановки, входные данные, future для результата)
+        self._pending: deque = deque()
+        self._event: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._batches: set = set()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    async def start(self) -> None:
+        self._event = asyncio.Event()
+        # Не отправляем в пул больше батчей, чем в нём воркеров: пока воркеры заняты,
+        # новые запросы продолжают копиться и уходят следующим, более крупным батчем
+        self._slots = asyncio.Semaphore(self.pool.num_workers)
+        self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        await asyncio.gather(*self._batches, return_exceptions=True)
+
+        while self._pending:
+            _, _, future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher was stopped"))
+
+    async def submit(self, item: Any) -> Any:
+        """Ставит элемент в очередь стадии и ждёт его результат."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((loop.time(), item, future))
+        self._event.set()
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self._pending:
+                self._event.clear()
+                await self._event.wait()
+
+            await self._slots.acquire()
+
+            # Добираем батч до максимального размера, пока не истёк срок ожидания первого элемента
+            deadline = self._pending[0][0] + self.max_wait
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._event.clear()
+                try:
+                    await asyncio.wait_for(self._event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [
+                self._pending.popleft()
+                for _ in range(min(len(self._pending), self.max_batch_size))
+            ]
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[tuple]) -> None:
+        try:
+            # Запросы, отменённые клиентом, не отправляем в модель
+            batch = [entry for entry in batch if not entry[2].done()]
+            if not batch:
+                return
+
+            items = [item for _, item, _ in batch]
+            try:
+                results = await self.pool.run(self.method, items)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            for (_, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
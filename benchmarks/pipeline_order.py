@@ -0,0 +1,164 @@
+import argparse
+import csv
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Запускается из корня репозитория: python benchmarks/pipeline_order.py data/labelled
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import settings
+from image_io import SUPPORTED_EXTENSIONS, open_pages
+from pipeline import run_stages
+
+# Одна запись разметки: путь к файлу, тип документа, число подписей (если известно)
+Sample = Tuple[str, str, Optional[int]]
+
+
+def load_samples(folder: str) -> List[Sample]:
+    """
+    Разметка берётся из folder/labels.csv (колонки filename, document_type и
+    необязательная number_of_signatures), а если его нет - из имён подпапок
+    (folder/handwritten/*, folder/printed/*).
+    """
+    labels_path = os.path.join(folder, "labels.csv")
+    samples = []
+
+    if os.path.exists(labels_path):
+        with open(labels_path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                count = row.get("number_of_signatures")
+                samples.append((
+                    os.path.join(folder, row["filename"]),
+                    row["document_type"],
+                    int(count) if count not in (None, "") else None,
+                ))
+        return samples
+
+    for doc_type in sorted(os.listdir(folder)):
+        class_dir = os.path.join(folder, doc_type)
+        if not os.path.isdir(class_dir):
+            continue
+        for name in sorted(os.listdir(class_dir)):
+            if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                samples.append((os.path.join(class_dir, name), doc_type, None))
+    return samples
+
+
+def load_first_page(path: str):
+    # Разметка относится к документу целиком, оцениваем по первой странице
+    with open(path, "rb") as f:
+        content = f.read()
+    _, pages = open_pages(content, os.path.splitext(path)[1].lower())
+    return next(pages)
+
+
+def evaluate(models, samples: List[Sample], order: str, thumbnail_size: int) -> dict:
+    """Прогоняет все документы по одному и собирает точность и задержку конвейера."""
+    image_processor, classificator, detector = models
+    latencies = []
+    type_correct = 0
+    count_correct = 0
+    count_total = 0
+    skipped = 0
+
+    # Прогрев, чтобы первая загрузка ядер не попала в замеры
+    run_stages(image_processor, classificator, detector, [load_first_page(samples[0][0])],
+               order, thumbnail_size)
+
+    for path, doc_type, signature_count in samples:
+        # Декодирование одинаково для обоих порядков, поэтому в задержку не входит
+        image = load_first_page(path)
+        start = time.perf_counter()
+        result = run_stages(image_processor, classificator, detector, [image], order, thumbnail_size)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        type_correct += result["document_type"] == doc_type
+        skipped += result["document_type"] == "handwritten"
+        if signature_count is not None and doc_type != "handwritten":
+            count_total += 1
+            count_correct += result["number_of_signatures"] == signature_count
+
+    latencies.sort()
+    return {
+        "order": order,
+        "thumbnail_size": thumbnail_size if order == "classify_first" else 0,
+        "documents": len(samples),
+        "type_accuracy": type_correct / len(samples),
+        "signature_count_accuracy": count_correct / count_total if count_total else None,
+        "predicted_handwritten": skipped,
+        "mean_ms": statistics.fmean(latencies),
+        "median_ms": statistics.median(latencies),
+        "p90_ms": latencies[min(int(len(latencies) * 0.9), len(latencies) - 1)],
+        "total_s": sum(latencies) / 1000,
+    }
+
+
+def load_models():
+    from detector import SignatureDetector
+    from classificator import DocumentClassificator
+    from pipeline import image_processor_class
+
+    return (
+        image_processor_class()(settings.ORIENTATION_MODEL_PATH),
+        DocumentClassificator(settings.CLASSIFICATOR_MODEL_PATH),
+        SignatureDetector(
+            settings.SIGNATURE_MODEL_PATH,
+            settings.IOU_THRESHOLD,
+            settings.DETECTION_CONF_THRESHOLD,
+            settings.DETECTION_MAX_CANDIDATES or None,
+        ),
+    )
+
+
+def parse_int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare accuracy and latency of pipeline stage orderings on a labelled folder."
+    )
+    parser.add_argument("folder", type=str, help="Folder with labels.csv or handwritten/ and printed/ subfolders.")
+    parser.add_argument(
+        "--thumbnail-sizes",
+        type=parse_int_list,
+        default=[0, 224, 320],
+        help="Comma-separated classification thumbnail sizes to try with classify_first (0 - original image).",
+    )
+    parser.add_argument("--limit", type=int, default=None, help="Evaluate only the first N documents.")
+    parser.add_argument("--output", type=str, default=None, help="Where to save the JSON report.")
+    args = parser.parse_args()
+
+    samples = load_samples(args.folder)[: args.limit]
+    if not samples:
+        sys.exit(f"No labelled documents found in {args.folder}")
+
+    print(f"Loading models, evaluating {len(samples)} documents...")
+    models = load_models()
+
+    configurations = [("orientation_first", 0)]
+    configurations += [("classify_first", size) for size in args.thumbnail_sizes]
+
+    report: List[Dict[str, object]] = []
+    for order, thumbnail_size in configurations:
+        stats = evaluate(models, samples, order, thumbnail_size)
+        report.append(stats)
+        count_accuracy = stats["signature_count_accuracy"]
+        print(
+            f"  {order:<18} thumb {stats['thumbnail_size']:>4}  "
+            f"type acc {stats['type_accuracy']:.3f}  "
+            f"count acc {'n/a' if count_accuracy is None else f'{count_accuracy:.3f}'}  "
+            f"median {stats['median_ms']:8.1f} ms  p90 {stats['p90_ms']:8.1f} ms  "
+            f"total {stats['total_s']:7.1f} s"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.output}")
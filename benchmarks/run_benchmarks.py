@@ -0,0 +1,289 @@
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+# Бенчмарки запускаются из корня репозитория: python benchmarks/run_benchmarks.py run
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+# Тяжёлые зависимости (numpy, PIL, torch) импортируются внутри функций замеров,
+# поэтому команда compare работает и без них
+import settings
+
+BASELINES_DIR = os.path.join(ROOT_DIR, "benchmarks", "baselines")
+NMS_BOX_COUNTS = [10, 100, 1000, 10000]
+BATCH_SIZES = [1, 4, 16]
+
+
+def measure(function: Callable[[], object], repeats: int, warmup: int = 1) -> dict:
+    """Запускает функцию warmup + repeats раз и возвращает статистику по времени в мс."""
+    for _ in range(warmup):
+        function()
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    return {
+        "median_ms": statistics.median(timings),
+        "p90_ms": timings[min(int(len(timings) * 0.9), len(timings) - 1)],
+        "min_ms": timings[0],
+        "repeats": repeats,
+    }
+
+
+def encode(image, image_format: str) -> bytes:
+    buffer = io.BytesIO()
+    options = {"quality": 90} if image_format == "JPEG" else {}
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def bench_decode(work_dir: str, repeats: int) -> Dict[str, dict]:
+    from benchmarks.synthetic import PAGE_SIZES, make_document
+    from image_io import decode_image
+    from orientation_detector import add_detection_path
+    add_detection_path()
+    from src.utils import load_image_safely
+
+    results = {}
+    for page_name, size in PAGE_SIZES.items():
+        document = make_document(size, seed=1)
+        for image_format, extension in (("PNG", ".png"), ("JPEG", ".jpg")):
+            content = encode(document, image_format)
+            path = os.path.join(work_dir, f"{page_name}{extension}")
+            with open(path, "wb") as f:
+                f.write(content)
+
+            results[f"decode/{image_format.lower()}/{page_name}"] = measure(
+                lambda: decode_image(content), repeats
+            )
+            results[f"load_image_safely/{image_format.lower()}/{page_name}"] = measure(
+                lambda: load_image_safely(path), repeats
+            )
+    return results
+
+
+def bench_val_transform(repeats: int) -> Dict[str, dict]:
+    from benchmarks.synthetic import PAGE_SIZES, make_document
+    from orientation_detector import add_detection_path
+    add_detection_path()
+    from src.utils import get_data_transforms
+
+    transform = get_data_transforms()["val"]
+    results = {}
+    for page_name, size in PAGE_SIZES.items():
+        document = make_document(size, seed=2)
+        results[f"val_transform/{page_name}"] = measure(lambda: transform(document), repeats)
+    return results
+
+
+def orientation_model_path(work_dir: str) -> str:
+    """Обученная модель, если она есть, иначе случайно инициализированная (на задержку веса не влияют)."""
+    if os.path.exists(settings.ORIENTATION_MODEL_PATH):
+        return settings.ORIENTATION_MODEL_PATH
+
+    import torch
+    from orientation_detector import add_detection_path
+    add_detection_path()
+    from src.model import get_orientation_model
+
+    torch.manual_seed(0)
+    path = os.path.join(work_dir, "orientation_random.pth")
+    torch.save(get_orientation_model(pretrained=False).state_dict(), path)
+    return path
+
+
+def bench_orientation(work_dir: str, repeats: int) -> Dict[str, dict]:
+    from benchmarks.synthetic import PAGE_SIZES, make_document
+    from orientation_detector import OrientationDetector
+
+    detector = OrientationDetector(orientation_model_path(work_dir))
+    results = {}
+    for page_name, size in PAGE_SIZES.items():
+        document = make_document(size, seed=3)
+        results[f"orientation/predict_orientation/{page_name}"] = measure(
+            lambda: detector.predict_orientation(document), repeats
+        )
+    return results
+
+
+def bench_nms(repeats: int, box_counts: List[int]) -> Dict[str, dict]:
+    from benchmarks.synthetic import make_boxes
+    from detector import SignatureDetector
+
+    # Для NMS модель не нужна: создаём объект без загрузки весов
+    detector = SignatureDetector.__new__(SignatureDetector)
+    detector.iou_threshold = settings.IOU_THRESHOLD
+    detector.max_candidates = None
+
+    results = {}
+    for count in box_counts:
+        boxes, confidences = make_boxes(count, seed=count)
+        # На больших количествах рамок NMS всё равно остаётся квадратичным
+        count_repeats = repeats if count <= 1000 else max(1, repeats // 5)
+        results[f"nms/{count}"] = measure(
+            lambda: detector._non_max_suppression(boxes, confidences), count_repeats
+        )
+    return results
+
+
+def yolo_model_path(path: str, fallback_config: str) -> str:
+    # Без обученных весов используем архитектуру из конфигурации ultralytics (работает офлайн)
+    return path if os.path.exists(path) else fallback_config
+
+
+def bench_yolo(repeats: int, batch_sizes: List[int]) -> Dict[str, dict]:
+    from benchmarks.synthetic import PAGE_SIZES, make_document
+    from classificator import DocumentClassificator
+    from detector import SignatureDetector
+
+    classificator = DocumentClassificator(
+        yolo_model_path(settings.CLASSIFICATOR_MODEL_PATH, "yolov8n-cls.yaml")
+    )
+    detector = SignatureDetector(
+        yolo_model_path(settings.SIGNATURE_MODEL_PATH, "yolov8n.yaml"), settings.IOU_THRESHOLD
+    )
+
+    document = make_document(PAGE_SIZES["a4_150dpi"], seed=4)
+    results = {}
+    for batch_size in batch_sizes:
+        images = [document] * batch_size
+        results[f"classification/batch_{batch_size}"] = measure(
+            lambda: classificator.classify_documents(images), repeats
+        )
+        results[f"detection/batch_{batch_size}"] = measure(
+            lambda: detector.count_signatures_batch(images), repeats
+        )
+    return results
+
+
+def environment() -> dict:
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    try:
+        import torch
+
+        info["torch"] = torch.__version__
+        info["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        pass
+    return info
+
+
+GROUPS = ["decode", "val_transform", "orientation", "nms", "yolo"]
+
+
+def run(args) -> None:
+    groups = args.only or GROUPS
+    results = {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for group in groups:
+            print(f"Running '{group}' benchmarks...")
+            if group == "decode":
+                results.update(bench_decode(work_dir, args.repeats))
+            elif group == "val_transform":
+                results.update(bench_val_transform(args.repeats))
+            elif group == "orientation":
+                results.update(bench_orientation(work_dir, args.repeats))
+            elif group == "nms":
+                results.update(bench_nms(args.repeats, args.nms_box_counts))
+            elif group == "yolo":
+                results.update(bench_yolo(args.repeats, args.batch_sizes))
+
+    for name, stats in sorted(results.items()):
+        print(f"  {name:<45} median {stats['median_ms']:10.3f} ms   p90 {stats['p90_ms']:10.3f} ms")
+
+    output = args.output or os.path.join(BASELINES_DIR, f"{platform.node() or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2, sort_keys=True)
+    print(f"Results saved to {output}")
+
+
+def compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    with open(args.current) as f:
+        current = json.load(f)["results"]
+
+    regressions = []
+    for name in sorted(set(baseline) & set(current)):
+        before = baseline[name]["median_ms"]
+        after = current[name]["median_ms"]
+        ratio = after / before if before > 0 else float("inf")
+        status = "ok"
+        if ratio > 1 + args.tolerance:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - args.tolerance:
+            status = "improved"
+        print(f"  {name:<45} {before:10.3f} -> {after:10.3f} ms  x{ratio:6.2f}  {status}")
+
+    for name in sorted(set(baseline) - set(current)):
+        print(f"  {name:<45} missing in current run")
+
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}.")
+        return 1
+    print("No regressions beyond tolerance.")
+    return 0
+
+
+def parse_int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Component micro-benchmarks for the signature service.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run benchmarks and save results as JSON.")
+    run_parser.add_argument("--only", nargs="+", choices=GROUPS, help="Benchmark groups to run.")
+    run_parser.add_argument("--repeats", type=int, default=20, help="Timed repetitions per benchmark.")
+    run_parser.add_argument(
+        "--nms-box-counts",
+        type=parse_int_list,
+        default=NMS_BOX_COUNTS,
+        help="Comma-separated candidate box counts for the NMS benchmark.",
+    )
+    run_parser.add_argument(
+        "--batch-sizes",
+        type=parse_int_list,
+        default=BATCH_SIZES,
+        help="Comma-separated batch sizes for classification and detection.",
+    )
+    run_parser.add_argument("--output", type=str, default=None, help="Where to save the JSON results.")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two result files.")
+    compare_parser.add_argument("baseline", type=str, help="Baseline JSON file.")
+    compare_parser.add_argument("current", type=str, help="JSON file of the current run.")
+    compare_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.10,
+        help="Allowed relative slowdown of the median before it counts as a regression.",
+    )
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
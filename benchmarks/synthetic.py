@@ -0,0 +1,76 @@
+import random
+from typing import Tuple
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Размеры страниц A4 при типичных разрешениях сканирования
+PAGE_SIZES = {
+    "a4_150dpi": (1240, 1754),
+    "a4_300dpi": (2480, 3508),
+}
+
+
+def make_document(size: Tuple[int, int], seed: int = 0) -> Image.Image:
+    """
+    Генерирует синтетический скан документа: строки "слов" в виде тёмных
+    прямоугольников, рамки таблиц и несколько росчерков, похожих на подписи.
+    Для одного и того же seed результат всегда одинаковый.
+    """
+    rng = random.Random(seed)
+    width, height = size
+    image = Image.new("RGB", size, (250, 250, 248))
+    draw = ImageDraw.Draw(image)
+
+    margin = width // 12
+    line_height = max(height // 60, 8)
+    y = margin
+    while y < height * 0.8:
+        x = margin
+        while x < width - margin:
+            word_width = rng.randint(line_height, line_height * 5)
+            shade = rng.randint(10, 60)
+            draw.rectangle(
+                [x, y, min(x + word_width, width - margin), y + line_height // 2],
+                fill=(shade, shade, shade),
+            )
+            x += word_width + line_height // 2
+        y += line_height
+
+    # Рамка таблицы в нижней части страницы
+    draw.rectangle(
+        [margin, int(height * 0.82), width - margin, int(height * 0.95)],
+        outline=(0, 0, 0),
+        width=max(width // 600, 1),
+    )
+
+    # Росчерки-"подписи"
+    for _ in range(3):
+        cx = rng.randint(margin, width - 4 * margin)
+        cy = rng.randint(int(height * 0.83), int(height * 0.93))
+        points = [
+            (cx + i * width // 80, cy + rng.randint(-line_height, line_height))
+            for i in range(12)
+        ]
+        draw.line(points, fill=(20, 30, 120), width=max(width // 400, 2))
+
+    return image
+
+
+def make_boxes(count: int, size: Tuple[int, int] = (2480, 3508), seed: int = 0):
+    """
+    Генерирует count рамок-кандидатов и их уверенности. Рамки собраны в кластеры,
+    как у реального детектора, чтобы NMS было что подавлять.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    clusters = max(count // 10, 1)
+    centers = rng.uniform([0, 0], [width, height], size=(clusters, 2))
+    assignment = rng.integers(0, clusters, size=count)
+    box_centers = centers[assignment] + rng.normal(0, 15, size=(count, 2))
+    box_sizes = rng.uniform([150, 40], [400, 120], size=(count, 2))
+
+    boxes = np.concatenate(
+        [box_centers - box_sizes / 2, box_centers + box_sizes / 2], axis=1
+    ).astype(np.float32)
+    confidences = rng.uniform(0.25, 0.99, size=count).astype(np.float32)
+    return list(boxes), list(confidences)
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import os
+import tarfile
+import zipfile
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+from starlette.datastructures import UploadFile
+from image_io import SUPPORTED_EXTENSIONS
+from pipeline import SignaturePipeline
+from metrics import STAGE_SECONDS
+import settings
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz")
+
+
+def _is_supported_image(filename: str) -> bool:
+    return os.path.splitext(filename)[1].lower() in SUPPORTED_EXTENSIONS
+
+
+def _read_upload(upload: UploadFile) -> bytes:
+    with STAGE_SECONDS.time("upload_read"):
+        return upload.file.read()
+
+
+# Документ загрузки: (имя файла, содержимое, ошибка). Если член архива прочитать
+# нельзя, содержимое None, а ошибка попадает в результат только этого документа
+UploadDocument = Tuple[str, Optional[bytes], Optional[str]]
+
+
+def _member_size_error(name: str, size: int) -> Optional[str]:
+    if size > settings.BULK_MAX_MEMBER_BYTES:
+        return f"Archive member {name} is larger than {settings.BULK_MAX_MEMBER_BYTES} bytes"
+    return None
+
+
+def _iter_zip_members(fileobj) -> Iterator[UploadDocument]:
+    # Zip читается по центральному каталогу, но члены архива распаковываются
+    # по одному и только тогда, когда до них доходит очередь
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not _is_supported_image(info.filename):
+                continue
+            error = _member_size_error(info.filename, info.file_size)
+            if error:
+                yield info.filename, None, error
+                continue
+            with STAGE_SECONDS.time("upload_read"), archive.open(info) as member:
+                content = member.read(settings.BULK_MAX_MEMBER_BYTES + 1)
+            # Размер в каталоге zip может не совпадать с реальным
+            error = _member_size_error(info.filename, len(content))
+            if error:
+                yield info.filename, None, error
+            else:
+                yield info.filename, content, None
+
+
+def _iter_tar_members(fileobj) -> Iterator[UploadDocument]:
+    # Потоковый режим "r|*": архив читается последовательно, без произвольного доступа.
+    # Пропущенный слишком большой член tarfile перематывает сам при переходе к следующему
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile() or not _is_supported_image(member.name):
+                continue
+            error = _member_size_error(member.name, member.size)
+            if error:
+                yield member.name, None, error
+                continue
+            with STAGE_SECONDS.time("upload_read"):
+                content = archive.extractfile(member).read()
+            yield member.name, content, None
+
+
+def iter_upload_documents(upload: UploadFile) -> Iterator[UploadDocument]:
+    """
+    Перебирает документы одной загрузки: само изображение или члены zip/tar архива.
+    Возвращает тройки (имя файла, содержимое, ошибка): слишком большой член архива
+    отдаётся с ошибкой вместо содержимого, и перебор продолжается. Блокирующий генератор.
+    """
+    filename = upload.filename or ""
+    lower_name = filename.lower()
+
+    if lower_name.endswith(".zip"):
+        yield from _iter_zip_members(upload.file)
+    elif lower_name.endswith(ARCHIVE_EXTENSIONS):
+        yield from _iter_tar_members(upload.file)
+    elif _is_supported_image(filename):
+        yield filename, _read_upload(upload), None
+    else:
+        raise ValueError("Unsupported file format")
+
+
+def _to_line(record: dict) -> bytes:
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def stream_bulk_results(
+    pipeline: SignaturePipeline, uploads: List[UploadFile]
+) -> AsyncIterator[bytes]:
+    """
+    Прогоняет документы из загрузок через конвейер параллельно и отдаёт по одной
+    строке JSON на документ по мере готовности (порядок не сохраняется).
+    Одновременно в памяти находится не больше BULK_CONCURRENCY документов.
+    """
+    results: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(settings.BULK_CONCURRENCY)
+    tasks = set()
+
+    async def process_document(record: dict, content: bytes) -> None:
+        try:
+            extension = os.path.splitext(record["filename"])[1].lower()
+            record.update(await pipeline.process_document(content, extension))
+        except Exception as e:
+            record["error"] = f"Processing error: {str(e)}"
+        finally:
+            slots.release()
+        await results.put(record)
+
+    async def produce() -> None:
+        try:
+            for upload in uploads:
+                documents = iter_upload_documents(upload)
+                while True:
+                    # Слот занимаем до чтения следующего документа, чтобы не держать
+                    # в памяти больше документов, чем обрабатывается
+                    await slots.acquire()
+                    try:
+                        document = await asyncio.to_thread(next, documents, None)
+                    except Exception as e:
+                        slots.release()
+                        await results.put(
+                            {"filename": upload.filename, "error": f"Could not read upload: {str(e)}"}
+                        )
+                        break
+                    if document is None:
+                        slots.release()
+                        break
+
+                    name, content, error = document
+                    record = {"filename": name}
+                    if name != upload.filename:
+                        record["archive"] = upload.filename
+                    if error:
+                        slots.release()
+                        record["error"] = error
+                        await results.put(record)
+                        continue
+                    task = asyncio.create_task(process_document(record, content))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+
+            await asyncio.gather(*tasks)
+        finally:
+            await results.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            record = await results.get()
+            if record is None:
+                break
+            yield _to_line(record)
+    finally:
+        # Клиент мог отключиться: останавливаем чтение и обработку оставшихся документов
+        producer.cancel()
+        for task in list(tasks):
+            task.cancel()
+        await asyncio.gather(producer, *tasks, return_exceptions=True)
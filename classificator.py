@@ -1,19 +1,29 @@
-from ultralytics import YOLO
-import os
+from typing import List
+from PIL import Image
+from metrics import STAGE_SECONDS
+from yolo_backends import load_yolo_backend
 
 class DocumentClassificator:
     def __init__(self, model_path: str = "models/classificator.pt"):
-        self.model = YOLO(model_path)
+        # .pt - ultralytics, .onnx / OpenVINO IR - экспортированная модель (см. export_models.py)
+        self.backend = load_yolo_backend(model_path)
         self.class_names = {0: "handwritten", 1: "printed"}
     
-    def classify_document(self, image_path: str) -> str:
+    def classify_document(self, image: Image.Image) -> str:
         """Классифицирует документ и возвращает его тип."""
-        results = self.model(image_path, verbose=False)
+        return self.classify_documents([image])[0]
+
+    def classify_documents(self, images: List[Image.Image]) -> List[str]:
+        """Классифицирует пачку документов за один проход модели и возвращает их типы."""
+        with STAGE_SECONDS.time("classification"):
+            # Индекс класса с наибольшей вероятностью (None, если вероятностей нет)
+            top1_classes = self.backend.classify(images)
         
-        for r in results:
-            if r.probs is not None:
-                # Получаем индекс класса с наибольшей вероятностью
-                class_id = r.probs.top1
-                return self.class_names.get(class_id, "uknown")
+        doc_types = []
+        for class_id in top1_classes:
+            if class_id is not None:
+                doc_types.append(self.class_names.get(class_id, "uknown"))
+            else:
+                doc_types.append("uknown")
         
-        return "uknown"
\ No newline at end of file
+        return doc_types
@@ -0,0 +1,103 @@
+import argparse
+import json
+import multiprocessing
+import resource
+import statistics
+import sys
+import time
+
+import config
+from src.inference import iter_image_files
+
+# name -> (decoder, decode at reduced resolution)
+VARIANTS = {
+    "pil-full": ("pil", False),
+    "pil": ("pil", True),
+    "opencv-full": ("opencv", False),
+    "opencv": ("opencv", True),
+}
+
+
+def _peak_rss_mb():
+    """Peak resident set size of the current process (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_variant(variant, paths, target_size, results):
+    """Decodes every image once in a fresh process and reports timing and peak RSS."""
+    from src.utils import load_image_safely
+
+    decoder, reduced = VARIANTS[variant]
+    # Import cost (torch, PIL, cv2) is excluded from the decode peak below
+    if decoder == "opencv":
+        import cv2  # noqa: F401
+    baseline_rss = _peak_rss_mb()
+
+    timings, pixels = [], 0
+    for path in paths:
+        start = time.perf_counter()
+        image = load_image_safely(path, target_size if reduced else None, decoder)
+        timings.append((time.perf_counter() - start) * 1000)
+        pixels += image.width * image.height
+        del image
+
+    peak_rss = _peak_rss_mb()
+    results[variant] = {
+        "images": len(paths),
+        "total_s": sum(timings) / 1000,
+        "median_ms": statistics.median(timings),
+        "mean_megapixels": pixels / len(paths) / 1e6,
+        "baseline_rss_mb": baseline_rss,
+        "peak_rss_mb": peak_rss,
+        "decode_peak_rss_mb": peak_rss - baseline_rss,
+    }
+
+
+def run_benchmark(args):
+    paths = []
+    for path in iter_image_files(args.input_dir):
+        paths.append(path)
+        if args.limit and len(paths) >= args.limit:
+            break
+    if not paths:
+        raise SystemExit(f"No images found in {args.input_dir}")
+
+    print(f"Decoding {len(paths)} images, target size {args.target_size}px")
+    # Each variant runs in its own process, so peak RSS is not inherited from the previous one
+    context = multiprocessing.get_context("spawn")
+    results = context.Manager().dict()
+    for variant in args.variants:
+        process = context.Process(target=run_variant, args=(variant, paths, args.target_size, results))
+        process.start()
+        process.join()
+        if variant not in results:
+            print(f"  {variant:<12} failed (exit code {process.exitcode})")
+            continue
+        stats = results[variant]
+        print(
+            f"  {variant:<12} total {stats['total_s']:8.2f} s  median {stats['median_ms']:7.1f} ms  "
+            f"{stats['mean_megapixels']:6.2f} MP/image  peak RSS +{stats['decode_peak_rss_mb']:7.1f} MB"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"target_size": args.target_size, "variants": dict(results)}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare decode time and peak memory of the image decoders in load_image_safely."
+    )
+    parser.add_argument("--input_dir", type=str, default=config.DATA_DIR, help="Folder of images (searched recursively).")
+    parser.add_argument("--limit", type=int, default=500, help="Decode at most this many images (0 = all).")
+    parser.add_argument(
+        "--target_size",
+        type=int,
+        default=config.DECODE_TARGET_SIZE,
+        help="Smallest side kept by the reduced-resolution variants.",
+    )
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=list(VARIANTS))
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON file for the results.")
+    run_benchmark(parser.parse_args())
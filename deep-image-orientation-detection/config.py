@@ -1,15 +1,46 @@
 USE_CACHE = False  # This is much faster for training, but requires disk space.
 CACHE_DIR = "data/cache"
+CACHE_MAX_BYTES = 0  # Disk budget of the PNG cache; the oldest entries are evicted above it (0 = unlimited)
+# "png": one full-resolution PNG per rotation in CACHE_DIR.
+# "shards": pre-resized uint8 arrays packed into memory-mapped shards in SHARD_CACHE_DIR.
+CACHE_FORMAT = "png"
+SHARD_CACHE_DIR = "data/cache_shards"
+SHARD_SIZE = 4096  # Samples per shard file
+# Without a cache: decode each source image once and train on all of its rotations together
+# (batches then hold BATCH_SIZE // 4 images with their 4 rotations each).
+GROUPED_ROTATIONS = False
 
 # --- Dataloader and Preprocessing ---
 DATA_DIR = "data/upright_images"
 IMAGE_SIZE = 384
+# Images are decoded at a reduced resolution that still covers IMAGE_SIZE + 32 (see load_image_safely).
+# "pil" uses JPEG draft mode + Image.reduce, "opencv" uses OpenCV's libjpeg-turbo reduced decoding for JPEGs.
+IMAGE_DECODER = "pil"
+DECODE_TARGET_SIZE = IMAGE_SIZE + 32
 BATCH_SIZE = 512  # Or More (eg. 512), depending on your GPU memory
 NUM_WORKERS = 16  # Or More (eg. 16), depending on your CPU cores
 
+# --- CPU Training (train.py on a machine without a GPU, or with --cpu) ---
+CPU_BATCH_SIZE = 64  # BATCH_SIZE is sized for GPU memory; smaller batches step faster on CPU
+CPU_NUM_WORKERS = 4  # Dataloader workers; the remaining cores go to the model's intra-op threads
+CPU_NUM_THREADS = 0  # Intra-op threads for the forward/backward pass (0 = cores left after the workers)
+# torch.compile mode per device ("none" disables compilation). "reduce-overhead" relies on
+# CUDA graphs, so on CPU the regular inductor C++ backend ("default") is used instead.
+COMPILE_MODE = {"cuda": "reduce-overhead", "cpu": "default", "mps": "default"}
+
+# --- Profiling (train.py --profile) ---
+# The torch.profiler trace skips PROFILE_WAIT_STEPS (compilation, worker start-up), warms up
+# for PROFILE_WARMUP_STEPS and records PROFILE_ACTIVE_STEPS training steps.
+PROFILE_WAIT_STEPS = 10
+PROFILE_WARMUP_STEPS = 3
+PROFILE_ACTIVE_STEPS = 5
+PROFILE_TOP_OPERATORS = 15  # Rows of the operator table written to TensorBoard
+PROFILE_DATA_SAMPLES = 64  # Items read in the main process to split loading from augmentation
+
 # --- Model Configuration ---
 MODEL_SAVE_DIR = "models"
 MODEL_NAME = "orientation_model_v7"
+MODEL_ARCH = "efficientnet_v2_s"  # See ARCHITECTURES in src/model.py
 NUM_CLASSES = 4  # 0°, 90°, 180°, 270°
 
 # The model is trained to predict the rotation that was APPLIED to an upright image.
@@ -20,7 +51,21 @@ ROTATIONS = {0: 0, 1: 90, 2: 180, 3: 270}
 LEARNING_RATE = 0.0001
 NUM_EPOCHS = 25
 
+# --- Knowledge Distillation (train.py --distill) ---
+STUDENT_ARCH = "mobilenet_v3_large"  # Smaller backbone trained on the teacher's soft targets
+STUDENT_IMAGE_SIZE = 224
+DISTILL_TEMPERATURE = 4.0  # Softens teacher and student distributions
+DISTILL_ALPHA = 0.7  # Weight of the soft-target loss (1 - alpha goes to the hard labels)
+
+# --- Quantization (quantize.py) ---
+QUANTIZATION_CALIBRATION_SIZE = 256  # Samples used to calibrate static int8 models
+QUANTIZATION_VALIDATION_SIZE = 2000  # Samples used for the accuracy gate
+QUANTIZATION_MAX_ACCURACY_DROP = 0.005  # Max allowed absolute accuracy drop vs. fp32
+
 # --- Prediction Settings ---
+PREDICT_BATCH_SIZE = 64  # Images per inference batch in directory mode
+PREDICT_NUM_WORKERS = 8  # DataLoader workers decoding images in directory mode
+
 # A dictionary to map class indices to the corrective action.
 # This is the INVERSE of the rotation applied during training data generation.
 CLASS_MAP = {
@@ -5,26 +5,22 @@ import onnxruntime
 import numpy as np
 import argparse
 import os
-from src.model import get_orientation_model
+from src.model import load_orientation_model
 from src.utils import get_device
-from config import IMAGE_SIZE
 
 
 def convert_to_onnx(model_path, onnx_file_name):
     # Instantiate and load the model
     device = get_device()
-    model = get_orientation_model(pretrained=False)
-
-    # Adjust state_dict keys if the model was compiled
-    state_dict = torch.load(model_path, map_location=device)
-    model.load_state_dict(state_dict)
-    model.to(device)
+    # Plain state_dicts and distilled students (which store their own architecture and input size)
+    model, arch, image_size = load_orientation_model(model_path, map_location=device)
+    model = model.float().to(device)
     model.eval()
 
     # Create a dummy input tensor with the correct shape and type
     batch_size = 1
     dummy_input = torch.randn(
-        batch_size, 3, IMAGE_SIZE, IMAGE_SIZE, requires_grad=True
+        batch_size, 3, image_size, image_size, requires_grad=True
     ).to(device)
 
     # Export the model
@@ -38,7 +34,11 @@ def convert_to_onnx(model_path, onnx_file_name):
         do_constant_folding=True,
         input_names=["input"],
         output_names=["output"],
-        dynamic_axes={"input": {0: "batch_size"}, "output": {0: "batch_size"}},
+        # Dynamic height/width let the service run the model at a lower resolution first
+        dynamic_axes={
+            "input": {0: "batch_size", 2: "height", 3: "width"},
+            "output": {0: "batch_size"},
+        },
     )
     print(f"Model successfully exported to {onnx_file_name}")
 
@@ -48,6 +48,12 @@ def convert_to_onnx(model_path, onnx_file_name):
     # Check that the ONNX model is well-formed
     onnx_model = onnx.load(onnx_file_name)
     onnx.checker.check_model(onnx_model)
+
+    # Record the training input size: with dynamic height/width it is not part of the graph
+    for key, value in {"arch": arch, "image_size": str(image_size)}.items():
+        entry = onnx_model.metadata_props.add()
+        entry.key, entry.value = key, value
+    onnx.save(onnx_model, onnx_file_name)
     print("ONNX model check passed.")
 
     # Create an ONNX Runtime inference session
@@ -5,7 +5,8 @@ import logging
 import time
 
 import config
-from src.model import get_orientation_model
+from src.inference import log_directory_stats, predict_directory
+from src.model import load_orientation_model
 from src.utils import get_device, get_data_transforms, setup_logging, load_image_safely
 
 
@@ -51,18 +52,14 @@ def run_prediction(args):
         return
 
     device = get_device()
-    all_transforms = get_data_transforms()
-    transforms = all_transforms["val"]
 
-    # Load the trained model
-    model = get_orientation_model(pretrained=False)  # No need to download weights
-
-    # Adjust state_dict keys if the model was compiled
-    state_dict = torch.load(args.model_path, map_location=device)
-    model.load_state_dict(state_dict)
-    model.to(device)
+    # Load the trained model (a distilled student brings its own architecture and input size)
+    model, _, image_size = load_orientation_model(args.model_path, map_location=device)
+    model = model.float().to(device)
     model.eval()
 
+    transforms = get_data_transforms(image_size)["val"]
+
     input_path = args.input_path
     if not os.path.exists(input_path):
         logging.error(f"Input path does not exist: {input_path}")
@@ -72,27 +69,27 @@ def run_prediction(args):
         print(f"Processing single image: {input_path}")
         predict_single_image(model, input_path, device, transforms)
     elif os.path.isdir(input_path):
-        print(f"Processing all images in directory: {input_path}")
-        total_dir_start_time = time.time()  # Start timer for the entire directory
-        image_files = [
-            f
-            for f in os.listdir(input_path)
-            if f.lower().endswith((".png", ".jpg", ".jpeg"))
-        ]
-
-        if not image_files:
+        print(f"Processing all images in directory (recursively): {input_path}")
+
+        def predict_batch(inputs):
+            with torch.no_grad():
+                return model(inputs.to(device, non_blocking=True)).float().cpu().numpy()
+
+        stats = predict_directory(
+            input_path,
+            predict_batch,
+            transforms,
+            args.batch_size,
+            args.num_workers,
+            args.output,
+            target_size=image_size + 32,
+        )
+        if stats["images"] + stats["failed"] == 0:
             print(f"No image files found in directory: {input_path}")
             return
-
-        for image_file in image_files:
-            full_path = os.path.join(input_path, image_file)
-            predict_single_image(model, full_path, device, transforms)
-
-        total_dir_end_time = time.time()  # End timer
-        total_duration = total_dir_end_time - total_dir_start_time
-        print(
-            f"Finished processing directory '{input_path}'. Total time: {total_duration:.4f} seconds for {len(image_files)} images."
-        )
+        log_directory_stats(input_path, stats, args.num_workers)
+        if args.output:
+            print(f"Predictions saved to {args.output}")
     else:
         print(f"Input path is not a valid file or directory: {input_path}")
 
@@ -111,6 +108,24 @@ if __name__ == "__main__":
         default=os.path.join(config.MODEL_SAVE_DIR, "best_model.pth"),
         help="Path to the trained model file.",
     )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=config.PREDICT_BATCH_SIZE,
+        help="Images per inference batch in directory mode.",
+    )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=config.PREDICT_NUM_WORKERS,
+        help="DataLoader workers decoding images in directory mode.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Write directory predictions to this .csv or .jsonl file instead of printing them.",
+    )
 
     args = parser.parse_args()
     run_prediction(args)
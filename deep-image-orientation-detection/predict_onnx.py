@@ -8,10 +8,11 @@ import numpy as np
 
 import config
 import torchvision.transforms as T
+from src.inference import log_directory_stats, predict_directory
 from src.utils import setup_logging, load_image_safely
 
 
-def predict_single_image_onnx(ort_session, image_path, image_transforms):
+def predict_single_image_onnx(ort_session, input_name, image_path, image_transforms):
     """Predicts orientation for a single image file using the ONNX model and logs the time taken."""
 
     start_time = time.time()  # Start timer
@@ -28,8 +29,7 @@ def predict_single_image_onnx(ort_session, image_path, image_transforms):
     # Apply transformations and convert to NumPy array for ONNX Runtime
     input_tensor = image_transforms(image).unsqueeze(0).cpu().numpy()
 
-    # Get input name from the ONNX session
-    ort_inputs = {ort_session.get_inputs()[0].name: input_tensor}
+    ort_inputs = {input_name: input_tensor}
 
     # Run inference
     ort_outs = ort_session.run(None, ort_inputs)
@@ -57,16 +57,6 @@ def run_prediction_onnx(args):
         logging.error(f"ONNX model file not found at {args.model_path}.")
         return
 
-    # Define the same transformations used during validation.
-    image_transforms = T.Compose(
-        [
-            T.Resize((config.IMAGE_SIZE + 32, config.IMAGE_SIZE + 32)),
-            T.CenterCrop(config.IMAGE_SIZE),
-            T.ToTensor(),
-            T.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-        ]
-    )
-
     # Define a priority list for execution providers.
     # ONNX Runtime will try to use the first one in this list that is available on the system.
     PREFERRED_PROVIDERS = [
@@ -123,6 +113,22 @@ def run_prediction_onnx(args):
         )
         return
 
+    # Looked up once, not for every image
+    input_name = ort_session.get_inputs()[0].name
+    # Dynamic-size exports record their training input size in the model metadata
+    metadata = ort_session.get_modelmeta().custom_metadata_map
+    image_size = int(metadata.get("image_size", config.IMAGE_SIZE))
+
+    # Define the same transformations used during validation.
+    image_transforms = T.Compose(
+        [
+            T.Resize((image_size + 32, image_size + 32)),
+            T.CenterCrop(image_size),
+            T.ToTensor(),
+            T.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+        ]
+    )
+
     input_path = args.input_path
     if not os.path.exists(input_path):
         logging.error(f"Input path does not exist: {input_path}")
@@ -130,29 +136,28 @@ def run_prediction_onnx(args):
 
     if os.path.isfile(input_path):
         print(f"Processing single image: {input_path}")
-        predict_single_image_onnx(ort_session, input_path, image_transforms)
+        predict_single_image_onnx(ort_session, input_name, input_path, image_transforms)
     elif os.path.isdir(input_path):
-        print(f"Processing all images in directory: {input_path}")
-        total_dir_start_time = time.time()  # Start timer for the entire directory
-        image_files = [
-            f
-            for f in os.listdir(input_path)
-            if f.lower().endswith((".png", ".jpg", ".jpeg"))
-        ]
-
-        if not image_files:
+        print(f"Processing all images in directory (recursively): {input_path}")
+
+        def predict_batch(inputs):
+            return ort_session.run(None, {input_name: inputs.numpy()})[0]
+
+        stats = predict_directory(
+            input_path,
+            predict_batch,
+            image_transforms,
+            args.batch_size,
+            args.num_workers,
+            args.output,
+            target_size=image_size + 32,
+        )
+        if stats["images"] + stats["failed"] == 0:
             print(f"No image files found in directory: {input_path}")
             return
-
-        for image_file in image_files:
-            full_path = os.path.join(input_path, image_file)
-            predict_single_image_onnx(ort_session, full_path, image_transforms)
-
-        total_dir_end_time = time.time()  # End timer
-        total_duration = total_dir_end_time - total_dir_start_time
-        print(
-            f"Finished processing directory '{input_path}'. Total time: {total_duration:.4f} seconds for {len(image_files)} images."
-        )
+        log_directory_stats(input_path, stats, args.num_workers)
+        if args.output:
+            print(f"Predictions saved to {args.output}")
     else:
         print(f"Input path is not a valid file or directory: {input_path}")
 
@@ -173,6 +178,24 @@ if __name__ == "__main__":
         default=os.path.join(config.MODEL_SAVE_DIR, f"{config.MODEL_NAME}.onnx"),
         help="Path to the ONNX model file.",
     )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=config.PREDICT_BATCH_SIZE,
+        help="Images per inference batch in directory mode.",
+    )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=config.PREDICT_NUM_WORKERS,
+        help="DataLoader workers decoding images in directory mode.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Write directory predictions to this .csv or .jsonl file instead of printing them.",
+    )
 
     args = parser.parse_args()
     run_prediction_onnx(args)
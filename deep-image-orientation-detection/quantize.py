@@ -0,0 +1,343 @@
+import argparse
+import json
+import logging
+import os
+import statistics
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, Subset
+
+import config
+from convert_to_onnx import convert_to_onnx
+from src.dataset import (
+    ImageOrientationDataset,
+    ImageOrientationDatasetFromCache,
+    ImageOrientationDatasetFromShards,
+)
+from src.model import load_orientation_model, save_orientation_model
+from src.utils import bf16_supported, get_data_transforms, setup_logging
+
+
+def load_fp32_model(model_path):
+    """Loads the fp32 orientation model on the CPU in eval mode."""
+    model, _, _ = load_orientation_model(model_path, map_location="cpu")
+    return model.float()
+
+
+def build_datasets(args, image_size):
+    """
+    Draws disjoint, reproducible calibration and validation samples from the
+    rotation cache (if requested) or from the upright images in data_dir.
+    """
+    transform = get_data_transforms(image_size)["val"]
+    if args.use_cache and config.CACHE_FORMAT == "shards":
+        dataset = ImageOrientationDatasetFromShards(shard_dir=config.SHARD_CACHE_DIR, transform=transform)
+    elif args.use_cache:
+        dataset = ImageOrientationDatasetFromCache(cache_dir=config.CACHE_DIR, transform=transform)
+    else:
+        dataset = ImageOrientationDataset(upright_dir=args.data_dir, transform=transform)
+
+    generator = torch.Generator().manual_seed(args.seed)
+    indices = torch.randperm(len(dataset), generator=generator).tolist()
+    calibration_indices = indices[: args.calibration_size]
+    validation_indices = indices[args.calibration_size : args.calibration_size + args.validation_size]
+    if not validation_indices:
+        raise ValueError("The dataset is too small for the requested calibration size.")
+
+    return Subset(dataset, calibration_indices), Subset(dataset, validation_indices)
+
+
+def make_loader(dataset, args):
+    return DataLoader(dataset, batch_size=args.batch_size, shuffle=False, num_workers=args.workers)
+
+
+class TorchRunner:
+    """
+    Runs a PyTorch module on NCHW float batches. Inputs are cast to input_dtype, so a model
+    with bf16 weights runs fully in bf16, exactly as TorchOrientationBackend runs the saved file.
+    """
+
+    def __init__(self, model, input_dtype=torch.float32):
+        self.model = model
+        self.input_dtype = input_dtype
+
+    def __call__(self, inputs: torch.Tensor) -> np.ndarray:
+        with torch.no_grad():
+            return self.model(inputs.to(self.input_dtype)).float().numpy()
+
+
+class OnnxRunner:
+    """Runs an ONNX model in ONNX Runtime on the CPU."""
+
+    def __init__(self, onnx_path, threads):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            onnx_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, inputs: torch.Tensor) -> np.ndarray:
+        return self.session.run(None, {self.input_name: inputs.numpy()})[0]
+
+
+def evaluate(runner, validation_loader, latency_images):
+    """
+    Returns validation accuracy and the per-image latency (batch size 1)
+    measured on the first `latency_images` validation samples.
+    """
+    correct, total = 0, 0
+    latency_inputs = []
+    for inputs, labels in validation_loader:
+        predictions = runner(inputs).argmax(axis=1)
+        correct += int((predictions == labels.numpy()).sum())
+        total += len(labels)
+        for image in inputs:
+            if len(latency_inputs) < latency_images:
+                latency_inputs.append(image.unsqueeze(0))
+
+    runner(latency_inputs[0])  # warm-up
+    latencies = []
+    for image in latency_inputs:
+        start = time.perf_counter()
+        runner(image)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "accuracy": correct / total,
+        "median_latency_ms": statistics.median(latencies),
+        "mean_latency_ms": statistics.fmean(latencies),
+    }
+
+
+def quantize_torch_dynamic(model):
+    """Dynamic int8: only nn.Linear layers (the classifier head) are quantized."""
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_torch_static(model, calibration_loader):
+    """Static int8 through FX graph mode with the x86 backend, calibrated on real samples."""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    torch.backends.quantized.engine = "x86"
+    example_inputs = (next(iter(calibration_loader))[0],)
+    prepared = prepare_fx(model, get_default_qconfig_mapping("x86"), example_inputs)
+    with torch.no_grad():
+        for inputs, _ in calibration_loader:
+            prepared(inputs)
+    return convert_fx(prepared)
+
+
+def save_torchscript(model, path, image_size):
+    """
+    Quantized modules are saved as TorchScript so they load without rebuilding the graph.
+    The input size goes into the archive, so the model is served at the size it was gated at.
+    """
+    example = torch.randn(1, 3, image_size, image_size)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    torch.jit.save(traced, path, _extra_files={"image_size": str(image_size)})
+
+
+def quantize_onnx_static(fp32_onnx_path, int8_onnx_path, calibration_loader):
+    """ONNX Runtime static int8 (QDQ, per-channel weights) calibrated on real samples."""
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        QuantFormat,
+        QuantType,
+        quantize_static,
+    )
+
+    class LoaderDataReader(CalibrationDataReader):
+        def __init__(self):
+            self.batches = iter(calibration_loader)
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else {"input": batch[0].numpy()}
+
+    quantize_static(
+        fp32_onnx_path,
+        int8_onnx_path,
+        LoaderDataReader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+
+
+def run_quantization(args):
+    setup_logging()
+    torch.set_num_threads(args.threads)
+    os.makedirs(args.output_dir, exist_ok=True)
+    base_name = os.path.splitext(os.path.basename(args.model_path))[0]
+
+    _, arch, image_size = load_orientation_model(args.model_path, map_location="cpu")
+    calibration_set, validation_set = build_datasets(args, image_size)
+    calibration_loader = make_loader(calibration_set, args)
+    validation_loader = make_loader(validation_set, args)
+    logging.info(
+        f"Calibration samples: {len(calibration_set)}, validation samples: {len(validation_set)}"
+    )
+
+    model = load_fp32_model(args.model_path)
+    report = {"model_path": args.model_path, "max_accuracy_drop": args.max_accuracy_drop, "variants": {}}
+
+    logging.info("Evaluating fp32 reference...")
+    reference = evaluate(TorchRunner(model), validation_loader, args.latency_images)
+    report["variants"]["fp32"] = {"artifact": args.model_path, **reference, "accepted": True}
+
+    def add_variant(name, artifact_path, runner, keep_rejected=False):
+        stats = evaluate(runner, validation_loader, args.latency_images)
+        drop = reference["accuracy"] - stats["accuracy"]
+        accepted = drop <= args.max_accuracy_drop
+        keep = accepted or keep_rejected
+        if not keep and os.path.exists(artifact_path):
+            # An artifact that fails the accuracy gate must not be picked up by mistake
+            os.remove(artifact_path)
+        report["variants"][name] = {
+            "artifact": artifact_path if keep else None,
+            **stats,
+            "accuracy_drop": drop,
+            "accepted": accepted,
+        }
+        logging.info(
+            f"{name}: accuracy {stats['accuracy']:.4f} (drop {drop:+.4f}), "
+            f"median latency {stats['median_latency_ms']:.1f} ms -> {'ACCEPTED' if accepted else 'REJECTED'}"
+        )
+
+    def try_variant(name, build):
+        try:
+            build()
+        except Exception as e:
+            logging.error(f"{name}: quantization failed: {e}")
+            report["variants"][name] = {"error": str(e), "accepted": False}
+
+    if "bf16" in args.variants:
+        if bf16_supported():
+            def build_bf16():
+                path = os.path.join(args.output_dir, f"{base_name}_bf16.pth")
+                bf16_model = load_fp32_model(args.model_path).to(torch.bfloat16)
+                save_orientation_model(bf16_model, path, arch, image_size)
+                # The gate evaluates the bf16 weights that were written, not fp32 under autocast
+                add_variant("bf16", path, TorchRunner(bf16_model.eval(), input_dtype=torch.bfloat16))
+
+            try_variant("bf16", build_bf16)
+        else:
+            logging.warning("bf16: this CPU has no native bf16 support, skipping.")
+            report["variants"]["bf16"] = {"error": "bf16 is not supported by this CPU", "accepted": False}
+
+    if "torch-dynamic" in args.variants:
+        def build_dynamic():
+            path = os.path.join(args.output_dir, f"{base_name}_int8_dynamic.torchscript")
+            quantized = quantize_torch_dynamic(load_fp32_model(args.model_path))
+            save_torchscript(quantized, path, image_size)
+            add_variant("torch-dynamic-int8", path, TorchRunner(quantized))
+
+        try_variant("torch-dynamic-int8", build_dynamic)
+
+    if "torch-static" in args.variants:
+        def build_static():
+            path = os.path.join(args.output_dir, f"{base_name}_int8_static.torchscript")
+            quantized = quantize_torch_static(load_fp32_model(args.model_path), calibration_loader)
+            save_torchscript(quantized, path, image_size)
+            add_variant("torch-static-int8", path, TorchRunner(quantized))
+
+        try_variant("torch-static-int8", build_static)
+
+    if "onnx-static" in args.variants:
+        def build_onnx_static():
+            fp32_onnx_path = os.path.join(args.output_dir, f"{base_name}.onnx")
+            int8_onnx_path = os.path.join(args.output_dir, f"{base_name}_int8.onnx")
+            convert_to_onnx(args.model_path, fp32_onnx_path)
+            # The fp32 export is only reported: it is the input of the int8 calibration below
+            add_variant(
+                "onnx-fp32", fp32_onnx_path, OnnxRunner(fp32_onnx_path, args.threads), keep_rejected=True
+            )
+            quantize_onnx_static(fp32_onnx_path, int8_onnx_path, calibration_loader)
+            add_variant("onnx-static-int8", int8_onnx_path, OnnxRunner(int8_onnx_path, args.threads))
+
+        try_variant("onnx-static-int8", build_onnx_static)
+
+    report_path = os.path.join(args.output_dir, "quantization_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'variant':<20} {'accuracy':>9} {'drop':>8} {'median ms':>10}  status")
+    for name, stats in report["variants"].items():
+        if "error" in stats:
+            print(f"{name:<20} {'-':>9} {'-':>8} {'-':>10}  ERROR: {stats['error']}")
+            continue
+        print(
+            f"{name:<20} {stats['accuracy']:>9.4f} {stats.get('accuracy_drop', 0.0):>+8.4f} "
+            f"{stats['median_latency_ms']:>10.1f}  {'accepted' if stats['accepted'] else 'REJECTED'}"
+        )
+    print(f"\nReport saved to {report_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Quantize the orientation model (bf16 / int8) and gate artifacts on validation accuracy."
+    )
+    parser.add_argument(
+        "--model_path",
+        type=str,
+        default=os.path.join(config.MODEL_SAVE_DIR, "best_model.pth"),
+        help="Path to the fp32 PyTorch model (.pth) file.",
+    )
+    parser.add_argument(
+        "--output_dir",
+        type=str,
+        default=os.path.join(config.MODEL_SAVE_DIR, "quantized"),
+        help="Directory for the quantized artifacts and the report.",
+    )
+    parser.add_argument(
+        "--data_dir", type=str, default=config.DATA_DIR, help="Directory with upright images."
+    )
+    parser.add_argument(
+        "--use_cache",
+        action="store_true",
+        help="Sample from the rotation cache (config.CACHE_FORMAT) instead of data_dir.",
+    )
+    parser.add_argument(
+        "--variants",
+        nargs="+",
+        choices=["bf16", "torch-dynamic", "torch-static", "onnx-static"],
+        default=["bf16", "torch-dynamic", "torch-static", "onnx-static"],
+        help="Which variants to produce.",
+    )
+    parser.add_argument(
+        "--calibration_size",
+        type=int,
+        default=config.QUANTIZATION_CALIBRATION_SIZE,
+        help="Number of samples used for calibration.",
+    )
+    parser.add_argument(
+        "--validation_size",
+        type=int,
+        default=config.QUANTIZATION_VALIDATION_SIZE,
+        help="Number of samples used for the accuracy gate.",
+    )
+    parser.add_argument(
+        "--max_accuracy_drop",
+        type=float,
+        default=config.QUANTIZATION_MAX_ACCURACY_DROP,
+        help="Reject an artifact if its accuracy is lower than fp32 by more than this (absolute).",
+    )
+    parser.add_argument(
+        "--latency_images", type=int, default=50, help="Images used for the per-image latency measurement."
+    )
+    parser.add_argument("--batch_size", type=int, default=32, help="Calibration and evaluation batch size.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of data loading workers.")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="CPU threads for inference.")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for drawing the samples.")
+
+    args = parser.parse_args()
+    run_quantization(args)
@@ -0,0 +1,135 @@
+import os
+import sqlite3
+import time
+
+# Manifest file inside the PNG cache directory
+MANIFEST_FILE = "manifest.sqlite3"
+
+# Status of a source image in the manifest
+CACHED = "cached"  # all rotations are in the cache
+FAILED = "failed"  # could not be decoded; retried only when the file changes
+EVICTED = "evicted"  # dropped to stay within the disk budget; rebuilt only when the file changes
+
+
+class CacheManifest:
+    """
+    SQLite manifest of the rotation cache: for every source image it records the
+    file's size, mtime and content hash, and the cache files made from it.
+    A source is committed only after all of its cache files are written, so an
+    interrupted build resumes from the last committed image.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "content_hash TEXT NOT NULL, status TEXT NOT NULL, "
+            "bytes INTEGER NOT NULL DEFAULT 0, built_at REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "filename TEXT PRIMARY KEY, source_path TEXT NOT NULL, label INTEGER NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS entries_source ON entries (source_path)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS sources_built_at ON sources (built_at)"
+        )
+        self.connection.commit()
+
+    def get_meta(self, key):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def set_meta(self, key, value):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value))
+        )
+        self.connection.commit()
+
+    def sources(self):
+        """path -> (size, mtime_ns, content_hash, status) for every known source."""
+        rows = self.connection.execute(
+            "SELECT path, size, mtime_ns, content_hash, status FROM sources"
+        )
+        return {path: (size, mtime_ns, content_hash, status) for path, size, mtime_ns, content_hash, status in rows}
+
+    def entry_filenames(self, source_path=None):
+        if source_path is None:
+            rows = self.connection.execute("SELECT filename FROM entries")
+        else:
+            rows = self.connection.execute(
+                "SELECT filename FROM entries WHERE source_path = ?", (source_path,)
+            )
+        return [filename for (filename,) in rows]
+
+    def record(self, path, size, mtime_ns, content_hash, status, entries=(), num_bytes=0):
+        """Replaces everything known about a source (call commit() to persist)."""
+        self.connection.execute("DELETE FROM entries WHERE source_path = ?", (path,))
+        self.connection.execute(
+            "INSERT OR REPLACE INTO sources (path, size, mtime_ns, content_hash, status, bytes, built_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (path, size, mtime_ns, content_hash, status, num_bytes, time.time()),
+        )
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO entries (filename, source_path, label) VALUES (?, ?, ?)",
+            [(filename, path, label) for filename, label in entries],
+        )
+
+    def update_stat(self, path, size, mtime_ns):
+        """The file was touched but its content hash did not change."""
+        self.connection.execute(
+            "UPDATE sources SET size = ?, mtime_ns = ? WHERE path = ?", (size, mtime_ns, path)
+        )
+
+    def mark_evicted(self, path):
+        self.connection.execute("DELETE FROM entries WHERE source_path = ?", (path,))
+        self.connection.execute(
+            "UPDATE sources SET status = ?, bytes = 0 WHERE path = ?", (EVICTED, path)
+        )
+
+    def remove(self, path):
+        self.connection.execute("DELETE FROM entries WHERE source_path = ?", (path,))
+        self.connection.execute("DELETE FROM sources WHERE path = ?", (path,))
+
+    def evicted_sources(self):
+        """Sources dropped from the cache by the disk budget, in path order."""
+        rows = self.connection.execute(
+            "SELECT path FROM sources WHERE status = ? ORDER BY path", (EVICTED,)
+        )
+        return [path for (path,) in rows]
+
+    def cached_bytes(self):
+        (total,) = self.connection.execute(
+            "SELECT COALESCE(SUM(bytes), 0) FROM sources WHERE status = ?", (CACHED,)
+        ).fetchone()
+        return total
+
+    def oldest_cached(self):
+        """Cached sources, oldest build first: (path, bytes)."""
+        return self.connection.execute(
+            "SELECT path, bytes FROM sources WHERE status = ? ORDER BY built_at", (CACHED,)
+        ).fetchall()
+
+    def clear(self):
+        self.connection.execute("DELETE FROM entries")
+        self.connection.execute("DELETE FROM sources")
+        self.connection.commit()
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+def file_stat(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
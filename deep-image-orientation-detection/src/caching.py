@@ -1,42 +1,161 @@
 import os
+import io
+import json
+import hashlib
 import logging
+from collections import Counter
+import numpy as np
 from PIL import Image
 from tqdm import tqdm
 from multiprocessing import Pool, cpu_count
 import config
-from src.utils import load_image_safely
+from src.cache_manifest import CACHED, EVICTED, FAILED, MANIFEST_FILE, CacheManifest, file_stat
+from src.utils import load_image_safely, rotate_exact
 
+TMP_SUFFIX = ".tmp"
+# Manifest rows are committed in batches; at most this many images are redone after a crash
+MANIFEST_COMMIT_EVERY = 100
 
-def process_and_cache_image(image_path: str):
+
+def source_content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_entry_name(image_path: str, content_hash: str, label: int) -> str:
+    """
+    Cache filename of one rotation. It is keyed by the path relative to DATA_DIR, so files
+    from different folders with the same name (even with the same content) stay apart, and
+    by the content hash, so a changed image gets new files; the label stays after the last "__".
+    """
+    original_filename = os.path.splitext(os.path.basename(image_path))[0]
+    relative_path = os.path.relpath(image_path, config.DATA_DIR).replace(os.sep, "/")
+    path_key = hashlib.sha256(relative_path.encode("utf-8")).hexdigest()[:8]
+    return f"{original_filename}_{path_key}_{content_hash[:12]}__{label}.png"
+
+
+def process_and_cache_image(task):
     """
-    Worker function to process a single image. It uses the robust loader,
-    creates four rotated versions, and saves them to the cache directory.
+    Worker function to process a single image. It hashes the file, and unless the
+    content is unchanged (known_hash), uses the robust loader, creates four rotated
+    versions, and saves them to the cache directory.
+
+    Args:
+        task: (image_path, known_hash) - known_hash is the hash recorded in the
+              manifest for this path, or None for a new image.
+
+    Returns:
+        (image_path, content_hash, entries, num_bytes, error): entries is a list of
+        (filename, label), or None when the content matched known_hash.
     """
+    image_path, known_hash = task
+    cache_dir = config.CACHE_DIR
+    content_hash = None
+    written = []
     try:
-        cache_dir = config.CACHE_DIR
-        original_filename = os.path.splitext(os.path.basename(image_path))[0]
+        with open(image_path, "rb") as f:
+            data = f.read()
+        content_hash = source_content_hash(data)
+        if content_hash == known_hash:
+            return image_path, content_hash, None, 0, None
 
-        # Use the single, robust image loader from utils
-        img = load_image_safely(image_path)
+        # Use the single, robust image loader from utils (the file is read only once)
+        img = load_image_safely(io.BytesIO(data), target_size=config.DECODE_TARGET_SIZE)
 
         # Use the rotation definition from config
+        entries, num_bytes = [], 0
         for label, angle in config.ROTATIONS.items():
-            rotated_img = img.rotate(angle, resample=Image.BICUBIC, expand=True)
-            cached_filename = f"{original_filename}__{label}.png"
+            rotated_img = rotate_exact(img, angle)
+            cached_filename = cache_entry_name(image_path, content_hash, label)
             save_path = os.path.join(cache_dir, cached_filename)
-            rotated_img.save(save_path, "PNG")
+            # Write under a temporary name, so a crash never leaves a truncated PNG behind
+            tmp_path = save_path + TMP_SUFFIX
+            rotated_img.save(tmp_path, "PNG")
+            os.replace(tmp_path, save_path)
+            written.append(save_path)
+            entries.append((cached_filename, label))
+            num_bytes += os.path.getsize(save_path)
 
-        return None
+        return image_path, content_hash, entries, num_bytes, None
 
     except Exception as e:
         logging.warning(f"Could not process and cache {image_path}. Error: {e}")
-        return image_path
+        for path in written:
+            os.remove(path)
+        return image_path, content_hash, [], 0, str(e)
+
+
+def _remove_cache_files(cache_dir, filenames):
+    for filename in filenames:
+        try:
+            os.remove(os.path.join(cache_dir, filename))
+        except FileNotFoundError:
+            pass
+
+
+def _adopt_legacy_cache(manifest, cache_dir, image_files, cached_files):
+    """
+    Records a cache built before the manifest existed ("<name>__<label>.png"),
+    so that upgrading does not trigger a full rebuild. Content hashes are computed
+    once here; later builds only rehash files whose size or mtime changed.
+    Legacy names carry no folder, so a stem shared by several source images is
+    ambiguous: those images are not adopted and are rebuilt under unique names.
+    """
+    cached = set(cached_files)
+    stems = Counter(os.path.splitext(os.path.basename(path))[0] for path in image_files)
+    adopted = 0
+    for image_path in image_files:
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        if stems[stem] > 1:
+            continue
+        entries = [(f"{stem}__{label}.png", label) for label in config.ROTATIONS]
+        if not all(filename in cached for filename, _ in entries):
+            continue
+        with open(image_path, "rb") as f:
+            content_hash = source_content_hash(f.read())
+        num_bytes = sum(os.path.getsize(os.path.join(cache_dir, filename)) for filename, _ in entries)
+        manifest.record(image_path, *file_stat(image_path), content_hash, CACHED, entries, num_bytes)
+        adopted += 1
+    manifest.commit()
+    logging.info(f"Adopted {adopted} source images from an existing cache without a manifest.")
+
+
+def _enforce_size_budget(manifest, cache_dir, max_bytes):
+    """Evicts the oldest cached source images until the cache fits into max_bytes."""
+    total = manifest.cached_bytes()
+    if not max_bytes or total <= max_bytes:
+        return
+    evicted = 0
+    for path, num_bytes in manifest.oldest_cached():
+        if total <= max_bytes:
+            break
+        _remove_cache_files(cache_dir, manifest.entry_filenames(path))
+        manifest.mark_evicted(path)
+        total -= num_bytes
+        evicted += 1
+    manifest.commit()
+    logging.info(
+        f"Evicted {evicted} source images to keep the cache within {max_bytes / 1e9:.1f} GB."
+    )
+
+
+def _warn_about_evictions(manifest, max_bytes):
+    """Evicted images are decoded from the source by the dataset, which is much slower."""
+    evicted = len(manifest.evicted_sources())
+    if evicted:
+        logging.warning(
+            f"{evicted} source images are not in the cache because of CACHE_MAX_BYTES "
+            f"({max_bytes / 1e9:.1f} GB). They stay in the training set, but are decoded from "
+            f"the source files on every epoch. Set CACHE_MAX_BYTES = 0 to cache them again."
+        )
 
 
 def cache_dataset(force_rebuild=False):
     """
     Applies rotations to all images and saves them to a cache, using
-    multiple processes.
+    multiple processes. The build is incremental: a manifest records the content
+    hash of every source image and the cache files made from it, so only new or
+    changed images are processed, entries of deleted images are dropped, and an
+    interrupted build resumes where it stopped.
     """
     upright_dir = config.DATA_DIR
     cache_dir = config.CACHE_DIR
@@ -46,53 +165,254 @@ def cache_dataset(force_rebuild=False):
         raise FileNotFoundError(f"Source data directory not found: {upright_dir}")
 
     os.makedirs(cache_dir, exist_ok=True)
+    manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+    has_manifest = os.path.exists(manifest_path)
+    manifest = CacheManifest(manifest_path)
+
+    try:
+        cached_files = [f for f in os.listdir(cache_dir) if not f.startswith(MANIFEST_FILE)]
+        if force_rebuild:
+            logging.info(
+                f"Force rebuild is True. Clearing {len(cached_files)} files from cache directory: {cache_dir}"
+            )
+            _remove_cache_files(cache_dir, cached_files)
+            manifest.clear()
+            cached_files = []
+
+        image_files = sorted(
+            os.path.join(root, f)
+            for root, _, files in os.walk(upright_dir)
+            for f in files
+            if f.lower().endswith((".png", ".jpg", ".jpeg"))
+        )
+
+        if not image_files:
+            raise ValueError(f"No images found in {upright_dir}")
+
+        # Cached images are stored at the decode resolution, so a new one invalidates them all
+        built_for = manifest.get_meta("decode_target_size")
+        if built_for is not None and int(built_for) != config.DECODE_TARGET_SIZE:
+            logging.info(
+                f"Cache was built for {built_for}px, but {config.DECODE_TARGET_SIZE}px is needed. Rebuilding..."
+            )
+            _remove_cache_files(cache_dir, cached_files)
+            manifest.clear()
+            cached_files = []
+        manifest.set_meta("decode_target_size", config.DECODE_TARGET_SIZE)
+
+        if not has_manifest and cached_files:
+            _adopt_legacy_cache(manifest, cache_dir, image_files, cached_files)
+
+        # --- Compare the source tree with the manifest ---
+        known = manifest.sources()
+        tasks, stats = [], {}
+        for image_path in image_files:
+            stats[image_path] = file_stat(image_path)
+            record = known.get(image_path)
+            if record is None:
+                tasks.append((image_path, None))
+            elif (record[0], record[1]) != stats[image_path]:
+                # Size or mtime changed: the worker rehashes and rebuilds only if the content differs
+                tasks.append((image_path, record[2]))
+            elif record[3] == EVICTED and not config.CACHE_MAX_BYTES:
+                # The budget was lifted: evicted images are cached again
+                tasks.append((image_path, None))
+            # CACHED sources are up to date; FAILED ones (and EVICTED ones under a budget)
+            # with an unchanged file are not retried
+
+        removed_sources = set(known) - set(stats)
+        for image_path in removed_sources:
+            _remove_cache_files(cache_dir, manifest.entry_filenames(image_path))
+            manifest.remove(image_path)
+        manifest.commit()
+
+        # Files not owned by any manifest entry are leftovers of an interrupted build
+        owned = set(manifest.entry_filenames())
+        orphans = [f for f in os.listdir(cache_dir) if not f.startswith(MANIFEST_FILE) and f not in owned]
+        _remove_cache_files(cache_dir, orphans)
 
-    # --- Enhanced Cache Check & Logging ---
-    cached_files = os.listdir(cache_dir)
-    if force_rebuild:
         logging.info(
-            f"Force rebuild is True. Clearing {len(cached_files)} files from cache directory: {cache_dir}"
+            f"Cache manifest: {len(image_files)} source images, {len(tasks)} new or changed, "
+            f"{len(removed_sources)} removed, {len(orphans)} orphaned cache files deleted."
         )
-        for f in cached_files:
-            os.remove(os.path.join(cache_dir, f))
-        cached_files = []  # Reset file list
 
-    if cached_files:
+        if tasks:
+            num_workers = config.NUM_WORKERS if config.NUM_WORKERS > 0 else cpu_count()
+            logging.info(f"Building cache with {num_workers} worker processes...")
+
+            failures = 0
+            with Pool(processes=num_workers) as pool:
+                results = pool.imap_unordered(process_and_cache_image, tasks, chunksize=8)
+                for done, (image_path, content_hash, entries, num_bytes, error) in enumerate(
+                    tqdm(results, total=len(tasks), desc="Caching Images"), start=1
+                ):
+                    size, mtime_ns = stats[image_path]
+                    if entries is None:
+                        manifest.update_stat(image_path, size, mtime_ns)
+                    else:
+                        # Files of the previous version of a changed image
+                        stale = set(manifest.entry_filenames(image_path)) - {f for f, _ in entries}
+                        _remove_cache_files(cache_dir, stale)
+                        status = FAILED if error else CACHED
+                        failures += bool(error)
+                        manifest.record(
+                            image_path, size, mtime_ns, content_hash or "", status, entries, num_bytes
+                        )
+                    if done % MANIFEST_COMMIT_EVERY == 0:
+                        manifest.commit()
+            manifest.commit()
+
+            if failures:
+                logging.warning(
+                    f"Warning: {failures} out of {len(tasks)} images failed to process. Check logs for details."
+                )
+        else:
+            logging.info(f"Cache at '{cache_dir}' is up to date.")
+
+        _enforce_size_budget(manifest, cache_dir, config.CACHE_MAX_BYTES)
+        _warn_about_evictions(manifest, config.CACHE_MAX_BYTES)
         logging.info(
-            f"Cache already exists with {len(cached_files)} files at '{cache_dir}'. Skipping rebuild."
+            f"Image cache has {len(manifest.entry_filenames())} files "
+            f"({manifest.cached_bytes() / 1e9:.2f} GB)."
         )
-        return
-    else:
-        logging.info("Cache is empty or was cleared. Starting build process...")
+    finally:
+        manifest.close()
+
+
+SHARD_INDEX_FILE = "index.json"
+
+
+def shard_resolution() -> int:
+    """Side of the stored square images: the size the validation transform resizes to."""
+    return config.IMAGE_SIZE + 32
+
+
+def process_image_for_shards(image_path: str):
+    """
+    Worker function for the shard cache. Decodes the image once, resizes it to the
+    training resolution and returns all rotations as a (num_rotations, R, R, 3) uint8
+    array, or None on failure. Resizing before rotating is equivalent for multiples
+    of 90 degrees, and the rotations themselves are lossless transposes.
+    """
+    try:
+        resolution = shard_resolution()
+        img = load_image_safely(image_path, target_size=resolution)
+        img = img.resize((resolution, resolution), Image.BILINEAR)
+        rotations = []
+        for label in sorted(config.ROTATIONS):
+            angle = config.ROTATIONS[label]
+            rotations.append(np.asarray(rotate_exact(img, angle), dtype=np.uint8))
+        return np.stack(rotations)
+
+    except Exception as e:
+        logging.warning(f"Could not process and cache {image_path}. Error: {e}")
+        return None
+
+
+class _ShardWriter:
+    """Appends samples to raw uint8 shard files and records the shard layout."""
+
+    def __init__(self, shard_dir, resolution, shard_size):
+        self.shard_dir = shard_dir
+        self.resolution = resolution
+        self.shard_size = shard_size
+        self.shards = []
+        self._file = None
+        self._labels = []
+
+    def _close_shard(self):
+        if self._file is None:
+            return
+        self._file.close()
+        name = f"shard_{len(self.shards):05d}"
+        np.save(os.path.join(self.shard_dir, f"{name}_labels.npy"), np.array(self._labels, dtype=np.int64))
+        self.shards.append({"images": f"{name}.bin", "labels": f"{name}_labels.npy", "count": len(self._labels)})
+        self._file, self._labels = None, []
+
+    def add(self, images, labels):
+        for image, label in zip(images, labels):
+            if self._file is None:
+                name = f"shard_{len(self.shards):05d}.bin"
+                self._file = open(os.path.join(self.shard_dir, name), "wb")
+            self._file.write(image.tobytes())
+            self._labels.append(label)
+            if len(self._labels) == self.shard_size:
+                self._close_shard()
 
-    image_files = [
+    def finish(self):
+        """Closes the last shard and writes the index, which marks the cache as complete."""
+        self._close_shard()
+        index = {
+            "resolution": self.resolution,
+            "rotations": config.ROTATIONS,
+            "shards": self.shards,
+        }
+        with open(os.path.join(self.shard_dir, SHARD_INDEX_FILE), "w") as f:
+            json.dump(index, f, indent=2)
+        return sum(shard["count"] for shard in self.shards)
+
+
+def build_shard_cache(force_rebuild=False):
+    """
+    Builds the shard cache: every source image is decoded and resized once in a
+    worker process, and all rotations are appended to large memory-mappable shards.
+    The index file is written last, so an interrupted build is rebuilt on the next run.
+    """
+    upright_dir = config.DATA_DIR
+    shard_dir = config.SHARD_CACHE_DIR
+
+    if not os.path.exists(upright_dir):
+        logging.error(f"Source data directory not found: {upright_dir}")
+        raise FileNotFoundError(f"Source data directory not found: {upright_dir}")
+
+    os.makedirs(shard_dir, exist_ok=True)
+    index_path = os.path.join(shard_dir, SHARD_INDEX_FILE)
+    if os.path.exists(index_path) and not force_rebuild:
+        with open(index_path) as f:
+            index = json.load(f)
+        if index["resolution"] == shard_resolution():
+            logging.info(f"Shard cache already exists at '{shard_dir}'. Skipping rebuild.")
+            return
+        logging.info(
+            f"Shard cache was built at {index['resolution']}px, "
+            f"but {shard_resolution()}px is needed. Rebuilding..."
+        )
+
+    stale_files = os.listdir(shard_dir)
+    if stale_files:
+        logging.info(f"Clearing {len(stale_files)} files from shard cache directory: {shard_dir}")
+        for f in stale_files:
+            os.remove(os.path.join(shard_dir, f))
+
+    image_files = sorted(
         os.path.join(root, f)
         for root, _, files in os.walk(upright_dir)
         for f in files
         if f.lower().endswith((".png", ".jpg", ".jpeg"))
-    ]
+    )
 
     if not image_files:
         raise ValueError(f"No images found in {upright_dir}")
 
     num_workers = config.NUM_WORKERS if config.NUM_WORKERS > 0 else cpu_count()
-    logging.info(f"Building cache with {num_workers} worker processes...")
+    logging.info(f"Building shard cache with {num_workers} worker processes...")
 
+    writer = _ShardWriter(shard_dir, shard_resolution(), config.SHARD_SIZE)
+    labels = sorted(config.ROTATIONS)
+    failures = 0
     with Pool(processes=num_workers) as pool:
-        results = list(
-            tqdm(
-                pool.imap_unordered(process_and_cache_image, image_files),
-                total=len(image_files),
-                desc="Caching Images",
-            )
-        )
+        # imap keeps the source order, so the shard layout is reproducible
+        results = pool.imap(process_image_for_shards, image_files, chunksize=16)
+        for rotations in tqdm(results, total=len(image_files), desc="Caching Images"):
+            if rotations is None:
+                failures += 1
+                continue
+            writer.add(rotations, labels)
 
-    failures = [r for r in results if r is not None]
     if failures:
         logging.warning(
-            f"Warning: {len(failures)} out of {len(image_files)} images failed to process. Check logs for details."
+            f"Warning: {failures} out of {len(image_files)} images failed to process. Check logs for details."
         )
 
-    logging.info(
-        f"Successfully built image cache with {len(os.listdir(cache_dir))} files."
-    )
+    total = writer.finish()
+    logging.info(f"Successfully built shard cache with {total} samples in {len(writer.shards)} shards.")
@@ -1,4 +1,6 @@
 import os
+import json
+import bisect
 import random
 import torch
 import logging
@@ -8,7 +10,9 @@ from PIL import Image
 
 import torchvision.transforms as transforms
 import config
-from src.utils import load_image_safely
+from src.cache_manifest import MANIFEST_FILE, CacheManifest
+from src.caching import SHARD_INDEX_FILE
+from src.utils import load_image_safely, rotate_exact
 
 
 # Dataset for cases where caching is not desired
@@ -41,11 +45,9 @@ class ImageOrientationDataset(Dataset):
 
         try:
             # Use the safe loader from utils
-            image = load_image_safely(image_path)
+            image = load_image_safely(image_path, target_size=config.DECODE_TARGET_SIZE)
             # Apply the selected rotation
-            rotated_image = image.rotate(
-                angle_to_rotate, resample=Image.BICUBIC, expand=True
-            )
+            rotated_image = rotate_exact(image, angle_to_rotate)
 
             if self.transform:
                 image_tensor = self.transform(rotated_image)
@@ -63,8 +65,48 @@ class ImageOrientationDataset(Dataset):
         return image_tensor, torch.tensor(label, dtype=torch.long)
 
 
+
+# Decode-once variant of ImageOrientationDataset: one item is one source image with all
+# of its rotations, produced by lossless transposes of a single decoded copy. This cuts
+# image decoding per epoch by the number of rotations. Use `collate_rotation_groups` so
+# that batches are flat (N * num_rotations, C, H, W) tensors, as with the other datasets.
+class ImageOrientationGroupedDataset(ImageOrientationDataset):
+    def __len__(self):
+        return len(self.image_files)
+
+    @property
+    def samples_per_item(self):
+        return self.num_rotations
+
+    def __getitem__(self, idx):
+        image_path = self.image_files[idx]
+        to_tensor = self.transform or transforms.ToTensor()
+
+        try:
+            image = load_image_safely(image_path, target_size=config.DECODE_TARGET_SIZE)
+            # Every rotation gets its own random augmentation, as in the ungrouped dataset
+            image_tensors = torch.stack(
+                [to_tensor(rotate_exact(image, self.rotations[label])) for label in range(self.num_rotations)]
+            )
+
+        except Exception as e:
+            logging.warning(
+                f"Warning: Could not open or process {image_path}. Skipping. Error: {e}"
+            )
+            return self.__getitem__(random.randint(0, len(self) - 1))
+
+        return image_tensors, torch.arange(self.num_rotations, dtype=torch.long)
+
+
+def collate_rotation_groups(batch):
+    """Flattens grouped samples [(R, C, H, W), (R,)] into one (N * R, C, H, W) batch."""
+    images, labels = zip(*batch)
+    return torch.cat(images), torch.cat(labels)
+
 # This dataset reads directly from the pre-processed and cached images.
 # This is significantly faster (if run on a fast disk) as it only has to do a file read and basic tensor conversion.
+# Source images evicted from the cache by CACHE_MAX_BYTES (see the manifest) are decoded
+# and rotated from the source files instead, so they never drop out of the training set.
 class ImageOrientationDatasetFromCache(Dataset):
     def __init__(self, cache_dir, transform=None):
         self.cache_dir = cache_dir
@@ -82,15 +124,44 @@ class ImageOrientationDatasetFromCache(Dataset):
             if f.endswith(".png")
         ]
 
-        if not self.image_files:
+        # (source path, label) of every rotation of an evicted source image
+        self.evicted_samples = []
+        manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            manifest = CacheManifest(manifest_path)
+            try:
+                evicted = manifest.evicted_sources()
+            finally:
+                manifest.close()
+            self.evicted_samples = [
+                (path, label) for path in evicted for label in config.ROTATIONS
+            ]
+            if evicted:
+                logging.warning(
+                    f"{len(evicted)} source images were evicted from the cache; "
+                    f"their samples are decoded from the source files."
+                )
+
+        if not self.image_files and not self.evicted_samples:
             raise ValueError(
                 f"No .png images found in the cache directory: {cache_dir}"
             )
 
     def __len__(self):
-        return len(self.image_files)
+        return len(self.image_files) + len(self.evicted_samples)
 
     def __getitem__(self, idx):
+        if idx >= len(self.image_files):
+            source_path, label = self.evicted_samples[idx - len(self.image_files)]
+            try:
+                image = load_image_safely(source_path, target_size=config.DECODE_TARGET_SIZE)
+                image = rotate_exact(image, config.ROTATIONS[label])
+                image_tensor = (self.transform or transforms.ToTensor())(image)
+            except Exception as e:
+                logging.warning(f"Could not read or process evicted source {source_path}. Error: {e}")
+                return self.__getitem__(random.randint(0, len(self) - 1))
+            return image_tensor, torch.tensor(label, dtype=torch.long)
+
         image_path = self.image_files[idx]
 
         try:
@@ -108,7 +179,7 @@ class ImageOrientationDatasetFromCache(Dataset):
             label = int(label_str)
 
             # Load the already-rotated image
-            image = load_image_safely(image_path)
+            image = load_image_safely(image_path, target_size=config.DECODE_TARGET_SIZE)
 
             if self.transform:
                 image_tensor = self.transform(image)
@@ -122,3 +193,74 @@ class ImageOrientationDatasetFromCache(Dataset):
             return self.__getitem__(random.randint(0, len(self) - 1))
 
         return image_tensor, torch.tensor(label, dtype=torch.long)
+
+
+# Reads the pre-resized shard cache built by `src.caching.build_shard_cache`.
+# Samples are slices of memory-mapped uint8 arrays: no per-sample open, listdir or image decode.
+class ImageOrientationDatasetFromShards(Dataset):
+    def __init__(self, shard_dir, transform=None):
+        self.shard_dir = shard_dir
+        self.transform = transform
+
+        index_path = os.path.join(shard_dir, SHARD_INDEX_FILE)
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(
+                f"Shard cache is missing or incomplete: '{shard_dir}'. "
+                "Run the caching process in `train.py` first."
+            )
+        with open(index_path) as f:
+            index = json.load(f)
+
+        self.resolution = index["resolution"]
+        self.shards = index["shards"]
+        if not self.shards:
+            raise ValueError(f"The shard cache in {shard_dir} contains no samples.")
+
+        # offsets[i] is the global index of the first sample in shard i
+        self.offsets = [0]
+        for shard in self.shards:
+            self.offsets.append(self.offsets[-1] + shard["count"])
+
+        # Labels are small, so they are loaded eagerly; image memmaps are opened
+        # lazily in each DataLoader worker (see __getstate__).
+        self.labels = np.concatenate(
+            [np.load(os.path.join(shard_dir, shard["labels"])) for shard in self.shards]
+        )
+        self._images = None
+
+    def __getstate__(self):
+        # Never pickle (and thereby copy) the mapped arrays into workers or deepcopies
+        state = self.__dict__.copy()
+        state["_images"] = None
+        return state
+
+    def _open_shards(self):
+        shape = (self.resolution, self.resolution, 3)
+        self._images = [
+            np.memmap(
+                os.path.join(self.shard_dir, shard["images"]),
+                dtype=np.uint8,
+                mode="r",
+                shape=(shard["count"], *shape),
+            )
+            for shard in self.shards
+        ]
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def __getitem__(self, idx):
+        if self._images is None:
+            self._open_shards()
+
+        shard_idx = bisect.bisect_right(self.offsets, idx) - 1
+        pixels = self._images[shard_idx][idx - self.offsets[shard_idx]]
+        # fromarray copies the page-cache-backed slice into a regular PIL image
+        image = Image.fromarray(np.ascontiguousarray(pixels), mode="RGB")
+
+        if self.transform:
+            image_tensor = self.transform(image)
+        else:
+            image_tensor = transforms.ToTensor()(image)
+
+        return image_tensor, torch.tensor(int(self.labels[idx]), dtype=torch.long)
@@ -0,0 +1,188 @@
+import csv
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+import config
+from src.utils import load_image_safely
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def iter_image_files(root_dir, extensions=IMAGE_EXTENSIONS):
+    """
+    Recursively yields image paths under root_dir in a stable (sorted) order.
+    ImagePathDataset lists the whole tree with it once, up front, before any image is decoded.
+    """
+    try:
+        entries = sorted(os.scandir(root_dir), key=lambda entry: entry.name)
+    except OSError as e:
+        logging.warning(f"Could not list directory {root_dir}: {e}")
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from iter_image_files(entry.path, extensions)
+        elif entry.name.lower().endswith(extensions):
+            yield entry.path
+
+
+class ImagePathDataset(Dataset):
+    """
+    Yields (path, tensor, decode_seconds, error) samples for every image under root_dir.
+    The tree is listed once, in the process that builds the dataset; DataLoader workers
+    then only decode the batches of indices the sampler hands them.
+    """
+
+    def __init__(self, root_dir, transform, target_size=None):
+        self.transform = transform
+        # Images are decoded at a reduced resolution that still covers the transform's input
+        self.target_size = target_size
+        self.image_paths = list(iter_image_files(root_dir))
+
+    def __len__(self):
+        return len(self.image_paths)
+
+    def __getitem__(self, idx):
+        path = self.image_paths[idx]
+        start = time.perf_counter()
+        try:
+            tensor = self.transform(load_image_safely(path, target_size=self.target_size))
+            error = None
+        except Exception as e:
+            tensor, error = None, str(e)
+        return path, tensor, time.perf_counter() - start, error
+
+
+def collate_predictions(samples):
+    """Stacks the decoded images of a batch; failed files are passed through separately."""
+    decoded = [sample for sample in samples if sample[1] is not None]
+    failed = [(path, error) for path, _, _, error in samples if error is not None]
+    inputs = torch.stack([tensor for _, tensor, _, _ in decoded]) if decoded else None
+    return {
+        "paths": [path for path, _, _, _ in decoded],
+        "inputs": inputs,
+        "decode_seconds": sum(seconds for _, _, seconds, _ in samples),
+        "failed": failed,
+    }
+
+
+class PredictionWriter:
+    """Writes one row per image to a .csv or .jsonl file, flushing after every batch."""
+
+    FIELDS = ["path", "predicted_class", "rotation", "confidence", "error"]
+
+    def __init__(self, output_path):
+        self.format = "jsonl" if output_path.lower().endswith((".jsonl", ".json")) else "csv"
+        self.file = open(output_path, "w", newline="", encoding="utf-8")
+        if self.format == "csv":
+            self.csv_writer = csv.DictWriter(self.file, fieldnames=self.FIELDS)
+            self.csv_writer.writeheader()
+
+    def write(self, rows):
+        for row in rows:
+            if self.format == "csv":
+                self.csv_writer.writerow(row)
+            else:
+                self.file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def predict_directory(
+    input_dir, predict_batch, transform, batch_size, num_workers, output_path=None, target_size=None
+):
+    """
+    Batched directory inference shared by predict.py and predict_onnx.py.
+
+    Args:
+        predict_batch: callable mapping an (N, 3, H, W) float tensor to (N, NUM_CLASSES) logits (numpy).
+        output_path: optional .csv / .jsonl file; without it every prediction is printed.
+        target_size: smallest image side the transform needs (see load_image_safely).
+
+    Returns:
+        A dict with image counts and the wall, data-wait, decode and inference times.
+    """
+    loader = DataLoader(
+        ImagePathDataset(input_dir, transform, target_size),
+        batch_size=batch_size,
+        num_workers=num_workers,
+        collate_fn=collate_predictions,
+        prefetch_factor=4 if num_workers > 0 else None,
+    )
+    writer = PredictionWriter(output_path) if output_path else None
+
+    stats = {"images": 0, "failed": 0, "wall_seconds": 0.0, "wait_seconds": 0.0,
+             "decode_seconds": 0.0, "inference_seconds": 0.0}
+    start = time.perf_counter()
+    wait_start = start
+    try:
+        for batch in loader:
+            # Time the main process spent waiting for decoded batches
+            stats["wait_seconds"] += time.perf_counter() - wait_start
+            stats["decode_seconds"] += batch["decode_seconds"]
+
+            rows = [
+                {"path": path, "predicted_class": None, "rotation": None, "confidence": None, "error": error}
+                for path, error in batch["failed"]
+            ]
+            stats["failed"] += len(batch["failed"])
+
+            if batch["inputs"] is not None:
+                inference_start = time.perf_counter()
+                logits = predict_batch(batch["inputs"])
+                stats["inference_seconds"] += time.perf_counter() - inference_start
+
+                shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+                probabilities = shifted / shifted.sum(axis=1, keepdims=True)
+                for path, scores in zip(batch["paths"], probabilities):
+                    predicted_class = int(scores.argmax())
+                    rows.append({
+                        "path": path,
+                        "predicted_class": predicted_class,
+                        "rotation": config.ROTATIONS[predicted_class],
+                        "confidence": round(float(scores[predicted_class]), 6),
+                        "error": None,
+                    })
+                stats["images"] += len(batch["paths"])
+
+            if writer:
+                writer.write(rows)
+            else:
+                for row in rows:
+                    name = os.path.relpath(row["path"], input_dir)
+                    if row["error"]:
+                        print(f"-> Image: '{name}' | Error: {row['error']}")
+                    else:
+                        print(f"-> Image: '{name}' | Prediction: {config.CLASS_MAP[row['predicted_class']]}")
+            wait_start = time.perf_counter()
+    finally:
+        if writer:
+            writer.close()
+
+    stats["wall_seconds"] = time.perf_counter() - start
+    return stats
+
+
+def log_directory_stats(input_dir, stats, num_workers):
+    """Prints the throughput summary of predict_directory."""
+    processed = stats["images"]
+    wall = stats["wall_seconds"]
+    print(
+        f"Finished processing directory '{input_dir}': {processed} images "
+        f"({stats['failed']} failed) in {wall:.2f} seconds, "
+        f"{processed / wall if wall else 0.0:.1f} images/sec."
+    )
+    # Decode time is summed over all loader workers, so it can exceed the wall time
+    print(
+        f"  Decode: {stats['decode_seconds']:.2f} s total over {max(num_workers, 1)} worker(s) "
+        f"({1000 * stats['decode_seconds'] / max(processed + stats['failed'], 1):.1f} ms/image) | "
+        f"Inference: {stats['inference_seconds']:.2f} s | "
+        f"Waiting for data: {stats['wait_seconds']:.2f} s"
+    )
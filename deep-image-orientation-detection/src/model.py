@@ -1,45 +1,100 @@
+import torch
 import torch.nn as nn
 import torchvision.models as models
-from config import NUM_CLASSES
+from config import IMAGE_SIZE, MODEL_ARCH, NUM_CLASSES
 import logging
 
+# Supported backbones: constructor, ImageNet weights, index of the last classifier layer
+ARCHITECTURES = {
+    "efficientnet_v2_s": (models.efficientnet_v2_s, models.EfficientNet_V2_S_Weights.IMAGENET1K_V1, 1),
+    "efficientnet_b0": (models.efficientnet_b0, models.EfficientNet_B0_Weights.IMAGENET1K_V1, 1),
+    "mobilenet_v3_large": (models.mobilenet_v3_large, models.MobileNet_V3_Large_Weights.IMAGENET1K_V2, 3),
+    "mobilenet_v3_small": (models.mobilenet_v3_small, models.MobileNet_V3_Small_Weights.IMAGENET1K_V1, 3),
+}
 
-def get_orientation_model(pretrained=True, num_blocks_to_unfreeze=5):
+
+def get_orientation_model(pretrained=True, num_blocks_to_unfreeze=5, arch=MODEL_ARCH):
     """
-    Loads a pre-trained EfficientNet model and configures it for fine-tuning.
+    Loads a pre-trained backbone and configures it for fine-tuning.
 
     Args:
         pretrained (bool): Whether to load ImageNet weights.
-        num_blocks_to_unfreeze (int): How many of the final 8 feature blocks to unfreeze.
-                                     Set to 8 to unfreeze all feature blocks (full fine-tuning).
+        num_blocks_to_unfreeze (int): How many of the final feature blocks to unfreeze.
+                                     None trains every parameter (full fine-tuning).
+        arch (str): One of ARCHITECTURES. The default EfficientNetV2-S is the production model,
+                    the smaller ones are meant as distillation students.
     """
-    weights = models.EfficientNet_V2_S_Weights.IMAGENET1K_V1 if pretrained else None
-    model = models.efficientnet_v2_s(weights=weights)
+    if arch not in ARCHITECTURES:
+        raise ValueError(f"Unknown architecture '{arch}'. Choose one of: {', '.join(ARCHITECTURES)}")
+    constructor, default_weights, head_index = ARCHITECTURES[arch]
+    weights = default_weights if pretrained else None
+    model = constructor(weights=weights)
 
-    # Freeze all parameters
-    for param in model.parameters():
-        param.requires_grad = False
+    if num_blocks_to_unfreeze is None:
+        logging.info("Fine-tuning enabled: All layers are trainable.")
+    else:
+        # Freeze all parameters
+        for param in model.parameters():
+            param.requires_grad = False
 
-    # Unfreeze the classifier head first, which is always desirable.
-    for param in model.classifier.parameters():
-        param.requires_grad = True
+        # Unfreeze the classifier head first, which is always desirable.
+        for param in model.classifier.parameters():
+            param.requires_grad = True
 
-    # Unfreeze the specified number of final blocks in the feature extractor
-    if num_blocks_to_unfreeze > 0:
-        # Slicing from a negative index unfreezes the last N blocks.
-        for block in model.features[-num_blocks_to_unfreeze:]:
-            for param in block.parameters():
-                param.requires_grad = True
+        # Unfreeze the specified number of final blocks in the feature extractor
+        if num_blocks_to_unfreeze > 0:
+            # Slicing from a negative index unfreezes the last N blocks.
+            for block in model.features[-num_blocks_to_unfreeze:]:
+                for param in block.parameters():
+                    param.requires_grad = True
 
-    logging.info(f"Fine-tuning enabled: Unfroze the final {num_blocks_to_unfreeze} feature blocks and the classifier.")
+        logging.info(f"Fine-tuning enabled: Unfroze the final {num_blocks_to_unfreeze} feature blocks and the classifier.")
 
     # Get the number of input features for the classifier
-    num_ftrs = model.classifier[1].in_features
+    num_ftrs = model.classifier[head_index].in_features
+
+    if arch.startswith("efficientnet"):
+        # Replace the final fully connected layer.
+        model.classifier = nn.Sequential(
+            nn.Dropout(p=0.3, inplace=True),
+            nn.Linear(num_ftrs, NUM_CLASSES),
+        )
+    else:
+        # MobileNetV3 keeps its hidden layer, only the output layer is replaced.
+        model.classifier[head_index] = nn.Linear(num_ftrs, NUM_CLASSES)
+
+    return model
 
-    # Replace the final fully connected layer.
-    model.classifier = nn.Sequential(
-        nn.Dropout(p=0.3, inplace=True),
-        nn.Linear(num_ftrs, NUM_CLASSES),
-    )
 
-    return model
\ No newline at end of file
+def save_orientation_model(model, path, arch=MODEL_ARCH, image_size=IMAGE_SIZE):
+    """
+    Saves model weights. The default architecture is saved as a plain state_dict (as before);
+    other architectures are saved together with their architecture and input size, so that
+    they can be loaded without extra configuration.
+    """
+    if arch == MODEL_ARCH and image_size == IMAGE_SIZE:
+        torch.save(model.state_dict(), path)
+    else:
+        torch.save({"arch": arch, "image_size": image_size, "state_dict": model.state_dict()}, path)
+
+
+def load_orientation_model(path, map_location="cpu"):
+    """
+    Loads a model saved by train.py (plain state_dict or a distilled student).
+
+    Returns:
+        (model, arch, image_size): the model in eval mode, its architecture and input size.
+    """
+    checkpoint = torch.load(path, map_location=map_location)
+    arch, image_size, state_dict = MODEL_ARCH, IMAGE_SIZE, checkpoint
+    if "state_dict" in checkpoint and "arch" in checkpoint:
+        arch = checkpoint["arch"]
+        image_size = checkpoint["image_size"]
+        state_dict = checkpoint["state_dict"]
+
+    model = get_orientation_model(pretrained=False, arch=arch)
+    model.load_state_dict(state_dict)
+    # Keep the precision the weights were saved in (e.g. bf16 from quantize.py)
+    model.to(next(tensor.dtype for tensor in state_dict.values() if tensor.is_floating_point()))
+    model.eval()
+    return model, arch, image_size
@@ -0,0 +1,139 @@
+import logging
+import os
+import random
+import time
+
+import torch
+from torch.profiler import ProfilerActivity, profile, schedule, tensorboard_trace_handler
+
+
+class _TimedTransform:
+    """Wraps a transform and accumulates the time spent in it."""
+
+    def __init__(self, transform):
+        self.transform = transform
+        self.seconds = 0.0
+
+    def __call__(self, image):
+        start = time.perf_counter()
+        output = self.transform(image)
+        self.seconds += time.perf_counter() - start
+        return output
+
+
+def measure_data_pipeline(subset, num_items=64, samples_per_item=1):
+    """
+    Splits the per-sample cost of a dataset into loading (decode, rotation, cache reads)
+    and the transform (augmentation), by reading num_items random items in the main process.
+
+    Returns:
+        A dict with the number of samples read and the per-sample load and transform times in ms.
+    """
+    dataset = subset.dataset
+    indices = random.sample(list(subset.indices), min(num_items, len(subset.indices)))
+    original_transform = dataset.transform
+    timed_transform = _TimedTransform(original_transform)
+    dataset.transform = timed_transform
+    try:
+        start = time.perf_counter()
+        for index in indices:
+            dataset[index]
+        total_seconds = time.perf_counter() - start
+    finally:
+        dataset.transform = original_transform
+
+    samples = max(len(indices) * samples_per_item, 1)
+    return {
+        "samples": samples,
+        "load_ms": 1000 * (total_seconds - timed_transform.seconds) / samples,
+        "transform_ms": 1000 * timed_transform.seconds / samples,
+    }
+
+
+class TrainingProfiler:
+    """
+    Profiling mode of the training loop (train.py --profile).
+
+    Every step is split into the time spent waiting for the next batch from the
+    DataLoader and the time spent in compute (transfer, forward, backward, optimizer).
+    A torch.profiler trace is recorded for the window of steps given by wait/warmup/active
+    (counted from the first training step) and written next to the TensorBoard events,
+    together with a table of the most expensive operators.
+    """
+
+    def __init__(self, writer, device, wait, warmup, active, top_operators=15):
+        self.writer = writer
+        self.device = device
+        self.top_operators = top_operators
+        self.trace_dir = os.path.join(writer.log_dir, "profiler")
+        activities = [ProfilerActivity.CPU]
+        if device.type == "cuda":
+            activities.append(ProfilerActivity.CUDA)
+        self.profiler = profile(
+            activities=activities,
+            schedule=schedule(wait=wait, warmup=warmup, active=active, repeat=1),
+            on_trace_ready=self._on_trace_ready,
+            record_shapes=True,
+        )
+        self.profiler.start()
+        self._reset()
+
+    def _reset(self):
+        self.steps, self.samples = 0, 0
+        self.wait_seconds, self.compute_seconds = 0.0, 0.0
+        self._mark = time.perf_counter()
+
+    def start_epoch(self):
+        self._reset()
+
+    def data_ready(self):
+        """Called as soon as the DataLoader has returned a batch."""
+        now = time.perf_counter()
+        self.wait_seconds += now - self._mark
+        self._mark = now
+
+    def step_done(self, batch_size):
+        """Called after the optimizer step; waits for the device so compute is not under-counted."""
+        if self.device.type == "cuda":
+            torch.cuda.synchronize()
+        now = time.perf_counter()
+        self.compute_seconds += now - self._mark
+        self._mark = now
+        self.steps += 1
+        self.samples += batch_size
+        self.profiler.step()
+
+    def end_epoch(self, epoch):
+        """Logs the wait / compute breakdown of the epoch and writes it to TensorBoard."""
+        if not self.steps:
+            return
+        busy_seconds = self.wait_seconds + self.compute_seconds
+        data_wait_percent = 100 * self.wait_seconds / busy_seconds
+        wait_ms = 1000 * self.wait_seconds / self.steps
+        compute_ms = 1000 * self.compute_seconds / self.steps
+        # What the model alone could sustain if batches were always ready
+        compute_samples_per_sec = self.samples / self.compute_seconds
+
+        logging.info(
+            f"   Profile: data wait {data_wait_percent:.1f}% | "
+            f"wait {wait_ms:.1f} ms/step | compute {compute_ms:.1f} ms/step | "
+            f"compute-bound throughput {compute_samples_per_sec:.1f} samples/s"
+        )
+        self.writer.add_scalar("Profile/data_wait_percent", data_wait_percent, epoch)
+        self.writer.add_scalar("Profile/data_wait_ms_per_step", wait_ms, epoch)
+        self.writer.add_scalar("Profile/compute_ms_per_step", compute_ms, epoch)
+        self.writer.add_scalar("Throughput/compute_samples_per_sec", compute_samples_per_sec, epoch)
+
+    def _on_trace_ready(self, prof):
+        tensorboard_trace_handler(self.trace_dir)(prof)
+        sort_by = "self_cuda_time_total" if self.device.type == "cuda" else "self_cpu_time_total"
+        table = prof.key_averages().table(sort_by=sort_by, row_limit=self.top_operators)
+        logging.info(f"Top operators of the profiled steps (trace saved to {self.trace_dir}):\n{table}")
+        # Indented lines render as a code block in TensorBoard's text tab
+        self.writer.add_text(
+            "Profile/top_operators", "\n".join("    " + line for line in table.splitlines())
+        )
+
+    def stop(self):
+        """Stops the profiler; a window still recording is flushed."""
+        self.profiler.stop()
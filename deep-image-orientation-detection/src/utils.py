@@ -2,7 +2,7 @@ import torch
 import logging
 import sys
 import torchvision.transforms as transforms
-from config import IMAGE_SIZE
+from config import IMAGE_DECODER, IMAGE_SIZE
 from PIL import Image, ImageOps
 
 
@@ -31,15 +31,24 @@ def get_device() -> torch.device:
     return device
 
 
-def get_data_transforms() -> dict:
+def bf16_supported() -> bool:
+    """bf16 only pays off on CPUs with native support (AVX512-BF16 / AMX)."""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def get_data_transforms(image_size: int = IMAGE_SIZE) -> dict:
     """
-    Returns a dictionary of data transformations for training and validation.
+    Returns a dictionary of data transformations for training and validation
+    at the given input size (config.IMAGE_SIZE by default).
     """
     return {
         "train": transforms.Compose(
             [
                 # Use a crop that preserves more of the image center
-                transforms.RandomResizedCrop(IMAGE_SIZE, scale=(0.85, 1.0)),
+                transforms.RandomResizedCrop(image_size, scale=(0.85, 1.0)),
                 # ColorJitter is a good augmentation that doesn't affect orientation
                 transforms.ColorJitter(
                     brightness=0.2, contrast=0.2, saturation=0.2, hue=0.1
@@ -55,8 +64,8 @@ def get_data_transforms() -> dict:
         "val": transforms.Compose(
             [
                 # Validation transform is fine as is
-                transforms.Resize((IMAGE_SIZE + 32, IMAGE_SIZE + 32)),
-                transforms.CenterCrop(IMAGE_SIZE),
+                transforms.Resize((image_size + 32, image_size + 32)),
+                transforms.CenterCrop(image_size),
                 transforms.ToTensor(),
                 transforms.Normalize(
                     mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]
@@ -66,34 +75,115 @@ def get_data_transforms() -> dict:
     }
 
 
-def load_image_safely(path: str) -> Image.Image:
+# Lossless equivalents of Image.rotate(angle, expand=True) for the angles in config.ROTATIONS
+_TRANSPOSE_FOR_ANGLE = {
+    90: Image.Transpose.ROTATE_90,
+    180: Image.Transpose.ROTATE_180,
+    270: Image.Transpose.ROTATE_270,
+}
+
+
+def rotate_exact(image: Image.Image, angle: int) -> Image.Image:
+    """
+    Rotates an image counter-clockwise by a multiple of 90 degrees with a lossless
+    transpose (no resampling). The result is the same as image.rotate(angle, expand=True).
+    """
+    if angle % 360 == 0:
+        return image
+    return image.transpose(_TRANSPOSE_FOR_ANGLE[angle % 360])
+
+
+# Backends of load_image_safely (config.IMAGE_DECODER)
+IMAGE_DECODERS = ("pil", "opencv")
+
+
+def load_image_safely(path, target_size: int = None, decoder: str = None) -> Image.Image:
     """
     Loads an image, respects EXIF orientation, and safely converts it to a
     3-channel RGB format. It handles palletized images and images with
     transparency by compositing them onto a white background. This is the
     most robust way to prevent processing errors.
+
+    Args:
+        path: File path or a binary file object.
+        target_size (int): Optional smallest side the caller needs (e.g. IMAGE_SIZE + 32).
+                           The image is then decoded at a reduced resolution whose sides stay
+                           >= target_size: JPEG DCT scaling first, then an integer Image.reduce.
+        decoder (str): "pil" or "opencv" (libjpeg-turbo, JPEG only; other formats use PIL).
+                       Defaults to config.IMAGE_DECODER.
     """
+    decoder = decoder or IMAGE_DECODER
+    if decoder not in IMAGE_DECODERS:
+        raise ValueError(f"Unknown image decoder '{decoder}'. Choose one of: {', '.join(IMAGE_DECODERS)}")
+
     # 1. Open the image
     img = Image.open(path)
 
-    # 2. Respect the EXIF orientation tag before any other processing.
+    if decoder == "opencv" and img.format == "JPEG":
+        return _reduce_to(_load_jpeg_with_opencv(img, path, target_size), target_size)
+
+    # 2. JPEG only: let libjpeg decode at 1/2, 1/4 or 1/8 scale (DCT scaling).
+    #    draft keeps both sides >= the requested size.
+    if target_size and img.format == "JPEG":
+        img.draft(img.mode, (target_size, target_size))
+
+    # 3. Respect the EXIF orientation tag before any other processing.
     img = ImageOps.exif_transpose(img)
 
-    # 3. If the image is already in a simple mode that can be directly
+    # 4. If the image is already in a simple mode that can be directly
     #    converted to RGB, do it and return.
     if img.mode in ("RGB", "L"):  # L is grayscale
-        return img.convert("RGB")
+        return _reduce_to(img.convert("RGB"), target_size)
 
-    # 4. For all other modes (including P, PA, RGBA, etc.), convert to RGBA
+    # 5. For all other modes (including P, PA, RGBA, etc.), convert to RGBA
     #    first. This is the crucial step that standardizes the image
     #    and correctly handles transparency.
     rgba_img = img.convert("RGBA")
 
-    # 5. Create a new white background image in RGB mode.
+    # 6. Create a new white background image in RGB mode.
     background = Image.new("RGB", rgba_img.size, (255, 255, 255))
 
-    # 6. Paste the RGBA image onto the white background. The `rgba_img`
+    # 7. Paste the RGBA image onto the white background. The `rgba_img`
     #    itself is used as the mask, which tells Pillow to use its alpha channel.
     background.paste(rgba_img, mask=rgba_img)
 
-    return background
+    return _reduce_to(background, target_size)
+
+
+def _reduce_to(img: Image.Image, target_size: int) -> Image.Image:
+    """Box-downscales by the largest integer factor that keeps both sides >= target_size."""
+    if not target_size:
+        return img
+    factor = min(img.width // target_size, img.height // target_size)
+    return img.reduce(factor) if factor >= 2 else img
+
+
+def _load_jpeg_with_opencv(img: Image.Image, path, target_size: int) -> Image.Image:
+    """
+    Decodes a JPEG with OpenCV (libjpeg-turbo), using its reduced-resolution modes.
+    OpenCV applies the EXIF orientation itself, and JPEGs have no alpha channel.
+    """
+    import cv2
+    import numpy as np
+
+    flag = cv2.IMREAD_COLOR
+    if target_size:
+        scale = min(img.width // target_size, img.height // target_size)
+        for factor, reduced_flag in (
+            (8, cv2.IMREAD_REDUCED_COLOR_8),
+            (4, cv2.IMREAD_REDUCED_COLOR_4),
+            (2, cv2.IMREAD_REDUCED_COLOR_2),
+        ):
+            if scale >= factor:
+                flag = reduced_flag
+                break
+    if isinstance(path, str):
+        img.close()
+        data = np.fromfile(path, dtype=np.uint8)
+    else:
+        path.seek(0)
+        data = np.frombuffer(path.read(), dtype=np.uint8)
+    pixels = cv2.imdecode(data, flag)
+    if pixels is None:
+        raise ValueError("OpenCV could not decode the image")
+    return Image.fromarray(cv2.cvtColor(pixels, cv2.COLOR_BGR2RGB))
@@ -1,5 +1,6 @@
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import torch.optim as optim
 from torch.utils.data import DataLoader, random_split, Subset
 from copy import deepcopy
@@ -7,30 +8,117 @@ import os
 import argparse
 import logging
 import shutil
+import statistics
 import time
 
 import torch.amp as amp
 import config
-from src.caching import cache_dataset
-from src.dataset import ImageOrientationDataset, ImageOrientationDatasetFromCache
-from src.model import get_orientation_model
-from src.utils import get_device, setup_logging, get_data_transforms
+from src.caching import build_shard_cache, cache_dataset
+from src.dataset import (
+    ImageOrientationDataset,
+    ImageOrientationDatasetFromCache,
+    ImageOrientationDatasetFromShards,
+    ImageOrientationGroupedDataset,
+    collate_rotation_groups,
+)
+from src.model import get_orientation_model, load_orientation_model, save_orientation_model
+from src.profiling import TrainingProfiler, measure_data_pipeline
+from src.utils import bf16_supported, get_device, setup_logging, get_data_transforms
 import torch.optim.lr_scheduler as lr_scheduler
 from torch.utils.tensorboard import SummaryWriter
 
 
+def distillation_loss(student_logits, teacher_logits, labels, criterion, temperature, alpha):
+    """
+    Hinton-style distillation: KL divergence between the softened teacher and student
+    distributions (scaled by T^2 to keep gradient magnitudes comparable), mixed with
+    the usual hard-label loss.
+    """
+    student_logits, teacher_logits = student_logits.float(), teacher_logits.float()
+    soft_loss = F.kl_div(
+        F.log_softmax(student_logits / temperature, dim=1),
+        F.softmax(teacher_logits / temperature, dim=1),
+        reduction="batchmean",
+    ) * (temperature**2)
+    return alpha * soft_loss + (1 - alpha) * criterion(student_logits, labels)
+
+
+def evaluate_accuracy(model, loader, device):
+    """Returns the accuracy of a model on a DataLoader."""
+    model.eval()
+    corrects, total = 0, 0
+    with torch.no_grad():
+        for inputs, labels in loader:
+            outputs = model(inputs.to(device, non_blocking=True))
+            corrects += (outputs.argmax(dim=1).cpu() == labels).sum().item()
+            total += labels.size(0)
+    return corrects / total
+
+
+def measure_cpu_latency(model, image_size, runs=20):
+    """Median single-image CPU latency of a model in milliseconds."""
+    model = deepcopy(model).float().cpu().eval()
+    dummy_input = torch.randn(1, 3, image_size, image_size)
+    timings = []
+    with torch.no_grad():
+        for _ in range(3):  # warm-up
+            model(dummy_input)
+        for _ in range(runs):
+            start = time.perf_counter()
+            model(dummy_input)
+            timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def available_cpu_cores():
+    """CPU cores this process may run on (respects taskset and container CPU sets)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def configure_cpu_threads(num_workers, num_threads=0):
+    """
+    Splits the CPU cores between the DataLoader workers (torch runs single-threaded
+    inside each worker) and the intra-op threads of the training step, so the two
+    do not oversubscribe the cores. Returns the number of intra-op threads.
+    """
+    if num_threads <= 0:
+        num_threads = max(available_cpu_cores() - num_workers, 1)
+    torch.set_num_threads(num_threads)
+    return num_threads
+
+
 def train(args):
     """Main training routine."""
     setup_logging()
     training_start_time = time.time()
 
+    device = torch.device("cpu") if args.cpu else get_device()
+    cpu_mode = device.type == "cpu"
+    # BATCH_SIZE and NUM_WORKERS are sized for a GPU box; CPU training has its own defaults
+    if args.batch_size is None:
+        args.batch_size = config.CPU_BATCH_SIZE if cpu_mode else config.BATCH_SIZE
+    if args.workers is None:
+        args.workers = config.CPU_NUM_WORKERS if cpu_mode else config.NUM_WORKERS
+    if cpu_mode:
+        configure_cpu_threads(args.workers, args.threads)
+    compile_mode = args.compile_mode or config.COMPILE_MODE.get(device.type, "default")
+    # bf16 autocast on CUDA, and on CPUs with native bf16 support; plain fp32 otherwise
+    amp_enabled = device.type == "cuda" or (cpu_mode and bf16_supported())
+    autocast_device = "cuda" if device.type == "cuda" else "cpu"
+    # NHWC lets oneDNN pick its fastest convolution kernels on CPU
+    memory_format = torch.channels_last if cpu_mode else torch.contiguous_format
+
     logging.info("=================================================")
     logging.info("      STARTING MODEL TRAINING SCRIPT")
     logging.info("=================================================")
     logging.info("Configuration:")
     logging.info(f"  - Using Cache: {config.USE_CACHE}")
     if config.USE_CACHE:
-        logging.info(f"  - Cache Directory: {config.CACHE_DIR}")
+        logging.info(f"  - Cache Format: {config.CACHE_FORMAT}")
+        cache_location = config.SHARD_CACHE_DIR if config.CACHE_FORMAT == "shards" else config.CACHE_DIR
+        logging.info(f"  - Cache Directory: {cache_location}")
         logging.info(f"  - Force Rebuild Cache: {args.force_rebuild_cache}")
     logging.info(f"  - Resume from checkpoint: {args.resume}")
     logging.info(f"  - Source Data Directory: {args.data_dir}")
@@ -39,14 +127,36 @@ def train(args):
     logging.info(f"  - Batch Size: {args.batch_size}")
     logging.info(f"  - Learning Rate: {args.lr}")
     logging.info(f"  - Dataloader Workers: {args.workers}")
+    logging.info(f"  - Device: {device.type}")
+    if cpu_mode:
+        logging.info(f"  - Intra-op Threads: {torch.get_num_threads()} of {available_cpu_cores()} cores")
+        logging.info("  - Memory Format: channels_last")
+    logging.info(f"  - Mixed Precision (bf16): {amp_enabled}")
+    logging.info(f"  - Compile Mode: {compile_mode}")
+    logging.info(f"  - Profiling: {args.profile}")
+    logging.info(f"  - Distillation: {args.distill}")
+    if args.distill:
+        logging.info(f"  - Teacher: {args.teacher_path}")
+        logging.info(f"  - Student: {args.student_arch} at {args.student_image_size}px")
+        logging.info(f"  - Temperature: {args.temperature}, Alpha: {args.alpha}")
+
+    # In distillation mode the student gets its own files, so the teacher's are never overwritten
+    if args.distill:
+        model_arch, model_image_size = args.student_arch, args.student_image_size
+        run_name = f"{config.MODEL_NAME}_student_{model_arch}"
+        best_model_filename = "student_model.pth"
+        checkpoint_filename = "student_checkpoint.pth"
+    else:
+        model_arch, model_image_size = config.MODEL_ARCH, config.IMAGE_SIZE
+        run_name = config.MODEL_NAME
+        best_model_filename = "best_model.pth"
+        checkpoint_filename = "checkpoint.pth"
 
-    writer = SummaryWriter(f"runs/{config.MODEL_NAME}")
+    writer = SummaryWriter(f"runs/{run_name}")
 
     # Ensure model save directory exists
     os.makedirs(args.model_dir, exist_ok=True)
 
-    device = get_device()
-
     # Determine if pin_memory should be used
     pin_memory_enabled = device.type == "cuda"
     if pin_memory_enabled:
@@ -61,7 +171,16 @@ def train(args):
     # 1. Create a single, full dataset instance without any transforms yet.
     #    This 'base_dataset' will be the source for our splits.
     try:
-        if config.USE_CACHE:
+        if config.USE_CACHE and config.CACHE_FORMAT == "shards":
+            build_shard_cache(force_rebuild=args.force_rebuild_cache)
+            base_dataset = ImageOrientationDatasetFromShards(
+                shard_dir=config.SHARD_CACHE_DIR, transform=None
+            )
+            logging.info(
+                f"Successfully loaded dataset from SHARD CACHE ({len(base_dataset)} images "
+                f"in {len(base_dataset.shards)} shards)."
+            )
+        elif config.USE_CACHE:
             cache_dataset(force_rebuild=args.force_rebuild_cache)
             base_dataset = ImageOrientationDatasetFromCache(
                 cache_dir=config.CACHE_DIR, transform=None
@@ -69,6 +188,17 @@ def train(args):
             logging.info(
                 f"Successfully loaded dataset from CACHE ({len(base_dataset)} images)."
             )
+        elif config.GROUPED_ROTATIONS:
+            logging.info(
+                "Using ON-THE-FLY image processing with grouped rotations (each image is decoded once)."
+            )
+            base_dataset = ImageOrientationGroupedDataset(
+                upright_dir=args.data_dir, transform=None
+            )
+            logging.info(
+                f"Dataset found {len(base_dataset.image_files)} original image files "
+                f"({len(base_dataset) * base_dataset.samples_per_item} samples with rotations)."
+            )
         else:
             logging.info("Using ON-THE-FLY image processing (caching is disabled).")
             base_dataset = ImageOrientationDataset(
@@ -84,6 +214,12 @@ def train(args):
         logging.error(f"Failed to initialize dataset: {e}")
         return
 
+    # A grouped dataset yields all rotations of one image per item, so the split is by
+    # source image and the loaders batch fewer items to keep the same number of samples.
+    samples_per_item = getattr(base_dataset, "samples_per_item", 1)
+    loader_batch_size = max(args.batch_size // samples_per_item, 1)
+    collate_fn = collate_rotation_groups if samples_per_item > 1 else None
+
     # 2. Split the single dataset instance *once* to get disjoint sets of indices.
     train_size = int(0.8 * len(base_dataset))
     val_size = len(base_dataset) - train_size
@@ -98,41 +234,62 @@ def train(args):
     train_subset.dataset.transform = data_transforms["train"]
 
     val_subset.dataset = deepcopy(base_dataset)
-    val_subset.dataset.transform = data_transforms["val"]
+    # The student is validated on its own (smaller) input size. During training it sees
+    # the teacher's augmented view, downscaled on the device.
+    val_subset.dataset.transform = get_data_transforms(model_image_size)["val"]
 
     logging.info(
-        f"Splitting into Training: {len(train_subset)} samples, Validation: {len(val_subset)} samples."
+        f"Splitting into Training: {len(train_subset) * samples_per_item} samples, "
+        f"Validation: {len(val_subset) * samples_per_item} samples."
     )
 
     train_loader = DataLoader(
         train_subset,
-        batch_size=args.batch_size,
+        batch_size=loader_batch_size,
         shuffle=True,
         num_workers=args.workers,
         pin_memory=pin_memory_enabled,
         persistent_workers=True,
+        collate_fn=collate_fn,
     )
     val_loader = DataLoader(
         val_subset,
-        batch_size=args.batch_size,
+        batch_size=loader_batch_size,
         shuffle=False,
         num_workers=args.workers,
         pin_memory=pin_memory_enabled,
         persistent_workers=True,
+        collate_fn=collate_fn,
     )
     logging.info("Dataloaders created successfully.")
 
     logging.info("\n--- Setting up Model ---")
-    # Store the original model instance
-    original_model = get_orientation_model().to(device)
+    teacher_model = None
+    if args.distill:
+        if not os.path.exists(args.teacher_path):
+            logging.error(f"Teacher model not found at {args.teacher_path}.")
+            return
+        teacher_model, _, _ = load_orientation_model(args.teacher_path, map_location=device)
+        teacher_model = teacher_model.float().to(device, memory_format=memory_format)
+        for param in teacher_model.parameters():
+            param.requires_grad = False
+        logging.info(f"Loaded teacher from {args.teacher_path}.")
+
+        # The student is trained end to end from ImageNet weights
+        original_model = get_orientation_model(num_blocks_to_unfreeze=None, arch=model_arch).to(
+            device, memory_format=memory_format
+        )
+    else:
+        # Store the original model instance
+        original_model = get_orientation_model().to(device, memory_format=memory_format)
 
     # This will be the model instance used for training/inference during the loop
     model_for_training = original_model
 
     # Compile the model for performance if PyTorch 2.0+ is used
-    if hasattr(torch, "compile"):
-        logging.info("PyTorch 2.0+ detected. Compiling the model for performance...")
-        model_for_training = torch.compile(original_model, mode="reduce-overhead")
+    if hasattr(torch, "compile") and compile_mode != "none":
+        logging.info(f"PyTorch 2.0+ detected. Compiling the model for performance (mode={compile_mode})...")
+        model_for_training = torch.compile(original_model, mode=compile_mode)
 
     criterion = nn.CrossEntropyLoss(label_smoothing=0.1)  # Add label_smoothing
 
@@ -154,7 +311,7 @@ def train(args):
     start_epoch = 0
     best_val_acc = 0.0
     epochs_no_improve = 0
-    checkpoint_path = os.path.join(args.model_dir, "checkpoint.pth")
+    checkpoint_path = os.path.join(args.model_dir, checkpoint_filename)
 
     if args.resume and os.path.exists(checkpoint_path):
         logging.info(f"\n--- Resuming training from checkpoint: {checkpoint_path} ---")
@@ -183,6 +340,33 @@ def train(args):
     else:
         logging.info("\n--- Starting Training Loop from scratch ---")
 
+    profiler = None
+    if args.profile:
+        # Where does a sample's time go before it reaches the loader: decoding or augmentation?
+        data_costs = measure_data_pipeline(train_subset, config.PROFILE_DATA_SAMPLES, samples_per_item)
+        per_sample_ms = data_costs["load_ms"] + data_costs["transform_ms"]
+        logging.info(
+            f"Data pipeline ({data_costs['samples']} samples): load {data_costs['load_ms']:.1f} ms/sample, "
+            f"transform {data_costs['transform_ms']:.1f} ms/sample, "
+            f"~{max(args.workers, 1) * 1000 / per_sample_ms:.0f} samples/s with {args.workers} worker(s)"
+        )
+        writer.add_scalar("Profile/load_ms_per_sample", data_costs["load_ms"], start_epoch)
+        writer.add_scalar("Profile/transform_ms_per_sample", data_costs["transform_ms"], start_epoch)
+
+        profiler = TrainingProfiler(
+            writer,
+            device,
+            wait=args.profile_wait,
+            warmup=args.profile_warmup,
+            active=args.profile_active,
+            top_operators=config.PROFILE_TOP_OPERATORS,
+        )
+        logging.info(
+            f"Profiling steps {args.profile_wait + args.profile_warmup + 1}-"
+            f"{args.profile_wait + args.profile_warmup + args.profile_active}, "
+            f"trace written to {profiler.trace_dir}"
+        )
+
     # --- Training Loop ---
     early_stop_patience = 7  # Stop after 7 epochs of no improvement
 
@@ -192,16 +376,35 @@ def train(args):
         # --- Training Phase ---
         model_for_training.train()
         running_loss, running_corrects = 0.0, 0
+        if profiler:
+            profiler.start_epoch()
         for inputs, labels in train_loader:
+            if profiler:
+                profiler.data_ready()
             inputs, labels = (
-                inputs.to(device, non_blocking=True),
+                inputs.to(device, non_blocking=True, memory_format=memory_format),
                 labels.to(device, non_blocking=True),
             )
             optimizer.zero_grad(set_to_none=True)
 
-            with amp.autocast(device_type="cuda", dtype=torch.bfloat16):
-                outputs = model_for_training(inputs)
-                loss = criterion(outputs, labels)
+            with amp.autocast(device_type=autocast_device, dtype=torch.bfloat16, enabled=amp_enabled):
+                if teacher_model is not None:
+                    with torch.no_grad():
+                        teacher_outputs = teacher_model(inputs)
+                    student_inputs = F.interpolate(
+                        inputs,
+                        size=(model_image_size, model_image_size),
+                        mode="bilinear",
+                        align_corners=False,
+                        antialias=True,
+                    )
+                    outputs = model_for_training(student_inputs)
+                    loss = distillation_loss(
+                        outputs, teacher_outputs, labels, criterion, args.temperature, args.alpha
+                    )
+                else:
+                    outputs = model_for_training(inputs)
+                    loss = criterion(outputs, labels)
 
             # Backpropagation without scaler
             loss.backward()
@@ -210,9 +413,14 @@ def train(args):
             _, preds = torch.max(outputs, 1)
             running_loss += loss.item() * inputs.size(0)
             running_corrects += torch.sum(preds == labels.data)
+            if profiler:
+                profiler.step_done(inputs.size(0))
 
-        epoch_loss = running_loss / len(train_subset)
-        epoch_acc = running_corrects.float() / len(train_subset)
+        train_duration = time.time() - epoch_start_time
+        train_samples_per_sec = len(train_subset) * samples_per_item / train_duration
+
+        epoch_loss = running_loss / (len(train_subset) * samples_per_item)
+        epoch_acc = running_corrects.float() / (len(train_subset) * samples_per_item)
 
         # --- Validation Phase ---
         model_for_training.eval()
@@ -221,11 +429,11 @@ def train(args):
         with torch.no_grad():
             for inputs, labels in val_loader:
                 inputs, labels = (
-                    inputs.to(device, non_blocking=True),
+                    inputs.to(device, non_blocking=True, memory_format=memory_format),
                     labels.to(device, non_blocking=True),
                 )
 
-                with amp.autocast(device_type="cuda", dtype=torch.bfloat16):
+                with amp.autocast(device_type=autocast_device, dtype=torch.bfloat16, enabled=amp_enabled):
                     outputs = model_for_training(inputs)
                     loss = criterion(outputs, labels)
 
@@ -233,8 +441,8 @@ def train(args):
                 val_loss += loss.item() * inputs.size(0)
                 val_corrects += torch.sum(preds == labels.data)
 
-        val_epoch_loss = val_loss / len(val_subset)
-        val_epoch_acc = val_corrects.float() / len(val_subset)
+        val_epoch_loss = val_loss / (len(val_subset) * samples_per_item)
+        val_epoch_acc = val_corrects.float() / (len(val_subset) * samples_per_item)
 
         scheduler.step()
 
@@ -245,6 +453,7 @@ def train(args):
             f"Train Loss: {epoch_loss:.4f} Acc: {epoch_acc:.4f} | "
             f"Val Loss: {val_epoch_loss:.4f} Acc: {val_epoch_acc:.4f} | "
             f"LR: {optimizer.param_groups[0]['lr']:.2e} | "
+            f"Train: {train_samples_per_sec:.1f} samples/s | "
             f"Duration: {epoch_duration:.2f}s"
         )
 
@@ -256,6 +465,9 @@ def train(args):
         writer.add_scalar(
             "Hyperparameters/learning_rate", optimizer.param_groups[0]["lr"], epoch
         )
+        writer.add_scalar("Throughput/train_samples_per_sec", train_samples_per_sec, epoch)
+        if profiler:
+            profiler.end_epoch(epoch)
 
         # --- MODEL AND CHECKPOINT SAVING LOGIC ---
         current_acc = val_epoch_acc.item()
@@ -264,13 +476,13 @@ def train(args):
             epochs_no_improve = 0  # Reset counter
 
             # Save the best model (the original, un-compiled version)
-            static_save_path = os.path.join(args.model_dir, "best_model.pth")
-            torch.save(original_model.state_dict(), static_save_path)
+            static_save_path = os.path.join(args.model_dir, best_model_filename)
+            save_orientation_model(original_model, static_save_path, model_arch, model_image_size)
 
             # Also save a versioned name including the model name and accuracy
-            versioned_model_name = f"{config.MODEL_NAME}_{best_val_acc:.4f}.pth"
+            versioned_model_name = f"{run_name}_{best_val_acc:.4f}.pth"
             versioned_save_path = os.path.join(args.model_dir, versioned_model_name)
-            torch.save(original_model.state_dict(), versioned_save_path)
+            save_orientation_model(original_model, versioned_save_path, model_arch, model_image_size)
 
             logging.info(f"   New best model saved! Val Acc: {best_val_acc:.4f}")
             logging.info(
@@ -302,6 +514,9 @@ def train(args):
             )
             break
 
+    if profiler:
+        profiler.stop()
+
     # SUMMARY
     total_duration = time.time() - training_start_time
     total_minutes = total_duration / 60
@@ -311,12 +526,39 @@ def train(args):
     logging.info(
         f"Total Training Time: {total_duration:.2f} seconds ({total_minutes:.2f} minutes)"
     )
-    if os.path.exists(os.path.join(args.model_dir, "best_model.pth")):
-        final_model_name = f"{config.MODEL_NAME}_{best_val_acc:.4f}.pth"
+    best_model_path = os.path.join(args.model_dir, best_model_filename)
+    if os.path.exists(best_model_path):
+        final_model_name = f"{run_name}_{best_val_acc:.4f}.pth"
         logging.info(f"Best Validation Accuracy: {best_val_acc:.4f}")
         logging.info(
-            f"Final best model saved as 'best_model.pth' and '{final_model_name}'"
+            f"Final best model saved as '{best_model_filename}' and '{final_model_name}'"
         )
+
+        if teacher_model is not None:
+            # Compare the student with the teacher on the same validation images
+            teacher_val_subset = Subset(deepcopy(base_dataset), val_subset.indices)
+            teacher_val_subset.dataset.transform = data_transforms["val"]
+            teacher_val_loader = DataLoader(
+                teacher_val_subset,
+                batch_size=loader_batch_size,
+                num_workers=args.workers,
+                collate_fn=collate_fn,
+            )
+            teacher_acc = evaluate_accuracy(teacher_model, teacher_val_loader, device)
+            student_model, _, _ = load_orientation_model(best_model_path)
+            teacher_latency = measure_cpu_latency(teacher_model, config.IMAGE_SIZE)
+            student_latency = measure_cpu_latency(student_model, model_image_size)
+
+            logging.info("-------------------------------------------------")
+            logging.info(f"{'Model':<36} {'Val Acc':>8} {'CPU ms/img':>11}")
+            logging.info(
+                f"{'Teacher (' + config.MODEL_ARCH + f', {config.IMAGE_SIZE}px)':<36} "
+                f"{teacher_acc:>8.4f} {teacher_latency:>11.1f}"
+            )
+            logging.info(
+                f"{'Student (' + model_arch + f', {model_image_size}px)':<36} "
+                f"{best_val_acc:>8.4f} {student_latency:>11.1f}"
+            )
     else:
         logging.warning(
             "No model was saved as validation accuracy did not improve from its initial state."
@@ -349,7 +591,10 @@ if __name__ == "__main__":
         help="Number of training epochs.",
     )
     parser.add_argument(
-        "--batch_size", type=int, default=config.BATCH_SIZE, help="Training batch size."
+        "--batch_size",
+        type=int,
+        default=None,
+        help="Training batch size (default: config.BATCH_SIZE, or config.CPU_BATCH_SIZE on CPU).",
     )
     parser.add_argument(
         "--lr", type=float, default=config.LEARNING_RATE, help="Learning rate."
@@ -357,8 +602,26 @@ if __name__ == "__main__":
     parser.add_argument(
         "--workers",
         type=int,
-        default=config.NUM_WORKERS,
-        help="Number of data loading workers.",
+        default=None,
+        help="Number of data loading workers (default: config.NUM_WORKERS, or config.CPU_NUM_WORKERS on CPU).",
+    )
+    parser.add_argument(
+        "--cpu",
+        action="store_true",
+        help="Train on the CPU even if a GPU is available.",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=config.CPU_NUM_THREADS,
+        help="Intra-op threads when training on CPU (0 = cores left after the dataloader workers).",
+    )
+    parser.add_argument(
+        "--compile_mode",
+        type=str,
+        choices=["none", "default", "reduce-overhead", "max-autotune"],
+        default=None,
+        help="torch.compile mode (default: config.COMPILE_MODE for the device).",
     )
     parser.add_argument(
         "--force-rebuild-cache",
@@ -370,6 +633,64 @@ if __name__ == "__main__":
         action="store_true",
         help="Resume training from the last checkpoint.",
     )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Log data-wait vs compute time per epoch and record a torch.profiler trace.",
+    )
+    parser.add_argument(
+        "--profile_wait",
+        type=int,
+        default=config.PROFILE_WAIT_STEPS,
+        help="Training steps skipped before the profiler trace starts.",
+    )
+    parser.add_argument(
+        "--profile_warmup",
+        type=int,
+        default=config.PROFILE_WARMUP_STEPS,
+        help="Profiler warm-up steps (recorded but discarded).",
+    )
+    parser.add_argument(
+        "--profile_active",
+        type=int,
+        default=config.PROFILE_ACTIVE_STEPS,
+        help="Training steps recorded in the profiler trace.",
+    )
+    parser.add_argument(
+        "--distill",
+        action="store_true",
+        help="Train a smaller student on the soft targets of a trained teacher.",
+    )
+    parser.add_argument(
+        "--teacher_path",
+        type=str,
+        default=os.path.join(config.MODEL_SAVE_DIR, "best_model.pth"),
+        help="Teacher model used in distillation mode.",
+    )
+    parser.add_argument(
+        "--student_arch",
+        type=str,
+        default=config.STUDENT_ARCH,
+        help="Student architecture (see ARCHITECTURES in src/model.py).",
+    )
+    parser.add_argument(
+        "--student_image_size",
+        type=int,
+        default=config.STUDENT_IMAGE_SIZE,
+        help="Input size of the student.",
+    )
+    parser.add_argument(
+        "--temperature",
+        type=float,
+        default=config.DISTILL_TEMPERATURE,
+        help="Distillation temperature.",
+    )
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=config.DISTILL_ALPHA,
+        help="Weight of the soft-target loss.",
+    )
 
     args = parser.parse_args()
     train(args)
@@ -1,83 +1,64 @@
-from ultralytics import YOLO
+import logging
+from typing import List, Optional
+from PIL import Image
+from metrics import STAGE_SECONDS
+from postprocessing import log_boxes, non_max_suppression
+from yolo_backends import Detections, load_yolo_backend
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
 class SignatureDetector:
-    def __init__(self, model_path: str, iou_threshold: float = 0.4): 
-        # Для изменения жесткости отсеивания нужно изменять iou_threshold
-        self.model = YOLO(model_path)
+    def __init__(
+        self,
+        model_path: str,
+        iou_threshold: float = 0.4,
+        conf_threshold: float = 0.0,
+        max_candidates: Optional[int] = None,
+    ):
+        # Для изменения жесткости отсеивания нужно изменять iou_threshold.
+        # conf_threshold и max_candidates дополнительно отсекают слабые рамки до NMS
+        # (по умолчанию выключены, результат совпадает с выдачей модели)
+        # .pt - ultralytics, .onnx / OpenVINO IR - экспортированная модель (см. export_models.py)
+        self.backend = load_yolo_backend(model_path)
         self.iou_threshold = iou_threshold
-    
-    def _calculate_iou(self, box1, box2):
-        """Вычисляет IoU между двумя bounding boxes и возвращает значение."""
-        x1_min = max(box1[0], box2[0])
-        y1_min = max(box1[1], box2[1])
-        x2_max = min(box1[2], box2[2])
-        y2_max = min(box1[3], box2[3])
-        
-        intersection_area = max(0, x2_max - x1_min) * max(0, y2_max - y1_min)
-        box1_area = (box1[2] - box1[0]) * (box1[3] - box1[1])
-        box2_area = (box2[2] - box2[0]) * (box2[3] - box2[1])
-        union_area = box1_area + box2_area - intersection_area
-        
-        return intersection_area / union_area if union_area > 0 else 0
-    
+        self.conf_threshold = conf_threshold
+        self.max_candidates = max_candidates
+
     def _non_max_suppression(self, boxes, confidences):
         """Применяет NMS для удаления дублирующих bounding boxes и возвращает индексы."""
+        boxes = np.asarray(boxes)
+        confidences = np.asarray(confidences, dtype=np.float64)
         if len(boxes) == 0:
             return []
-        
-        indices = np.argsort(confidences)[::-1]
-        keep = []
-        
-        print("All detected boxes:")
-        for i, idx in enumerate(indices):
-            print(f"  Box{i+1}: [{boxes[idx][0]:.1f}, {boxes[idx][1]:.1f}, {boxes[idx][2]:.1f}, {boxes[idx][3]:.1f}] - confidence: {confidences[idx]:.3f}")
-        
-        while len(indices) > 0:
-            current_idx = indices[0]
-            keep.append(current_idx)
-            current_box = boxes[current_idx]
-            remaining_indices = indices[1:]
-            
-            non_overlapping_indices = []
-            
-            for idx in remaining_indices:
-                iou = self._calculate_iou(current_box, boxes[idx])
-                print(f"IoU = {iou:.3f}")
-                
-                if iou < self.iou_threshold:
-                    non_overlapping_indices.append(idx)
-            
-            indices = non_overlapping_indices
-        
-        print(f"Saved signature boxes: {len(keep)}")
-        for i, idx in enumerate(keep):
-            print(f"  Box{i+1}: [{boxes[idx][0]:.1f}, {boxes[idx][1]:.1f}, {boxes[idx][2]:.1f}, {boxes[idx][3]:.1f}] - confidence: {confidences[idx]:.3f}")
-        
-        return keep
-    
-    def count_signatures(self, image_path: str) -> int:
+
+        log_boxes("All detected boxes:", boxes, confidences)
+        keep = non_max_suppression(boxes, confidences, self.iou_threshold, self.max_candidates)
+        log_boxes(f"Saved signature boxes: {len(keep)}", boxes[keep], confidences[keep])
+
+        return keep.tolist()
+
+    def count_signatures(self, image: Image.Image) -> int:
         """Определяет количество подписей на изображении и возвращает число."""
-        results = self.model(image_path, verbose=False)
-        signature_count = 0
-        
-        for r in results:
-            if r.boxes is not None and len(r.boxes) > 0:
-                boxes = []
-                confidences = []
-                
-                for i, box in enumerate(r.boxes):
-                    class_id = int(box.cls[0])
-                    class_name = r.names[class_id]
+        return self.count_signatures_batch([image])[0]
+
+    def count_signatures_batch(self, images: List[Image.Image]) -> List[int]:
+        """Определяет количество подписей для пачки изображений за один проход модели."""
+        with STAGE_SECONDS.time("detection"):
+            results = self.backend.detect(images)
+        with STAGE_SECONDS.time("postprocessing"):
+            return [self._count_in_result(r) for r in results]
+
+    def _count_in_result(self, r: Detections) -> int:
+        """Подсчитывает уникальные подписи среди рамок одного изображения."""
+        if len(r.boxes) == 0:
+            return 0
+
+        signature_ids = [class_id for class_id, name in self.backend.names.items() if name == "signature"]
+        mask = np.isin(r.class_ids, signature_ids) & (r.confidences >= self.conf_threshold)
+
+        keep_indices = self._non_max_suppression(r.boxes[mask], r.confidences[mask])
+        signature_count = len(keep_indices)
+        logger.debug(f"TOTAL: {signature_count} unique signatures")
 
-                    if class_name == "signature":
-                        bbox = box.xyxy[0].cpu().numpy()
-                        confidence = float(box.conf[0])
-                        boxes.append(bbox)
-                        confidences.append(confidence)
-                
-                keep_indices = self._non_max_suppression(boxes, confidences)
-                signature_count = len(keep_indices)
-                print(f"TOTAL: {signature_count} unique signatures")
-        
-        return signature_count
\ No newline at end of file
+        return signature_count
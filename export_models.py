@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import statistics
+import time
+from typing import Dict, List, Optional
+from image_io import SUPPORTED_EXTENSIONS, open_pages
+import settings
+
+EXPORT_FORMATS = ["onnx", "openvino"]
+
+
+def export_model(model_path: str, export_format: str, imgsz: Optional[int]) -> str:
+    """Экспортирует модель ultralytics и возвращает путь к артефакту."""
+    from ultralytics import YOLO
+
+    options = {"format": export_format, "dynamic": True}
+    if imgsz:
+        options["imgsz"] = imgsz
+    return str(YOLO(model_path).export(**options))
+
+
+def load_samples(folder: str, limit: Optional[int]) -> List[tuple]:
+    """Первые страницы всех поддерживаемых файлов папки: [(имя файла, изображение)]."""
+    samples = []
+    for name in sorted(os.listdir(folder)):
+        extension = os.path.splitext(name)[1].lower()
+        if extension not in SUPPORTED_EXTENSIONS:
+            continue
+        with open(os.path.join(folder, name), "rb") as f:
+            _, pages = open_pages(f.read(), extension)
+        samples.append((name, next(pages)))
+        if limit and len(samples) >= limit:
+            break
+    return samples
+
+
+def run_model(kind: str, model_path: str, samples: List[tuple]) -> Dict[str, object]:
+    """Прогоняет модель по образцам по одному и возвращает предсказания и задержки."""
+    from classificator import DocumentClassificator
+    from detector import SignatureDetector
+
+    if kind == "signature":
+        model = SignatureDetector(
+            model_path,
+            settings.IOU_THRESHOLD,
+            settings.DETECTION_CONF_THRESHOLD,
+            settings.DETECTION_MAX_CANDIDATES or None,
+        )
+        predict = model.count_signatures
+    else:
+        model = DocumentClassificator(model_path)
+        predict = model.classify_document
+
+    # Прогрев
+    predict(samples[0][1])
+
+    predictions = {}
+    latencies = []
+    for name, image in samples:
+        start = time.perf_counter()
+        predictions[name] = predict(image)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {"predictions": predictions, "median_ms": statistics.median(latencies)}
+
+
+def parity_report(kind: str, reference_path: str, artifacts: Dict[str, str], samples: List[tuple]) -> dict:
+    """Сравнивает предсказания экспортированных моделей с исходной моделью .pt."""
+    reference = run_model(kind, reference_path, samples)
+    report = {"reference": reference_path, "reference_median_ms": reference["median_ms"], "formats": {}}
+    print(f"  {kind:<13} pt        median {reference['median_ms']:8.1f} ms")
+
+    for export_format, artifact_path in artifacts.items():
+        current = run_model(kind, artifact_path, samples)
+        mismatches = [
+            {"file": name, "pt": expected, export_format: current["predictions"][name]}
+            for name, expected in reference["predictions"].items()
+            if current["predictions"][name] != expected
+        ]
+        agreement = 1 - len(mismatches) / len(samples)
+        report["formats"][export_format] = {
+            "artifact": artifact_path,
+            "agreement": agreement,
+            "median_ms": current["median_ms"],
+            "mismatches": mismatches,
+        }
+        print(
+            f"  {kind:<13} {export_format:<9} median {current['median_ms']:8.1f} ms  "
+            f"agreement {agreement:.3f} ({len(mismatches)} mismatches)"
+        )
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export the YOLO models to ONNX / OpenVINO and check parity with the .pt weights."
+    )
+    parser.add_argument("--formats", nargs="+", choices=EXPORT_FORMATS, default=EXPORT_FORMATS)
+    parser.add_argument(
+        "--models", nargs="+", choices=["signature", "classificator"], default=["signature", "classificator"]
+    )
+    parser.add_argument("--imgsz", type=int, default=None, help="Input size (defaults to the training size).")
+    parser.add_argument("--samples", type=str, default=None, help="Folder of sample documents for the parity report.")
+    parser.add_argument("--limit", type=int, default=None, help="Use only the first N sample documents.")
+    parser.add_argument("--report", type=str, default="parity_report.json", help="Where to save the parity report.")
+    args = parser.parse_args()
+
+    model_paths = {
+        "signature": settings.SIGNATURE_MODEL_PATH,
+        "classificator": settings.CLASSIFICATOR_MODEL_PATH,
+    }
+
+    exported = {}
+    for kind in args.models:
+        exported[kind] = {}
+        for export_format in args.formats:
+            print(f"Exporting {model_paths[kind]} to {export_format}...")
+            exported[kind][export_format] = export_model(model_paths[kind], export_format, args.imgsz)
+            print(f"  -> {exported[kind][export_format]}")
+
+    if args.samples:
+        samples = load_samples(args.samples, args.limit)
+        if not samples:
+            raise SystemExit(f"No sample documents found in {args.samples}")
+
+        print(f"Checking parity on {len(samples)} documents...")
+        report = {
+            kind: parity_report(kind, model_paths[kind], exported[kind], samples)
+            for kind in args.models
+        }
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Parity report saved to {args.report}")
@@ -0,0 +1,126 @@
+import io
+from typing import Iterator, Tuple
+from PIL import Image, ImageOps
+import settings
+
+# Расширения файлов, которые принимает сервис
+SUPPORTED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.pdf'}
+# Форматы, которые могут содержать несколько страниц
+MULTIPAGE_EXTENSIONS = {'.tiff', '.tif', '.pdf'}
+
+# Угол поворота против часовой стрелки (как в Image.rotate) -> точная транспозиция.
+# Транспозиция переставляет пиксели без интерполяции и без повторного сжатия.
+_TRANSPOSE_BY_ANGLE = {
+    90: Image.Transpose.ROTATE_90,
+    180: Image.Transpose.ROTATE_180,
+    270: Image.Transpose.ROTATE_270,
+}
+
+
+def decode_image(content: bytes, min_size: int = 0) -> Image.Image:
+    """
+    Декодирует содержимое загруженного файла в RGB-изображение.
+    Учитывает EXIF-ориентацию, прозрачность накладывается на белый фон
+    (та же семантика, что у load_image_safely в deep-image-orientation-detection).
+    min_size > 0 - изображение нужно только уменьшенным: JPEG декодируется
+    в уменьшенном масштабе (DCT), затем уменьшается в целое число раз,
+    но обе стороны остаются не меньше min_size.
+    """
+    img = Image.open(io.BytesIO(content))
+    if min_size and img.format == "JPEG":
+        img.draft(img.mode, (min_size, min_size))
+    img = _to_rgb(img)
+    if min_size:
+        factor = min(img.width // min_size, img.height // min_size)
+        if factor >= 2:
+            img = img.reduce(factor)
+    return img
+
+
+def page_layout(extension: str) -> str:
+    """
+    Как open_pages разбирает файл с этим расширением: multipage или single.
+    Одни и те же байты с разными расширениями дают разное число страниц.
+    """
+    return "multipage" if extension in MULTIPAGE_EXTENSIONS else "single"
+
+
+def open_pages(content: bytes, extension: str) -> Tuple[int, Iterator[Image.Image]]:
+    """
+    Открывает документ и возвращает число страниц и ленивый итератор по ним.
+    Страница декодируется только при запросе следующего элемента, поэтому
+    в памяти одновременно находятся лишь те страницы, что сейчас обрабатываются.
+    Итератор нельзя продвигать из нескольких потоков одновременно.
+    """
+    if extension == ".pdf":
+        return _open_pdf_pages(content)
+
+    img = Image.open(io.BytesIO(content))
+    page_count = getattr(img, "n_frames", 1) if page_layout(extension) == "multipage" else 1
+    return page_count, _iter_frames(img, page_count)
+
+
+def _iter_frames(img: Image.Image, page_count: int) -> Iterator[Image.Image]:
+    for index in range(page_count):
+        img.seek(index)
+        yield _to_rgb(img)
+
+
+def _open_pdf_pages(content: bytes) -> Tuple[int, Iterator[Image.Image]]:
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        raise ValueError("PDF support requires the pypdfium2 package")
+
+    pdf = pdfium.PdfDocument(content)
+    return len(pdf), _iter_pdf_pages(pdf)
+
+
+def _iter_pdf_pages(pdf) -> Iterator[Image.Image]:
+    try:
+        for index in range(len(pdf)):
+            page = pdf[index]
+            try:
+                bitmap = page.render(scale=settings.PDF_RENDER_DPI / 72)
+                yield bitmap.to_pil().convert("RGB")
+            finally:
+                page.close()
+    finally:
+        pdf.close()
+
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    """Приводит изображение (или текущий кадр) к RGB с учётом EXIF и прозрачности."""
+    img = ImageOps.exif_transpose(img)
+
+    if img.mode in ("RGB", "L"):
+        return img.convert("RGB")
+
+    rgba_img = img.convert("RGBA")
+    background = Image.new("RGB", rgba_img.size, (255, 255, 255))
+    background.paste(rgba_img, mask=rgba_img)
+    return background
+
+
+def make_thumbnail(image: Image.Image, size: int) -> Image.Image:
+    """
+    Уменьшает изображение до квадрата size x size, дополняя его белыми полями.
+    Квадратная миниатюра одинакова по форме при любом повороте страницы на 90°,
+    поэтому ею можно классифицировать документ до исправления ориентации.
+    """
+    thumbnail = image.copy()
+    thumbnail.thumbnail((size, size))
+    return ImageOps.pad(thumbnail, (size, size), color=(255, 255, 255))
+
+
+def rotate_image(image: Image.Image, angle: int) -> Image.Image:
+    """
+    Поворачивает изображение на угол, кратный 90° (против часовой стрелки,
+    как Image.rotate с expand=True), без потерь качества.
+    """
+    normalized_angle = angle % 360
+    if normalized_angle == 0:
+        return image
+    if normalized_angle not in _TRANSPOSE_BY_ANGLE:
+        raise ValueError(f"Only multiples of 90° are supported, got {angle}")
+    return image.transpose(_TRANSPOSE_BY_ANGLE[normalized_angle])
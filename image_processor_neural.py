@@ -1,86 +1,103 @@
-import os
+from typing import List, Tuple
 from PIL import Image
+from image_io import rotate_image
+from metrics import STAGE_SECONDS
 from orientation_detector import OrientationDetector
 
 
 class ImageProcessor:
-    def __init__(self):
+    def __init__(self, model_path: str = None):
         # Инициализируем детектор ориентации
         # Модель загружается один раз при создании объекта
         try:
-            self.orientation_detector = OrientationDetector()
+            self.orientation_detector = OrientationDetector(model_path)
         except Exception as e:
             print(f"Warning: Could not initialize orientation detector: {str(e)}")
             self.orientation_detector = None
 
-    def ensure_correct_orientation(self, image_path: str) -> bool:
+    def ensure_correct_orientation(self, image: Image.Image) -> Tuple[Image.Image, bool]:
         """
         Коррекция ориентации изображения с использованием deep-image-orientation-detection.
-        Возвращает True если изображение было повернуто, False если ориентация уже правильная.
+        Возвращает изображение в правильной ориентации и флаг: True если изображение было повернуто,
+        False если ориентация уже правильная.
         """
         try:
-            # Проверяем существование файла
-            if not os.path.exists(image_path):
-                print(f"Warning: Image file not found at {image_path}")
-                return False
-
             # Если детектор не инициализирован, используем fallback
             if self.orientation_detector is None:
                 print(
                     "Warning: Orientation detector not available, using fallback method"
                 )
-                return self._fallback_orientation(image_path)
+                return self._fallback_orientation(image)
 
             # Получаем угол поворота напрямую от детектора
-            rotation_angle = self.orientation_detector.predict_orientation(image_path)
+            with STAGE_SECONDS.time("orientation_inference"):
+                rotation_angle = self.orientation_detector.predict_orientation(image)
 
             if rotation_angle != 0:
                 print(f"Rotating image by {rotation_angle}°")
-                return self._rotate_image(image_path, rotation_angle)
+                return self._rotate_image(image, rotation_angle)
             else:
                 print("Image orientation is correct, no rotation needed")
-                return False
+                return image, False
 
         except Exception as e:
             print(f"Unexpected error in orientation detection: {str(e)}")
-            return self._fallback_orientation(image_path)
+            return self._fallback_orientation(image)
 
-    def _rotate_image(self, image_path: str, angle: int) -> bool:
+    def ensure_correct_orientations(
+        self, images: List[Image.Image]
+    ) -> List[Tuple[Image.Image, bool]]:
         """
-        Поворачивает изображение на заданный угол и сохраняет его.
+        Пакетная коррекция ориентации: углы для всех изображений предсказываются
+        за один проход модели. Возвращает пары (изображение, был ли поворот) в исходном порядке.
         """
+        if self.orientation_detector is None:
+            return [self.ensure_correct_orientation(image) for image in images]
+
         try:
-            with Image.open(image_path) as img:
-                # Поворачиваем изображение с expand=True чтобы избежать обрезки
-                rotated_img = img.rotate(angle, expand=True)
-                rotated_img.save(image_path)
-                return True
+            with STAGE_SECONDS.time("orientation_inference"):
+                rotation_angles = self.orientation_detector.predict_orientations(images)
+        except Exception as e:
+            print(f"Unexpected error in batch orientation detection: {str(e)}")
+            return [self._fallback_orientation(image) for image in images]
+
+        results = []
+        for image, rotation_angle in zip(images, rotation_angles):
+            if rotation_angle != 0:
+                results.append(self._rotate_image(image, rotation_angle))
+            else:
+                results.append((image, False))
+        return results
+
+    def _rotate_image(self, image: Image.Image, angle: int) -> Tuple[Image.Image, bool]:
+        """
+        Поворачивает изображение на заданный угол в памяти (транспозиция без потерь).
+        """
+        try:
+            with STAGE_SECONDS.time("rotation"):
+                return rotate_image(image, angle), True
 
         except Exception as e:
             print(f"Error rotating image: {str(e)}")
-            return False
+            return image, False
 
-    def _fallback_orientation(self, image_path: str) -> bool:
+    def _fallback_orientation(self, image: Image.Image) -> Tuple[Image.Image, bool]:
         """
         Резервный метод определения ориентации по размерам изображения.
         Используется если нейронная сеть не сработала.
         """
         try:
-            with Image.open(image_path) as img:
-                width, height = img.size
-                print(f"Fallback: Image dimensions: {width}x{height}")
+            width, height = image.size
+            print(f"Fallback: Image dimensions: {width}x{height}")
 
-                # если ширина > высоты, поворачиваем на 90° по часовой стрелке
-                if width > height:
-                    print("Image appears horizontal, rotating 90° clockwise...")
-                    rotated_img = img.rotate(-90, expand=True)
-                    rotated_img.save(image_path)
-                    print(f"Image rotated and saved")
-                    return True
-                else:
-                    print("Image orientation appears correct")
-                    return False
+            # если ширина > высоты, поворачиваем на 90° по часовой стрелке
+            if width > height:
+                print("Image appears horizontal, rotating 90° clockwise...")
+                return rotate_image(image, -90), True
+            else:
+                print("Image orientation appears correct")
+                return image, False
 
         except Exception as e:
             print(f"Error in fallback orientation: {str(e)}")
-            return False
+            return image, False
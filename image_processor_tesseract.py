@@ -1,72 +1,219 @@
-import cv2
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+import numpy as np
 from PIL import Image
-import os
 from pytesseract import image_to_osd, Output
+from image_io import rotate_image
+from metrics import STAGE_SECONDS, TESSERACT_OSD
+import settings
+
+# Ниже этой уверенности OSD ответу Tesseract не доверяем
+MIN_OSD_CONFIDENCE = 10
+OSD_REGIONS = ("full", "text")
+# Окно поиска текста: половина каждой стороны страницы со сдвигом на четверть
+_REGION_FRACTION = 0.5
+_REGION_STEPS = 3
+# Окна, залитые чернилами больше чем наполовину, - скорее фото или чёрная рамка скана, чем текст
+_MAX_TEXT_DENSITY = 0.5
+
+# Общий для всех ImageProcessor процесса пул: ограничивает число одновременно
+# запущенных процессов tesseract, сколько бы воркеров ни было у стадии ориентации
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(settings.TESSERACT_WORKERS, 1), thread_name_prefix="tesseract"
+            )
+        return _executor
+
+
+def _otsu_threshold(histogram: List[int]) -> int:
+    """Порог Оцу по гистограмме яркости из 256 столбцов."""
+    total = sum(histogram)
+    weighted_total = sum(value * count for value, count in enumerate(histogram))
+    background, weighted_background = 0, 0.0
+    best_threshold, best_variance = 0, -1.0
+    for value, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        weighted_background += value * count
+        mean_background = weighted_background / background
+        mean_foreground = (weighted_total - weighted_background) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = value, variance
+    return best_threshold
+
+
+def _densest_text_region(binary: Image.Image) -> Image.Image:
+    """
+    Вырезает окно в половину сторон страницы с наибольшей долей тёмных пикселей.
+    Поворот страницы от обрезки не меняется, а OSD на меньшем изображении быстрее.
+    """
+    ink = np.asarray(binary.convert("L")) < 128
+    height, width = ink.shape
+    window_height, window_width = int(height * _REGION_FRACTION), int(width * _REGION_FRACTION)
+    if window_height == 0 or window_width == 0:
+        return binary
+
+    # Интегральное изображение: сумма любого окна за четыре обращения
+    integral = np.zeros((height + 1, width + 1), dtype=np.int64)
+    integral[1:, 1:] = ink.cumsum(axis=0).cumsum(axis=1)
+    window_area = window_height * window_width
+
+    best_box, best_density = None, 0.0
+    for top in np.linspace(0, height - window_height, _REGION_STEPS).astype(int):
+        for left in np.linspace(0, width - window_width, _REGION_STEPS).astype(int):
+            bottom, right = top + window_height, left + window_width
+            ink_pixels = (
+                integral[bottom, right] - integral[top, right]
+                - integral[bottom, left] + integral[top, left]
+            )
+            density = ink_pixels / window_area
+            if best_density < density <= _MAX_TEXT_DENSITY:
+                best_box, best_density = (left, top, right, bottom), density
+
+    return binary if best_box is None else binary.crop(best_box)
+
+
+def prepare_osd_image(
+    image: Image.Image, max_side: int = 0, binarize: bool = True, region: str = "full"
+) -> Image.Image:
+    """
+    Готовит копию страницы для Tesseract OSD: оттенки серого, уменьшение до max_side
+    по наибольшей стороне, бинаризация по Оцу и, для region="text", самая плотная
+    по тексту область. Маленькое однобитное изображение tesseract читает и пишет
+    во временный файл во много раз быстрее полноразмерного скана.
+    """
+    prepared = image.convert("L")
+    if max_side and max(prepared.size) > max_side:
+        # reducing_gap: сначала быстрое целочисленное уменьшение, затем точный resize
+        prepared.thumbnail((max_side, max_side), Image.BILINEAR, reducing_gap=2.0)
+    if binarize or region == "text":
+        threshold = _otsu_threshold(prepared.histogram())
+        prepared = prepared.point(lambda value: 255 if value > threshold else 0, mode="1")
+    if region == "text":
+        prepared = _densest_text_region(prepared)
+    return prepared
+
 
 class ImageProcessor:
-    def __init__(self):
-        pass
-    
-    def ensure_correct_orientation(self, image_path: str) -> bool:
+    """
+    Коррекция ориентации с помощью Tesseract OSD. Каждый вызов запускает процесс
+    tesseract, поэтому вызовы выполняются в общем ограниченном пуле с таймаутом,
+    а страницы пачки отправляются в него одновременно.
+    """
+
+    def __init__(self, model_path: str = None):
+        # model_path не используется: конструктор совместим с нейронным ImageProcessor
+        if settings.TESSERACT_OSD_REGION not in OSD_REGIONS:
+            raise ValueError(f"Unknown TESSERACT_OSD_REGION: {settings.TESSERACT_OSD_REGION}")
+        self.executor = _get_executor()
+
+    def ensure_correct_orientation(self, image: Image.Image) -> Tuple[Image.Image, bool]:
         """
         Умная коррекция ориентации документа с помощью Tesseract OSD.
-        Возвращает True если изображение было повернуто, False если не требовалось
+        Возвращает изображение в правильной ориентации и флаг: True если изображение было повернуто,
+        False если не требовалось
         """
-        try:
-            img = cv2.imread(image_path)
-            if img is None:
-                print(f"Error: Could not load image from {image_path}")
-                return False
-            
-            osd = image_to_osd(img, output_type=Output.DICT, config='--psm 0')
-            
-            
-            required_rotation = osd.get("rotate")
+        return self.ensure_correct_orientations([image])[0]
+
+    def ensure_correct_orientations(
+        self, images: List[Image.Image]
+    ) -> List[Tuple[Image.Image, bool]]:
+        """
+        Коррекция ориентации для пачки изображений: OSD всех страниц выполняется
+        параллельно в пуле tesseract. Возвращает пары (изображение, был ли поворот) в исходном порядке.
+        """
+        futures = [self.executor.submit(self._detect_rotation, image) for image in images]
+        results = []
+        for image, future in zip(images, futures):
+            required_rotation = future.result()
             if required_rotation is None:
-                print("Tesseract failed to detect rotation angle")
-                return self._fallback_orientation(image_path)
-            
-            confidence = osd.get("orient_conf") or osd.get("orientation_conf") or 0
-            
-            print(f"Tesseract OSD: required rotation = {required_rotation}°, confidence = {confidence:.2f}%")
-            
-            if confidence > 0 and confidence < 10:
-                return self._fallback_orientation(image_path)
-            
-            if required_rotation == 0:
+                results.append(self._fallback_orientation(image))
+            elif required_rotation == 0:
                 print("Document orientation is correct")
-                return False
-            
-            with Image.open(image_path) as pil_img:
-                rotated_img = pil_img.rotate(required_rotation, expand=True)
-                rotated_img.save(image_path)
-                return True
-                
+                results.append((image, False))
+            else:
+                with STAGE_SECONDS.time("rotation"):
+                    results.append((rotate_image(image, required_rotation), True))
+        return results
+
+    def _detect_rotation(self, image: Image.Image) -> Optional[int]:
+        """
+        Угол, на который нужно повернуть страницу, по Tesseract OSD.
+        None - ответа нет или он ненадёжен, нужен резервный метод.
+        """
+        try:
+            with STAGE_SECONDS.time("orientation_preprocess"):
+                prepared = prepare_osd_image(
+                    image,
+                    settings.TESSERACT_OSD_MAX_SIDE,
+                    settings.TESSERACT_OSD_BINARIZE,
+                    settings.TESSERACT_OSD_REGION,
+                )
+            with STAGE_SECONDS.time("orientation_inference"):
+                osd = image_to_osd(
+                    prepared,
+                    output_type=Output.DICT,
+                    config='--psm 0',
+                    timeout=settings.TESSERACT_TIMEOUT_SECONDS,
+                )
+        except RuntimeError as e:
+            # pytesseract завершает зависший процесс tesseract и сообщает о таймауте так
+            outcome = "timeout" if "timeout" in str(e).lower() else "error"
+            TESSERACT_OSD.inc(outcome)
+            print(f"Error in orientation correction: {str(e)}")
+            print("Using fallback orientation method...")
+            return None
         except Exception as e:
+            TESSERACT_OSD.inc("error")
             print(f"Error in orientation correction: {str(e)}")
             print("Using fallback orientation method...")
-            return self._fallback_orientation(image_path)
-    
-    def _fallback_orientation(self, image_path: str) -> bool:
+            return None
+
+        required_rotation = osd.get("rotate")
+        if required_rotation is None:
+            TESSERACT_OSD.inc("no_angle")
+            print("Tesseract failed to detect rotation angle")
+            return None
+
+        confidence = osd.get("orient_conf") or osd.get("orientation_conf") or 0
+        print(f"Tesseract OSD: required rotation = {required_rotation}°, confidence = {confidence:.2f}%")
+
+        if 0 < confidence < MIN_OSD_CONFIDENCE:
+            TESSERACT_OSD.inc("low_confidence")
+            return None
+
+        TESSERACT_OSD.inc("ok")
+        return required_rotation
+
+    def _fallback_orientation(self, image: Image.Image) -> Tuple[Image.Image, bool]:
         """
         Резервный метод определения ориентации по размерам изображения.
         """
         try:
-            with Image.open(image_path) as img:
-                width, height = img.size
-                print(f"Fallback: Image dimensions: {width}x{height}")
-                
-                # если ширина > высоты, поворачиваем на 90°
-                if width > height:
-                    print("Image appears horizontal, rotating 90° clockwise...")
-                    rotated_img = img.rotate(-90, expand=True)
-                    rotated_img.save(image_path)
-                    print(f"Image rotated and saved")
-                    return True
-                else:
-                    print("Image orientation appears correct")
-                    return False
-                    
+            width, height = image.size
+            print(f"Fallback: Image dimensions: {width}x{height}")
+
+            # если ширина > высоты, поворачиваем на 90°
+            if width > height:
+                print("Image appears horizontal, rotating 90° clockwise...")
+                return rotate_image(image, -90), True
+            else:
+                print("Image orientation appears correct")
+                return image, False
+
         except Exception as e:
             print(f"Error in fallback orientation: {str(e)}")
-            return False
\ No newline at end of file
+            return image, False
@@ -0,0 +1,90 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class ModelPool:
+    """
+    Ограниченный пул потоков для одной стадии конвейера.
+    Каждый поток владеет собственной копией модели: объекты ultralytics YOLO
+    нельзя безопасно использовать из нескольких потоков одновременно.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[], Any],
+        num_workers: int = 1,
+        warmup: Optional[Callable[[Any], Any]] = None,
+    ):
+        if num_workers < 1:
+            raise ValueError(f"Pool '{name}' needs at least one worker, got {num_workers}")
+
+        self.name = name
+        self.num_workers = num_workers
+        self._factory = factory
+        # Вызывается с только что созданной копией модели до того, как пул примет запросы
+        self._warmup = warmup
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(
+            max_workers=num_workers, thread_name_prefix=f"{name}-worker"
+        )
+
+    def _get_replica(self) -> Any:
+        """Возвращает копию модели текущего потока, создавая её при первом обращении."""
+        replica = getattr(self._local, "replica", None)
+        if replica is None:
+            replica = self._factory()
+            self._local.replica = replica
+        return replica
+
+    def _load_replica(self, barrier: threading.Barrier) -> Tuple[float, float]:
+        try:
+            start = time.perf_counter()
+            replica = self._get_replica()
+            loaded = time.perf_counter()
+            if self._warmup is not None:
+                self._warmup(replica)
+            warmed_up = time.perf_counter()
+        except Exception:
+            # Освобождаем остальные потоки, иначе они будут ждать барьер вечно
+            barrier.abort()
+            raise
+        # Барьер не даёт одному потоку забрать несколько задач загрузки,
+        # поэтому копия модели создаётся в каждом потоке пула
+        barrier.wait()
+        return loaded - start, warmed_up - loaded
+
+    def _call(self, method: str, args: tuple, kwargs: dict) -> Any:
+        return getattr(self._get_replica(), method)(*args, **kwargs)
+
+    async def start(self) -> Dict[str, float]:
+        """
+        Загружает и прогревает копии модели во всех потоках пула.
+        Возвращает длительность фаз "load" и "warmup" в секундах (по самому медленному потоку).
+        """
+        loop = asyncio.get_running_loop()
+        barrier = threading.Barrier(self.num_workers)
+        timings = await asyncio.gather(
+            *(
+                loop.run_in_executor(self._executor, self._load_replica, barrier)
+                for _ in range(self.num_workers)
+            )
+        )
+        return {
+            "load": max(load for load, _ in timings),
+            "warmup": max(warmup for _, warmup in timings),
+        }
+
+    async def run(self, method: str, *args, **kwargs) -> Any:
+        """Вызывает метод модели в одном из потоков пула, не блокируя event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(self._call, method, args, kwargs)
+        )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
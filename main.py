@@ -1,27 +1,50 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from contextlib import asynccontextmanager
+import asyncio
 import os
-import uuid
-from detector import SignatureDetector
-from classificator import DocumentClassificator
-# from image_processor_tesseract import ImageProcessor
-from image_processor_neural import ImageProcessor
+import signal
+import traceback
+from image_io import SUPPORTED_EXTENSIONS
+from bulk import stream_bulk_results
+from pipeline import DocumentDecodeError, SignaturePipeline
+from metrics import REQUESTS_IN_FLIGHT, STAGE_SECONDS, render_metrics
+import settings
 import uvicorn
 
-SIGNATURE_MODEL_PATH = "models/signature.pt"
-CLASSIFICATOR_MODEL_PATH = "models/classificator.pt"
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    if not os.path.exists(SIGNATURE_MODEL_PATH):
-        raise Exception(f"The signature model was not found on the way: {SIGNATURE_MODEL_PATH}")
-    if not os.path.exists(CLASSIFICATOR_MODEL_PATH):
-        raise Exception(f"The classifier model was not found on the way: {CLASSIFICATOR_MODEL_PATH}")
+    # В режиме "server" модели загружает model_server.py, а не HTTP-воркер
+    if settings.INFERENCE_MODE == "local":
+        if not os.path.exists(settings.SIGNATURE_MODEL_PATH):
+            raise Exception(f"The signature model was not found on the way: {settings.SIGNATURE_MODEL_PATH}")
+        if not os.path.exists(settings.CLASSIFICATOR_MODEL_PATH):
+            raise Exception(f"The classifier model was not found on the way: {settings.CLASSIFICATOR_MODEL_PATH}")
     
-    app.state.detector = SignatureDetector(SIGNATURE_MODEL_PATH)
-    app.state.classificator = DocumentClassificator(CLASSIFICATOR_MODEL_PATH)
-    app.state.image_processor = ImageProcessor()
-    yield
+    app.state.pipeline = SignaturePipeline()
+    # Модели загружаются и прогреваются в фоне: порт открыт сразу (метрики доступны),
+    # а /ready отвечает 503, пока конвейер не готов принимать трафик
+    startup = asyncio.create_task(start_pipeline(app.state.pipeline))
+    try:
+        yield
+    finally:
+        startup.cancel()
+        await asyncio.gather(startup, return_exceptions=True)
+        await app.state.pipeline.stop()
+
+async def start_pipeline(pipeline: SignaturePipeline):
+    try:
+        await pipeline.start()
+    except Exception:
+        # Без моделей воркер бесполезен: завершаем процесс, как при ошибке в lifespan
+        traceback.print_exc()
+        os.kill(os.getpid(), signal.SIGTERM)
+
+def require_ready():
+    pipeline = app.state.pipeline
+    if not pipeline.ready:
+        detail = "Model server is unavailable" if pipeline.started else "Service is starting"
+        raise HTTPException(status_code=503, detail=detail)
 
 app = FastAPI(
     title="Signature Detection API",
@@ -30,60 +53,72 @@ app = FastAPI(
 
 @app.post("/detect-signatures")
 async def detect_signatures(file: UploadFile = File(...)):
-    allowed_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff'}
+    require_ready()
     file_extension = os.path.splitext(file.filename)[1].lower()
     
-    if file_extension not in allowed_extensions:
+    if file_extension not in SUPPORTED_EXTENSIONS:
         raise HTTPException(
             status_code=400, 
             detail=f"Unsupported file format"
         )
     
-    temp_filename = f"temp_uploads/{uuid.uuid4()}{file_extension}"
-    os.makedirs("temp_uploads", exist_ok=True)
-    
+    REQUESTS_IN_FLIGHT.inc("detect")
     try:
-        with open(temp_filename, "wb") as buffer:
+        with STAGE_SECONDS.time("upload_read"):
             content = await file.read()
-            buffer.write(content)
-        
-        # Проверяем и корректируем ориентацию изображения (работает с исходным файлом)
-        image_processor = app.state.image_processor 
-        was_rotated = image_processor.ensure_correct_orientation(temp_filename)
-        
-        if was_rotated:
-            print("Image was rotated successfully")
 
-        # Классифицируем документ
-        classificator = app.state.classificator
-        doc_type = classificator.classify_document(temp_filename)
-        
-        # Если документ рукописный - не обрабатываем
-        if doc_type == "handwritten":
-            return {
-                "document_type": doc_type,
-                "number_of_signatures": 0,
-                "message": "Handwritten documents are not processed"
-            }
-        
-        # Если документ печатный - подсчитываем подписи
-        detector = app.state.detector
-        signature_count = detector.count_signatures(temp_filename)
-        
-        return {
-            "document_type": doc_type,
-            "number_of_signatures": signature_count
-        }
-        
+        # Каждая страница декодируется один раз, дальше конвейер работает с ней в памяти
+        return await app.state.pipeline.process_document(content, file_extension)
+
+    except DocumentDecodeError:
+        raise HTTPException(
+            status_code=400,
+            detail="Could not decode image"
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
-    
     finally:
+        REQUESTS_IN_FLIGHT.dec("detect")
+
+@app.post("/detect-signatures/bulk")
+async def detect_signatures_bulk(request: Request):
+    """
+    Принимает много файлов (поле files) в одном multipart-запросе, в том числе zip/tar архивы.
+    Возвращает NDJSON: по одной строке на документ по мере готовности, с исходным именем файла.
+    """
+    require_ready()
+    # Форму разбираем сами: файлы должны оставаться открытыми, пока идёт потоковый ответ
+    form = await request.form(max_files=settings.BULK_MAX_FILES)
+    uploads = [item for item in form.getlist("files") if not isinstance(item, str)]
+
+    if not uploads:
+        await form.close()
+        raise HTTPException(status_code=400, detail="No files were uploaded")
+
+    async def stream():
+        REQUESTS_IN_FLIGHT.inc("bulk")
         try:
-            if os.path.exists(temp_filename):
-                os.remove(temp_filename)
-        except:
-            pass
+            async for line in stream_bulk_results(app.state.pipeline, uploads):
+                yield line
+        finally:
+            REQUESTS_IN_FLIGHT.dec("bulk")
+            await form.close()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get("/ready")
+async def ready():
+    """Готовность к трафику: 200, когда модели всех стадий загружены и прогреты, иначе 503."""
+    pipeline = app.state.pipeline
+    if not pipeline.ready:
+        status = "unavailable" if pipeline.started else "starting"
+        return JSONResponse({"status": status}, status_code=503)
+    return {"status": "ready"}
+
+@app.get("/metrics")
+async def metrics():
+    """Метрики сервиса в текстовом формате Prometheus."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
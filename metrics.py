@@ -0,0 +1,271 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Лёгкие метрики в текстовом формате Prometheus. Запись значения - это
+# perf_counter, bisect и инкремент под блокировкой (единицы микросекунд),
+# поэтому метрики можно держать включёнными в продакшене.
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for labelvalues, value in items:
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Gauge:
+    """Значение, которое задаётся напрямую или вычисляется функциями в момент выгрузки."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callbacks: Dict[Tuple[str, ...], Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def dec(self, *labelvalues: str, amount: float = 1.0) -> None:
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, value: float, *labelvalues: str) -> None:
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def set_function(self, function: Callable[[], float], *labelvalues: str) -> None:
+        with self._lock:
+            self._callbacks[labelvalues] = function
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            items = list(self._values.items())
+            callbacks = list(self._callbacks.items())
+        items.extend((labelvalues, function()) for labelvalues, function in callbacks)
+        for labelvalues, value in items:
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # labelvalues -> [счётчики по корзинам (не накопительные), сумма, количество]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = [[0] * len(self.buckets), 0.0, 0]
+                self._series[labelvalues] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labelvalues: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [
+                (labelvalues, list(counts), total, count)
+                for labelvalues, (counts, total, count) in self._series.items()
+            ]
+        for labelvalues, counts, total, count in snapshot:
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(
+                    self.labelnames, labelvalues, f'le="{_format_value(upper_bound)}"'
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class RateGauge:
+    """Скорость событий в секунду по скользящему окну (кольцо посекундных счётчиков)."""
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), window_seconds: int = 60
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.window_seconds = window_seconds
+        # labelvalues -> (секунды, счётчики) - кольцевые буферы длины window_seconds
+        self._rings: Dict[Tuple[str, ...], Tuple[List[int], List[int]]] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, *labelvalues: str) -> None:
+        second = int(time.monotonic())
+        slot = second % self.window_seconds
+        with self._lock:
+            ring = self._rings.get(labelvalues)
+            if ring is None:
+                ring = ([0] * self.window_seconds, [0] * self.window_seconds)
+                self._rings[labelvalues] = ring
+            seconds, counts = ring
+            if seconds[slot] != second:
+                seconds[slot] = second
+                counts[slot] = 0
+            counts[slot] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        oldest = int(time.monotonic()) - self.window_seconds
+        with self._lock:
+            for labelvalues, (seconds, counts) in self._rings.items():
+                recent = sum(c for s, c in zip(seconds, counts) if s > oldest)
+                lines.append(
+                    f"{self.name}{_format_labels(self.labelnames, labelvalues)} "
+                    f"{_format_value(recent / self.window_seconds)}"
+                )
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "signature_stage_duration_seconds",
+    "Duration of one call of a pipeline stage (a whole batch for batched stages).",
+    ["stage"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "signature_requests_in_flight", "Requests currently being processed.", ["endpoint"]
+)
+QUEUE_DEPTH = Gauge(
+    "signature_stage_queue_depth", "Items waiting in the batching queue of a stage.", ["stage"]
+)
+CACHE_LOOKUPS = Counter(
+    "signature_cache_lookups_total", "Result cache lookups by outcome.", ["result"]
+)
+CACHE_HIT_RATIO = Gauge("signature_cache_hit_ratio", "Share of result cache lookups that hit.")
+DOCUMENTS = Counter(
+    "signature_documents_total", "Processed documents (including cache hits) by outcome.", ["outcome"]
+)
+DOCUMENTS_RATE = RateGauge(
+    "signature_documents_per_second",
+    "Processed documents per second over the last minute by outcome.",
+    ["outcome"],
+)
+
+ORIENTATION_TIERS = Counter(
+    "signature_orientation_predictions_total",
+    "Orientation predictions by the cascade tier that answered (low or full resolution).",
+    ["tier"],
+)
+ORIENTATION_MARGIN = Histogram(
+    "signature_orientation_margin",
+    "Margin between the two most probable orientations at a cascade tier.",
+    ["tier"],
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99),
+)
+TESSERACT_OSD = Counter(
+    "signature_tesseract_osd_total",
+    "Tesseract OSD calls by outcome (ok, low_confidence, no_angle, timeout, error).",
+    ["outcome"],
+)
+STARTUP_SECONDS = Gauge(
+    "signature_startup_seconds",
+    "Duration of service startup phases (model load and warmup per stage, cache, total).",
+    ["phase"],
+)
+
+
+def _cache_hit_ratio() -> float:
+    hits = CACHE_LOOKUPS.value("hit")
+    total = hits + CACHE_LOOKUPS.value("miss")
+    return hits / total if total else 0.0
+
+
+CACHE_HIT_RATIO.set_function(_cache_hit_ratio)
+
+_REGISTRY = [
+    STAGE_SECONDS,
+    REQUESTS_IN_FLIGHT,
+    QUEUE_DEPTH,
+    CACHE_LOOKUPS,
+    CACHE_HIT_RATIO,
+    DOCUMENTS,
+    DOCUMENTS_RATE,
+    ORIENTATION_TIERS,
+    ORIENTATION_MARGIN,
+    TESSERACT_OSD,
+    STARTUP_SECONDS,
+]
+
+
+def record_document(outcome: str) -> None:
+    """Учитывает обработанный документ: handwritten, printed или error."""
+    DOCUMENTS.inc(outcome)
+    DOCUMENTS_RATE.mark(outcome)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
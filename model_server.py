@@ -0,0 +1,199 @@
+import argparse
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Connection, Listener
+from typing import Any, Callable, Dict, List, Tuple, Union
+from PIL import Image
+from detector import SignatureDetector
+from classificator import DocumentClassificator
+from pipeline import image_processor_class, report_startup, run_stages, warm_up
+import settings
+
+
+def load_stage(name: str, factory: Callable[[], Any], method: str) -> Tuple[Any, Dict[str, float]]:
+    """Создаёт модель стадии и прогревает её; возвращает модель и длительность фаз."""
+    start = time.perf_counter()
+    model = factory()
+    loaded = time.perf_counter()
+    warm_up(model, method)
+    return model, {f"{name}_load": loaded - start, f"{name}_warmup": time.perf_counter() - loaded}
+
+
+def read_shared_image(block_name: str, size: Tuple[int, int]) -> Image.Image:
+    """Копирует RGB-пиксели из блока разделяемой памяти в изображение PIL."""
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        # Блоком владеет HTTP-воркер, он же его и удаляет. Без этого resource_tracker
+        # этого процесса удалил бы чужой блок при завершении.
+        resource_tracker.unregister(block._name, "shared_memory")
+        width, height = size
+        view = block.buf[: width * height * 3]
+        try:
+            return Image.frombytes("RGB", size, view)
+        finally:
+            view.release()
+    finally:
+        block.close()
+
+
+class InferenceWorker:
+    """
+    Процесс инференса: держит по одной копии каждой модели и обслуживает
+    запросы всех HTTP-воркеров хоста. Страницы, пришедшие одновременно,
+    обрабатываются одним батчем.
+    """
+
+    def __init__(self, index: int, address: Union[str, Tuple[str, int]]):
+        self.index = index
+        self.address = address
+        self._requests: queue.Queue = queue.Queue()
+
+        # Модели загружаются и прогреваются параллельно; слушать порт процесс начинает,
+        # только когда все стадии готовы
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="model-loader") as executor:
+            orientation = executor.submit(
+                load_stage,
+                "orientation",
+                lambda: image_processor_class()(settings.ORIENTATION_MODEL_PATH),
+                "ensure_correct_orientations",
+            )
+            classification = executor.submit(
+                load_stage,
+                "classificator",
+                lambda: DocumentClassificator(settings.CLASSIFICATOR_MODEL_PATH),
+                "classify_documents",
+            )
+            detection = executor.submit(
+                load_stage,
+                "detector",
+                lambda: SignatureDetector(
+                    settings.SIGNATURE_MODEL_PATH,
+                    settings.IOU_THRESHOLD,
+                    settings.DETECTION_CONF_THRESHOLD,
+                    settings.DETECTION_MAX_CANDIDATES or None,
+                ),
+                "count_signatures_batch",
+            )
+            self.image_processor, orientation_timings = orientation.result()
+            self.classificator, classification_timings = classification.result()
+            self.detector, detection_timings = detection.result()
+
+        report_startup({
+            **orientation_timings,
+            **classification_timings,
+            **detection_timings,
+            "total": time.perf_counter() - started,
+        })
+
+    def serve_forever(self) -> None:
+        threading.Thread(target=self._inference_loop, daemon=True).start()
+
+        authkey = settings.model_server_authkey()
+        if isinstance(self.address, str):
+            # Сокет мог остаться от предыдущего запуска
+            if os.path.exists(self.address):
+                os.remove(self.address)
+            # Сокет создаётся с правами только для владельца
+            os.umask(0o077)
+
+        with Listener(self.address, authkey=authkey) as listener:
+            print(f"Inference worker {self.index} is listening on {self.address}")
+            while True:
+                connection = listener.accept()
+                threading.Thread(
+                    target=self._read_requests, args=(connection,), daemon=True
+                ).start()
+
+    def _read_requests(self, connection: Connection) -> None:
+        send_lock = threading.Lock()
+        try:
+            while True:
+                request_id, block_name, size = connection.recv()
+                self._requests.put((request_id, block_name, size, connection, send_lock))
+        except (EOFError, OSError):
+            pass
+
+    def _inference_loop(self) -> None:
+        while True:
+            batch = [self._requests.get()]
+            while len(batch) < settings.MODEL_SERVER_MAX_BATCH_SIZE:
+                try:
+                    batch.append(self._requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            for (request_id, _, _, connection, send_lock), (result, error) in zip(
+                batch, self._process_batch(batch)
+            ):
+                try:
+                    with send_lock:
+                        connection.send((request_id, result, error))
+                except (EOFError, OSError):
+                    # HTTP-воркер отключился, ответ никому не нужен
+                    pass
+
+    def _process_batch(self, batch: List[tuple]) -> List[tuple]:
+        images = []
+        outcomes = [None] * len(batch)
+        for position, (_, block_name, size, _, _) in enumerate(batch):
+            try:
+                images.append((position, read_shared_image(block_name, size)))
+            except Exception as e:
+                outcomes[position] = (None, f"Could not read shared image: {str(e)}")
+
+        if images:
+            try:
+                results = run_stages(
+                    self.image_processor,
+                    self.classificator,
+                    self.detector,
+                    [image for _, image in images],
+                    settings.PIPELINE_ORDER,
+                    settings.CLASSIFY_THUMBNAIL_SIZE,
+                )
+                for (position, _), result in zip(images, results):
+                    outcomes[position] = (result, None)
+            except Exception as e:
+                for position, _ in images:
+                    outcomes[position] = (None, f"Processing error: {str(e)}")
+
+        return outcomes
+
+
+def run_worker(index: int, address: Union[str, Tuple[str, int]]) -> None:
+    InferenceWorker(index, address).serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run dedicated inference processes for INFERENCE_MODE=server."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=settings.MODEL_SERVER_WORKERS,
+        help="Number of inference processes (must match MODEL_SERVER_WORKERS of the HTTP workers).",
+    )
+    args = parser.parse_args()
+
+    # Ошибки конфигурации (нет ключа, не-loopback адрес) видны до загрузки моделей
+    settings.model_server_authkey()
+    addresses = settings.model_server_addresses(args.workers)
+    processes = [
+        multiprocessing.Process(
+            target=run_worker,
+            args=(index, address),
+            name=f"inference-{index}",
+        )
+        for index, address in enumerate(addresses)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
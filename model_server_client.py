@@ -0,0 +1,184 @@
+import asyncio
+import itertools
+import threading
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client, Connection
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from PIL import Image
+import settings
+
+
+class _ServerConnection:
+    """
+    Одно соединение с процессом инференса; ответы приходят в отдельном потоке.
+    Когда поток чтения завершается (процесс инференса упал), соединение помечается
+    мёртвым, новые запросы отклоняет и в цикле событий вызывается on_disconnect.
+    """
+
+    def __init__(
+        self,
+        address: Union[str, Tuple[str, int]],
+        authkey: bytes,
+        loop: asyncio.AbstractEventLoop,
+        on_disconnect: Optional[Callable[[], None]] = None,
+    ):
+        self.address = address
+        self._loop = loop
+        self._on_disconnect = on_disconnect
+        self._connection: Connection = Client(address, authkey=authkey)
+        self._send_lock = threading.Lock()
+        # Защищает _pending и alive: запрос либо попадает в _pending до закрытия
+        # соединения и получает ошибку, либо отклоняется сразу
+        self._state_lock = threading.Lock()
+        self._pending: Dict[int, asyncio.Future] = {}
+        self.alive = True
+        self._reader = threading.Thread(
+            target=self._read_responses, name=f"model-server-{address}", daemon=True
+        )
+        self._reader.start()
+
+    def _read_responses(self) -> None:
+        try:
+            while True:
+                request_id, result, error = self._connection.recv()
+                with self._state_lock:
+                    future = self._pending.pop(request_id, None)
+                if future is not None:
+                    self._loop.call_soon_threadsafe(self._resolve, future, result, error)
+        except (EOFError, OSError):
+            pass
+
+        # Соединение закрыто: ожидающие запросы уже не получат ответ
+        with self._state_lock:
+            self.alive = False
+            pending, self._pending = self._pending, {}
+        try:
+            for future in pending.values():
+                self._loop.call_soon_threadsafe(
+                    self._resolve, future, None, f"Model server {self.address} disconnected"
+                )
+            if self._on_disconnect is not None:
+                self._loop.call_soon_threadsafe(self._on_disconnect)
+        except RuntimeError:
+            # Цикл событий уже закрыт: процесс завершается
+            pass
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result, error) -> None:
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result(result)
+
+    def _send(self, message: tuple) -> None:
+        with self._send_lock:
+            self._connection.send(message)
+
+    async def request(self, request_id: int, message: tuple) -> dict:
+        future = self._loop.create_future()
+        with self._state_lock:
+            if not self.alive:
+                raise RuntimeError(f"Model server {self.address} disconnected")
+            self._pending[request_id] = future
+        try:
+            await asyncio.to_thread(self._send, message)
+        except Exception:
+            with self._state_lock:
+                self._pending.pop(request_id, None)
+            raise
+        return await future
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class ModelServerClient:
+    """
+    Клиент процессов инференса (model_server.py) для HTTP-воркера.
+    Пиксели страницы копируются в блок разделяемой памяти, по сокету передаётся
+    только имя блока и размер изображения; обратно приходит результат страницы.
+    Запросы распределяются по кругу между живыми соединениями. Если процесс инференса
+    упал, его соединение пропускается и переподключается в фоне каждые
+    MODEL_SERVER_RECONNECT_SECONDS, пока процесс не поднимется снова.
+    """
+
+    def __init__(self, addresses: List[Union[str, Tuple[str, int]]], authkey: bytes):
+        self.addresses = addresses
+        self.authkey = authkey
+        self._connections: List[_ServerConnection] = []
+        self._next_index = itertools.cycle(range(len(addresses)))
+        self._request_ids = itertools.count()
+        self._reconnect_tasks = set()
+        self._closed = False
+
+    def _connect(self, index: int, loop: asyncio.AbstractEventLoop) -> _ServerConnection:
+        return _ServerConnection(
+            self.addresses[index], self.authkey, loop, lambda: self._on_disconnect(index)
+        )
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        for index in range(len(self.addresses)):
+            self._connections.append(await asyncio.to_thread(self._connect, index, loop))
+
+    @property
+    def connected(self) -> bool:
+        """Есть хотя бы одно живое соединение с процессом инференса."""
+        return any(connection.alive for connection in self._connections)
+
+    def _next_connection(self) -> _ServerConnection:
+        for _ in range(len(self._connections)):
+            connection = self._connections[next(self._next_index)]
+            if connection.alive:
+                return connection
+        raise RuntimeError("No model server is available")
+
+    def _on_disconnect(self, index: int) -> None:
+        if self._closed:
+            return
+        print(f"Model server {self.addresses[index]} disconnected, reconnecting")
+        task = asyncio.get_running_loop().create_task(self._reconnect(index))
+        self._reconnect_tasks.add(task)
+        task.add_done_callback(self._reconnect_tasks.discard)
+
+    async def _reconnect(self, index: int) -> None:
+        loop = asyncio.get_running_loop()
+        while not self._closed:
+            await asyncio.sleep(settings.MODEL_SERVER_RECONNECT_SECONDS)
+            try:
+                connection = await asyncio.to_thread(self._connect, index, loop)
+            except Exception:
+                continue
+            if self._closed:
+                connection.close()
+                return
+            self._connections[index].close()
+            self._connections[index] = connection
+            print(f"Reconnected to model server {self.addresses[index]}")
+            return
+
+    async def process(self, image: Image.Image) -> dict:
+        image = image.convert("RGB")
+        pixels = image.tobytes()
+
+        block = shared_memory.SharedMemory(create=True, size=len(pixels))
+        try:
+            block.buf[: len(pixels)] = pixels
+            del pixels
+
+            request_id = next(self._request_ids)
+            connection = self._next_connection()
+            return await connection.request(request_id, (request_id, block.name, image.size))
+        finally:
+            block.close()
+            block.unlink()
+
+    def close(self) -> None:
+        self._closed = True
+        for task in self._reconnect_tasks:
+            task.cancel()
+        for connection in self._connections:
+            connection.close()
+        self._connections = []
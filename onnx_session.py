@@ -0,0 +1,33 @@
+# Уровни оптимизации графа ONNX Runtime по названию в настройках
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disabled": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+
+def create_onnx_session(
+    model_path: str,
+    intra_op_threads: int = 0,
+    inter_op_threads: int = 0,
+    graph_optimization: str = "all",
+    enable_mem_arena: bool = True,
+):
+    """Создаёт CPU-сессию ONNX Runtime с заданными параметрами (0 потоков - выбор ONNX Runtime)."""
+    import onnxruntime
+
+    if graph_optimization not in GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(f"Unknown graph optimization level: {graph_optimization}")
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.graph_optimization_level = getattr(
+        onnxruntime.GraphOptimizationLevel, GRAPH_OPTIMIZATION_LEVELS[graph_optimization]
+    )
+    options.enable_cpu_mem_arena = enable_mem_arena
+
+    return onnxruntime.InferenceSession(
+        model_path, sess_options=options, providers=["CPUExecutionProvider"]
+    )
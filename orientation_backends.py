@@ -0,0 +1,183 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from onnx_session import create_onnx_session
+
+# Нормализация ImageNet, как в get_data_transforms()["val"]
+_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+
+class TorchOrientationBackend:
+    """
+    Модель ориентации в PyTorch: веса .pth (fp32, bf16 из quantize.py или
+    дистиллированный ученик из train.py --distill) или квантованная модель
+    TorchScript (.torchscript, только CPU).
+    Сеть полностью свёрточная, поэтому принимает вход любого размера.
+    """
+
+    # Размер входа не зафиксирован моделью
+    fixed_image_size = None
+
+    def __init__(self, model_path: str, image_size: int):
+        # torch нужен только этому бэкенду
+        import torch
+        from src.model import load_orientation_model
+        from src.utils import get_device, get_data_transforms
+
+        self.torch = torch
+        self.dtype = torch.float32
+
+        if model_path.endswith(".torchscript"):
+            # Квантованные операции int8 есть только на CPU
+            self.device = torch.device("cpu")
+            # Размер входа записывает quantize.py; у старых файлов его нет
+            extra_files = {"image_size": ""}
+            self.model = torch.jit.load(
+                model_path, map_location=self.device, _extra_files=extra_files
+            )
+            if extra_files["image_size"]:
+                image_size = int(extra_files["image_size"])
+        else:
+            self.device = get_device()
+            # Архитектура и размер входа ученика хранятся в самом файле модели
+            self.model, _, image_size = load_orientation_model(model_path, map_location=self.device)
+            # Веса bf16 выполняются в bf16, а не приводятся обратно к fp32
+            self.dtype = next(self.model.parameters()).dtype
+            self.model.to(self.device)
+        self.model.eval()
+
+        self.image_size = image_size
+        # Размер входа -> val-трансформация для него
+        self._transforms = {image_size: get_data_transforms(image_size)["val"]}
+
+    def _transform(self, image_size: int):
+        transform = self._transforms.get(image_size)
+        if transform is None:
+            import torchvision.transforms as T
+
+            # Та же val-трансформация, что и для основного размера
+            transform = T.Compose([
+                T.Resize((image_size + 32, image_size + 32)),
+                T.CenterCrop(image_size),
+                T.ToTensor(),
+                T.Normalize(mean=_MEAN.tolist(), std=_STD.tolist()),
+            ])
+            self._transforms[image_size] = transform
+        return transform
+
+    def predict_probabilities(
+        self, images: List[Image.Image], image_size: Optional[int] = None
+    ) -> np.ndarray:
+        """Вероятности классов (N, число классов) на входе image_size x image_size."""
+        transform = self._transform(image_size or self.image_size)
+        input_tensor = self.torch.stack(
+            [transform(image) for image in images]
+        ).to(self.device, self.dtype)
+
+        with self.torch.no_grad():
+            output = self.model(input_tensor)
+            probabilities = self.torch.softmax(output.float(), dim=1)
+
+        return probabilities.cpu().numpy()
+
+
+class OnnxOrientationBackend:
+    """
+    Модель ориентации в ONNX Runtime (артефакт convert_to_onnx.py).
+    Предобработка повторяет val-трансформацию на PIL и numpy, входы и выходы
+    привязываются к заранее выделенным буферам через io_binding, поэтому
+    на каждый батч не создаются новые массивы. Объект не потокобезопасен:
+    у каждого воркера пула своя копия.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        image_size: int,
+        max_batch_size: int = 16,
+        intra_op_threads: int = 0,
+        inter_op_threads: int = 0,
+        graph_optimization: str = "all",
+        enable_mem_arena: bool = True,
+    ):
+        self.session = create_onnx_session(
+            model_path, intra_op_threads, inter_op_threads, graph_optimization, enable_mem_arena
+        )
+        model_input = self.session.get_inputs()[0]
+        model_output = self.session.get_outputs()[0]
+        self.input_name = model_input.name
+        self.output_name = model_output.name
+
+        # Модели, экспортированные со статическим размером, принимают только его.
+        # Для динамических convert_to_onnx.py записывает размер обучения в метаданные.
+        height = model_input.shape[2]
+        self.fixed_image_size = height if isinstance(height, int) else None
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.image_size = self.fixed_image_size or int(metadata.get("image_size", image_size))
+
+        num_classes = model_output.shape[1]
+        self.num_classes = num_classes if isinstance(num_classes, int) else 4
+
+        self.max_batch_size = max_batch_size
+        # Размер входа -> (буфер входов, буфер выходов); выделяются при первом использовании
+        self._buffers: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        # (x / 255 - mean) / std == x * scale - offset
+        self._scale = (1.0 / (255.0 * _STD)).reshape(3, 1, 1)
+        self._offset = (_MEAN / _STD).reshape(3, 1, 1)
+        self._binding = self.session.io_binding()
+
+    def _get_buffers(self, image_size: int) -> Tuple[np.ndarray, np.ndarray]:
+        buffers = self._buffers.get(image_size)
+        if buffers is None:
+            buffers = (
+                np.empty((self.max_batch_size, 3, image_size, image_size), dtype=np.float32),
+                np.empty((self.max_batch_size, self.num_classes), dtype=np.float32),
+            )
+            self._buffers[image_size] = buffers
+        return buffers
+
+    def _preprocess(self, image: Image.Image, image_size: int, out: np.ndarray) -> None:
+        """Resize + CenterCrop + ToTensor + Normalize прямо в буфер out (3, H, W)."""
+        resize_size = image_size + 32
+        left = int(round((resize_size - image_size) / 2.0))
+        resized = image.resize((resize_size, resize_size), Image.BILINEAR)
+        cropped = resized.crop((left, left, left + image_size, left + image_size))
+        pixels = np.asarray(cropped, dtype=np.uint8).transpose(2, 0, 1)
+        np.multiply(pixels, self._scale, out=out, casting="unsafe")
+        np.subtract(out, self._offset, out=out)
+
+    def predict_probabilities(
+        self, images: List[Image.Image], image_size: Optional[int] = None
+    ) -> np.ndarray:
+        """Вероятности классов (N, число классов) на входе image_size x image_size."""
+        image_size = image_size or self.image_size
+        if self.fixed_image_size is not None and image_size != self.fixed_image_size:
+            raise ValueError(
+                f"The ONNX model only accepts {self.fixed_image_size}px inputs, got {image_size}px"
+            )
+
+        inputs_buffer, outputs_buffer = self._get_buffers(image_size)
+        logits = []
+        for start in range(0, len(images), self.max_batch_size):
+            chunk = images[start:start + self.max_batch_size]
+            count = len(chunk)
+            for i, image in enumerate(chunk):
+                self._preprocess(image, image_size, inputs_buffer[i])
+
+            inputs = inputs_buffer[:count]
+            outputs = outputs_buffer[:count]
+            self._binding.bind_input(
+                self.input_name, "cpu", 0, np.float32, inputs.shape, inputs.ctypes.data
+            )
+            self._binding.bind_output(
+                self.output_name, "cpu", 0, np.float32, outputs.shape, outputs.ctypes.data
+            )
+            self.session.run_with_iobinding(self._binding)
+            logits.append(outputs.copy())
+        return _softmax(np.concatenate(logits))
@@ -1,33 +1,74 @@
 import os
 import sys
-import torch
+from typing import List, NamedTuple, Union
+import numpy as np
+from PIL import Image
+from image_io import decode_image
+from metrics import ORIENTATION_MARGIN, ORIENTATION_TIERS
+from orientation_backends import OnnxOrientationBackend, TorchOrientationBackend
+import settings
 
-# Добавляем путь к deep-image-orientation-detection в sys.path
 DETECTION_DIR = os.path.join(
     os.path.dirname(__file__), "deep-image-orientation-detection"
 )
-if DETECTION_DIR not in sys.path:
-    sys.path.insert(0, DETECTION_DIR)
 
-# Теперь можем импортировать модули
-import config
-from src.model import get_orientation_model
-from src.utils import get_device, get_data_transforms, load_image_safely
+
+def add_detection_path() -> None:
+    """Добавляет deep-image-orientation-detection в sys.path (для импорта config и src.*)."""
+    if DETECTION_DIR not in sys.path:
+        sys.path.insert(0, DETECTION_DIR)
+
+
+def detection_config():
+    """
+    Модуль config проекта deep-image-orientation-detection. Импорт модуля orientation_detector
+    не меняет sys.path: путь добавляется при первом обращении, т.е. при создании детектора
+    (torch загружает только бэкенд PyTorch).
+    """
+    add_detection_path()
+    import config
+
+    return config
+
+
+# Преобразуем класс в угол поворота согласно CLASS_MAP
+# Class 0: 0° (правильная ориентация)
+# Class 1: 90° по часовой стрелке -> -90
+# Class 2: 180°
+# Class 3: 90° против часовой стрелки -> 90
+ANGLE_MAP = {0: 0, 1: -90, 2: 180, 3: 90}
+
+
+class OrientationPrediction(NamedTuple):
+    """Предсказание ориентации одного изображения."""
+    angle: int                  # угол поворота (см. predict_orientation)
+    probabilities: List[float]  # вероятности классов в порядке CLASS_MAP
+    tier: str                   # "low" - ответ на низком разрешении, "full" - на полном
 
 
 class OrientationDetector:
     """
     Класс для определения ориентации изображений с использованием нейронной сети.
     Инкапсулирует логику из deep-image-orientation-detection.
+    Модель выполняется бэкендом PyTorch (.pth) или ONNX Runtime (.onnx),
+    см. settings.ORIENTATION_BACKEND.
+
+    Каскад: если задан settings.ORIENTATION_CASCADE_SIZE, страница сначала
+    классифицируется на этом (низком) разрешении; ответ принимается, если
+    разница двух наибольших вероятностей не меньше ORIENTATION_CASCADE_MARGIN,
+    иначе страница повторно классифицируется на полном разрешении.
     """
 
-    def __init__(self, model_path: str = None):
+    def __init__(self, model_path: str = None, backend: str = None):
         """
         Инициализирует детектор ориентации.
 
         Args:
             model_path: Путь к файлу модели. Если None, используется путь по умолчанию.
+            backend: "torch", "onnx" или "auto" (по расширению файла модели).
+                Если None, берётся settings.ORIENTATION_BACKEND.
         """
+        config = detection_config()
         if model_path is None:
             model_path = os.path.join(
                 DETECTION_DIR, config.MODEL_SAVE_DIR, "best_model.pth"
@@ -40,22 +81,45 @@ class OrientationDetector:
             )
 
         self.model_path = model_path
-        self.device = get_device()
-        self.transforms = get_data_transforms()["val"]
+        self.backend_name = self._resolve_backend(backend or settings.ORIENTATION_BACKEND)
 
         # Загружаем модель
-        self.model = get_orientation_model(pretrained=False)
-        state_dict = torch.load(self.model_path, map_location=self.device)
-        self.model.load_state_dict(state_dict)
-        self.model.to(self.device)
-        self.model.eval()
+        if self.backend_name == "onnx":
+            self.backend = OnnxOrientationBackend(
+                self.model_path,
+                config.IMAGE_SIZE,
+                max_batch_size=settings.ORIENTATION_MAX_BATCH_SIZE,
+                intra_op_threads=settings.ORT_INTRA_OP_THREADS,
+                inter_op_threads=settings.ORT_INTER_OP_THREADS,
+                graph_optimization=settings.ORT_GRAPH_OPTIMIZATION,
+                enable_mem_arena=settings.ORT_ENABLE_MEM_ARENA,
+            )
+        else:
+            self.backend = TorchOrientationBackend(self.model_path, config.IMAGE_SIZE)
+
+        self.cascade_size = settings.ORIENTATION_CASCADE_SIZE
+        self.cascade_margin = settings.ORIENTATION_CASCADE_MARGIN
+        fixed_size = self.backend.fixed_image_size
+        if self.cascade_size and fixed_size is not None and fixed_size != self.cascade_size:
+            print(
+                f"Warning: orientation model only accepts {fixed_size}px inputs, "
+                f"cascade is disabled. Re-export it with convert_to_onnx.py for dynamic sizes."
+            )
+            self.cascade_size = 0
+
+    def _resolve_backend(self, backend: str) -> str:
+        if backend == "auto":
+            return "onnx" if self.model_path.lower().endswith(".onnx") else "torch"
+        if backend not in ("torch", "onnx"):
+            raise ValueError(f"Unknown orientation backend: {backend}")
+        return backend
 
-    def predict_orientation(self, image_path: str) -> int:
+    def predict_orientation(self, image: Union[str, Image.Image]) -> int:
         """
         Предсказывает ориентацию изображения и возвращает угол поворота.
 
         Args:
-            image_path: Путь к изображению
+            image: Путь к изображению или уже декодированное RGB-изображение
 
         Returns:
             int: Угол поворота в градусах:
@@ -64,59 +128,102 @@ class OrientationDetector:
                 180 - нужно повернуть на 180°
                 90 - нужно повернуть на 90° против часовой стрелки
         """
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"Image file not found: {image_path}")
+        return self.predict_orientations([image])[0]
 
-        try:
-            image = load_image_safely(image_path)
-        except Exception as e:
-            raise ValueError(f"Error opening image {image_path}: {e}")
+    def predict_orientations(self, images: List[Union[str, Image.Image]]) -> List[int]:
+        """
+        Предсказывает ориентацию для пачки изображений за один проход модели.
 
-        # Преобразуем изображение в тензор
-        input_tensor = self.transforms(image).unsqueeze(0).to(self.device)
+        Args:
+            images: Пути к изображениям или уже декодированные RGB-изображения
 
-        # Предсказываем
-        with torch.no_grad():
-            output = self.model(input_tensor)
-            _, predicted_idx = torch.max(output, 1)
+        Returns:
+            List[int]: Углы поворота в том же порядке (см. predict_orientation)
+        """
+        return [prediction.angle for prediction in self.predict_with_probabilities(images)]
 
-        predicted_class = predicted_idx.item()
+    def predict_with_probabilities(
+        self, images: List[Union[str, Image.Image]]
+    ) -> List[OrientationPrediction]:
+        """
+        Предсказывает ориентацию пачки изображений вместе с вероятностями классов
+        и уровнем каскада, который дал ответ.
 
-        # Преобразуем класс в угол поворота согласно CLASS_MAP
-        # Class 0: 0° (правильная ориентация)
-        # Class 1: 90° по часовой стрелке -> -90
-        # Class 2: 180°
-        # Class 3: 90° против часовой стрелки -> 90
-        angle_map = {0: 0, 1: -90, 2: 180, 3: 90}
-        return angle_map[predicted_class]
+        Args:
+            images: Пути к изображениям или уже декодированные RGB-изображения
 
-    def get_orientation_message(self, image_path: str) -> str:
+        Returns:
+            List[OrientationPrediction]: Предсказания в том же порядке
+        """
+        loaded = [self._load_image(image) for image in images]
+        probabilities = np.empty((len(loaded), len(ANGLE_MAP)), dtype=np.float32)
+        tiers = ["full"] * len(loaded)
+        uncertain = list(range(len(loaded)))
+
+        if self.cascade_size:
+            low = self.backend.predict_probabilities(loaded, self.cascade_size)
+            top2 = np.sort(low, axis=1)[:, -2:]
+            margins = top2[:, 1] - top2[:, 0]
+            uncertain = []
+            for i, margin in enumerate(margins):
+                if margin >= self.cascade_margin:
+                    probabilities[i] = low[i]
+                    tiers[i] = "low"
+                else:
+                    uncertain.append(i)
+                ORIENTATION_MARGIN.observe(float(margin), "low")
+
+        if uncertain:
+            full = self.backend.predict_probabilities([loaded[i] for i in uncertain])
+            probabilities[uncertain] = full
+            top2 = np.sort(full, axis=1)[:, -2:]
+            for margin in top2[:, 1] - top2[:, 0]:
+                ORIENTATION_MARGIN.observe(float(margin), "full")
+
+        for tier in tiers:
+            ORIENTATION_TIERS.inc(tier)
+
+        return [
+            OrientationPrediction(ANGLE_MAP[int(row.argmax())], row.tolist(), tier)
+            for row, tier in zip(probabilities, tiers)
+        ]
+
+    def get_orientation_message(self, image: Union[str, Image.Image]) -> str:
         """
         Возвращает текстовое сообщение о необходимом повороте изображения.
 
         Args:
-            image_path: Путь к изображению
+            image: Путь к изображению или уже декодированное RGB-изображение
 
         Returns:
             str: Сообщение о необходимом повороте
         """
-        predicted_class = self._get_predicted_class(image_path)
-        return config.CLASS_MAP[predicted_class]
+        predicted_class = self._get_predicted_class(image)
+        return detection_config().CLASS_MAP[predicted_class]
 
-    def _get_predicted_class(self, image_path: str) -> int:
-        """Внутренний метод для получения предсказанного класса."""
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"Image file not found: {image_path}")
+    def _load_image(self, image: Union[str, Image.Image]) -> Image.Image:
+        """Возвращает декодированное изображение; путь загружается с диска."""
+        if isinstance(image, Image.Image):
+            return image
+
+        if not os.path.exists(image):
+            raise FileNotFoundError(f"Image file not found: {image}")
 
         try:
-            image = load_image_safely(image_path)
+            # Та же семантика, что у load_image_safely, но без импорта torch.
+            # Модели нужна сторона не больше image_size + 32, полное разрешение не декодируем.
+            with open(image, "rb") as f:
+                return decode_image(f.read(), min_size=self.backend.image_size + 32)
         except Exception as e:
-            raise ValueError(f"Error opening image {image_path}: {e}")
+            raise ValueError(f"Error opening image {image}: {e}")
 
-        input_tensor = self.transforms(image).unsqueeze(0).to(self.device)
-
-        with torch.no_grad():
-            output = self.model(input_tensor)
-            _, predicted_idx = torch.max(output, 1)
-
-        return predicted_idx.item()
+    def _get_predicted_class(self, image: Union[str, Image.Image]) -> int:
+        """Внутренний метод для получения предсказанного класса."""
+        return self._get_predicted_classes([image])[0]
+
+    def _get_predicted_classes(self, images: List[Union[str, Image.Image]]) -> List[int]:
+        """Внутренний метод для получения предсказанных классов пачки изображений."""
+        return [
+            int(np.argmax(prediction.probabilities))
+            for prediction in self.predict_with_probabilities(images)
+        ]
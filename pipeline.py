@@ -0,0 +1,439 @@
+import asyncio
+import time
+from typing import Any, Dict, Iterator, List, Optional
+from PIL import Image
+from inference_pool import ModelPool
+from batching import MicroBatcher
+from image_io import make_thumbnail, open_pages, page_layout
+from metrics import CACHE_LOOKUPS, QUEUE_DEPTH, STAGE_SECONDS, STARTUP_SECONDS, record_document
+from model_server_client import ModelServerClient
+from result_cache import ResultCache, model_fingerprint
+import settings
+
+
+# Допустимые значения settings.PIPELINE_ORDER
+PIPELINE_ORDERS = ("orientation_first", "classify_first")
+# Допустимые значения settings.ORIENTATION_PROCESSOR
+ORIENTATION_PROCESSORS = ("neural", "tesseract")
+# Синтетическая страница для прогрева моделей: лист A4 при 150 DPI
+WARMUP_PAGE_SIZE = (1240, 1754)
+
+
+class DocumentDecodeError(ValueError):
+    """Загруженный файл не удалось открыть как изображение или документ."""
+
+
+def build_page_result(doc_type: str, signature_count: int) -> dict:
+    """Формирует результат обработки одной страницы для ответа API."""
+    # Если документ рукописный - подписи не подсчитываются
+    if doc_type == "handwritten":
+        return {
+            "document_type": doc_type,
+            "number_of_signatures": 0,
+            "message": "Handwritten documents are not processed"
+        }
+
+    return {
+        "document_type": doc_type,
+        "number_of_signatures": signature_count
+    }
+
+
+def document_outcome(result: dict) -> str:
+    """
+    Итог документа для метрик: тип страницы, а для многостраничного документа
+    printed, если печатной оказалась хотя бы одна страница.
+    """
+    if "pages" not in result:
+        return result["document_type"]
+    page_types = {page["document_type"] for page in result["pages"]}
+    return "printed" if "printed" in page_types else "handwritten"
+
+
+def image_processor_class():
+    """Класс ImageProcessor, выбранный settings.ORIENTATION_PROCESSOR (импорт только нужного)."""
+    if settings.ORIENTATION_PROCESSOR == "tesseract":
+        from image_processor_tesseract import ImageProcessor
+    elif settings.ORIENTATION_PROCESSOR == "neural":
+        from image_processor_neural import ImageProcessor
+    else:
+        raise ValueError(f"Unknown ORIENTATION_PROCESSOR: {settings.ORIENTATION_PROCESSOR}")
+    return ImageProcessor
+
+
+def warm_up(model: Any, method: str) -> None:
+    """
+    Прогоняет через стадию синтетическую страницу settings.WARMUP_RUNS раз: первый вызов
+    модели оплачивает ленивую инициализацию torch, ultralytics и ONNX Runtime.
+    Прогрев попадает в метрики стадий как обычный вызов.
+    """
+    for _ in range(settings.WARMUP_RUNS):
+        getattr(model, method)([Image.new("RGB", WARMUP_PAGE_SIZE, (255, 255, 255))])
+
+
+def report_startup(timings: Dict[str, float]) -> None:
+    """Публикует длительность фаз запуска в метрике signature_startup_seconds и в логе."""
+    for phase, seconds in timings.items():
+        STARTUP_SECONDS.set(seconds, phase)
+    print("Startup timings: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in timings.items()))
+
+
+def classification_image(image: Image.Image, thumbnail_size: int) -> Image.Image:
+    """Изображение, по которому классифицируется ещё не повёрнутая страница."""
+    if thumbnail_size <= 0:
+        return image
+    with STAGE_SECONDS.time("thumbnail"):
+        return make_thumbnail(image, thumbnail_size)
+
+
+def run_stages(
+    image_processor,
+    classificator,
+    detector,
+    images: List[Image.Image],
+    order: str = "orientation_first",
+    thumbnail_size: int = 0,
+) -> List[dict]:
+    """
+    Синхронно прогоняет пачку страниц через все стадии в заданном порядке
+    (процесс инференса model_server.py и оценка порядка стадий).
+    В порядке classify_first ориентация и подписи считаются только для печатных страниц.
+    """
+    if order == "classify_first":
+        doc_types = classificator.classify_documents(
+            [classification_image(image, thumbnail_size) for image in images]
+        )
+        printed = [i for i, doc_type in enumerate(doc_types) if doc_type != "handwritten"]
+        oriented = {}
+        if printed:
+            corrected = image_processor.ensure_correct_orientations([images[i] for i in printed])
+            oriented = {i: image for i, (image, _) in zip(printed, corrected)}
+    else:
+        corrected = image_processor.ensure_correct_orientations(images)
+        oriented = {i: image for i, (image, _) in enumerate(corrected)}
+        doc_types = classificator.classify_documents([oriented[i] for i in range(len(images))])
+        printed = [i for i, doc_type in enumerate(doc_types) if doc_type != "handwritten"]
+
+    # Подписи считаем только на печатных документах
+    signature_counts = [0] * len(images)
+    if printed:
+        counts = detector.count_signatures_batch([oriented[i] for i in printed])
+        for i, count in zip(printed, counts):
+            signature_counts[i] = count
+
+    return [
+        build_page_result(doc_type, count)
+        for doc_type, count in zip(doc_types, signature_counts)
+    ]
+
+
+def _decode_next_page(pages: Iterator[Image.Image]) -> Optional[Image.Image]:
+    """
+    Декодирует следующую страницу документа (None, если страниц больше нет).
+    Страницы декодируются лениво, поэтому повреждённая страница в середине документа
+    обнаруживается только здесь и тоже считается ошибкой декодирования.
+    """
+    start = time.perf_counter()
+    try:
+        image = next(pages, None)
+    except Exception as e:
+        raise DocumentDecodeError(f"Could not decode page: {str(e)}") from e
+    if image is not None:
+        STAGE_SECONDS.observe(time.perf_counter() - start, "decode")
+    return image
+
+
+class SignaturePipeline:
+    """
+    Конвейер обработки документа: ориентация -> классификация -> подсчёт подписей
+    (или, при PIPELINE_ORDER=classify_first, классификация -> ориентация -> подписи).
+    В локальном режиме каждая стадия работает в своём пуле воркеров, одновременные
+    запросы к стадии объединяются в батчи. В режиме "server" модели живут в отдельных
+    процессах model_server.py, а этот процесс только декодирует загрузки.
+    """
+
+    def __init__(self):
+        self.cache: Optional[ResultCache] = None
+        self.model_server: Optional[ModelServerClient] = None
+        self._pools = []
+        self._batchers = []
+        # True, когда модели всех стадий загружены и прогреты
+        self.started = False
+
+        if settings.PIPELINE_ORDER not in PIPELINE_ORDERS:
+            raise ValueError(f"Unknown PIPELINE_ORDER: {settings.PIPELINE_ORDER}")
+        if settings.ORIENTATION_PROCESSOR not in ORIENTATION_PROCESSORS:
+            raise ValueError(f"Unknown ORIENTATION_PROCESSOR: {settings.ORIENTATION_PROCESSOR}")
+
+        if settings.INFERENCE_MODE == "server":
+            self.model_server = ModelServerClient(
+                settings.model_server_addresses(), settings.model_server_authkey()
+            )
+        elif settings.INFERENCE_MODE == "local":
+            self._init_local_stages()
+        else:
+            raise ValueError(f"Unknown INFERENCE_MODE: {settings.INFERENCE_MODE}")
+
+    def _init_local_stages(self) -> None:
+        # Тяжёлые зависимости (torch, ultralytics) нужны только процессу, который держит модели
+        from detector import SignatureDetector
+        from classificator import DocumentClassificator
+        self.detector_pool = ModelPool(
+            "detector",
+            lambda: SignatureDetector(
+                settings.SIGNATURE_MODEL_PATH,
+                settings.IOU_THRESHOLD,
+                settings.DETECTION_CONF_THRESHOLD,
+                settings.DETECTION_MAX_CANDIDATES or None,
+            ),
+            settings.DETECTOR_WORKERS,
+            lambda detector: warm_up(detector, "count_signatures_batch"),
+        )
+        self.classificator_pool = ModelPool(
+            "classificator",
+            lambda: DocumentClassificator(settings.CLASSIFICATOR_MODEL_PATH),
+            settings.CLASSIFICATOR_WORKERS,
+            lambda classificator: warm_up(classificator, "classify_documents"),
+        )
+        self.orientation_pool = ModelPool(
+            "orientation",
+            lambda: image_processor_class()(settings.ORIENTATION_MODEL_PATH),
+            settings.ORIENTATION_WORKERS,
+            lambda image_processor: warm_up(image_processor, "ensure_correct_orientations"),
+        )
+
+        self.orientation_batcher = MicroBatcher(
+            self.orientation_pool,
+            "ensure_correct_orientations",
+            settings.ORIENTATION_MAX_BATCH_SIZE,
+            settings.BATCH_MAX_WAIT_MS,
+        )
+        self.classificator_batcher = MicroBatcher(
+            self.classificator_pool,
+            "classify_documents",
+            settings.CLASSIFICATOR_MAX_BATCH_SIZE,
+            settings.BATCH_MAX_WAIT_MS,
+        )
+        self.detector_batcher = MicroBatcher(
+            self.detector_pool,
+            "count_signatures_batch",
+            settings.DETECTOR_MAX_BATCH_SIZE,
+            settings.BATCH_MAX_WAIT_MS,
+        )
+
+        self._pools = [self.detector_pool, self.classificator_pool, self.orientation_pool]
+        self._batchers = [
+            self.orientation_batcher,
+            self.classificator_batcher,
+            self.detector_batcher,
+        ]
+
+        QUEUE_DEPTH.set_function(lambda: self.orientation_batcher.queue_depth, "orientation")
+        QUEUE_DEPTH.set_function(lambda: self.classificator_batcher.queue_depth, "classification")
+        QUEUE_DEPTH.set_function(lambda: self.detector_batcher.queue_depth, "detection")
+
+    async def start(self) -> None:
+        """
+        Открывает кэш и загружает модели всех стадий одновременно (каждая копия
+        модели прогревается), затем запускает батчеры и выставляет started.
+        """
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+
+        async def timed(phase: str, coroutine) -> Any:
+            phase_start = time.perf_counter()
+            result = await coroutine
+            timings[phase] = time.perf_counter() - phase_start
+            return result
+
+        async def open_cache() -> None:
+            self.cache = await timed("cache", asyncio.to_thread(self._create_cache))
+
+        async def start_pool(pool: ModelPool) -> None:
+            for phase, seconds in (await pool.start()).items():
+                timings[f"{pool.name}_{phase}"] = seconds
+
+        # Стадии загружаются параллельно: время запуска - самая медленная стадия, а не их сумма
+        jobs = [start_pool(pool) for pool in self._pools]
+        if settings.CACHE_ENABLED:
+            jobs.append(open_cache())
+        if self.model_server is not None:
+            jobs.append(timed("model_server", self.model_server.start()))
+        await asyncio.gather(*jobs)
+
+        for batcher in self._batchers:
+            await batcher.start()
+
+        timings["total"] = time.perf_counter() - started
+        report_startup(timings)
+        self.started = True
+
+    @property
+    def ready(self) -> bool:
+        """Готовность к трафику (см. /ready): запуск завершён и, в режиме server, жив хотя бы один процесс инференса."""
+        if not self.started:
+            return False
+        return self.model_server is None or self.model_server.connected
+
+    async def stop(self) -> None:
+        self.started = False
+        for batcher in self._batchers:
+            await batcher.stop()
+        for pool in self._pools:
+            pool.shutdown()
+        if self.model_server is not None:
+            self.model_server.close()
+
+    def _create_cache(self) -> ResultCache:
+        # Ключ кэша зависит от весов всех моделей и параметров постобработки
+        fingerprint = model_fingerprint(
+            [
+                settings.SIGNATURE_MODEL_PATH,
+                settings.CLASSIFICATOR_MODEL_PATH,
+                settings.ORIENTATION_MODEL_PATH,
+            ],
+            {
+                "iou": settings.IOU_THRESHOLD,
+                "conf": settings.DETECTION_CONF_THRESHOLD,
+                "max_candidates": settings.DETECTION_MAX_CANDIDATES,
+                "order": settings.PIPELINE_ORDER,
+                "thumbnail": settings.CLASSIFY_THUMBNAIL_SIZE,
+                "orientation_processor": settings.ORIENTATION_PROCESSOR,
+                "pdf_dpi": settings.PDF_RENDER_DPI,
+                "orientation_cascade": (
+                    settings.ORIENTATION_CASCADE_SIZE, settings.ORIENTATION_CASCADE_MARGIN
+                ),
+                "tesseract_osd": (
+                    settings.TESSERACT_OSD_MAX_SIDE,
+                    settings.TESSERACT_OSD_BINARIZE,
+                    settings.TESSERACT_OSD_REGION,
+                ),
+            },
+        )
+        return ResultCache(
+            fingerprint,
+            max_entries=settings.CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.CACHE_TTL_SECONDS,
+            db_path=settings.CACHE_DB_PATH or None,
+            disk_max_entries=settings.CACHE_DISK_MAX_ENTRIES,
+        )
+
+    async def process_document(self, content: bytes, extension: str) -> dict:
+        """
+        Обрабатывает загруженный файл: сначала ищет результат в кэше по содержимому,
+        затем открывает документ и прогоняет его страницы через конвейер.
+        """
+        cache_key = None
+        if self.cache is not None:
+            cache_key = await asyncio.to_thread(
+                self.cache.make_key, content, page_layout(extension)
+            )
+            cached_result = await self.cache.get(cache_key)
+            CACHE_LOOKUPS.inc("hit" if cached_result is not None else "miss")
+            if cached_result is not None:
+                record_document(document_outcome(cached_result))
+                return cached_result
+
+        try:
+            with STAGE_SECONDS.time("open"):
+                page_count, pages = await asyncio.to_thread(open_pages, content, extension)
+        except Exception as e:
+            record_document("error")
+            raise DocumentDecodeError(str(e)) from e
+
+        try:
+            result = await self.process_pages(page_count, pages)
+        except Exception:
+            record_document("error")
+            raise
+
+        # Документ учитывается в метриках один раз, сколько бы страниц в нём ни было
+        record_document(document_outcome(result))
+        if cache_key is not None:
+            await self.cache.put(cache_key, result)
+        return result
+
+    async def process(self, image: Image.Image) -> dict:
+        """Обрабатывает декодированное изображение и возвращает результат для ответа API."""
+        if self.model_server is not None:
+            return await self.model_server.process(image)
+
+        classify_first = settings.PIPELINE_ORDER == "classify_first"
+        if classify_first:
+            # Дешёвая классификация до ориентации: рукописные страницы дальше не идут
+            thumbnail = await asyncio.to_thread(
+                classification_image, image, settings.CLASSIFY_THUMBNAIL_SIZE
+            )
+            doc_type = await self.classificator_batcher.submit(thumbnail)
+            if doc_type == "handwritten":
+                return build_page_result(doc_type, 0)
+
+        # Проверяем и корректируем ориентацию изображения (поворот выполняется в памяти)
+        image, was_rotated = await self.orientation_batcher.submit(image)
+
+        if was_rotated:
+            print("Image was rotated successfully")
+
+        # Классифицируем документ
+        if not classify_first:
+            doc_type = await self.classificator_batcher.submit(image)
+
+        # Если документ печатный - подсчитываем подписи
+        signature_count = 0
+        if doc_type != "handwritten":
+            signature_count = await self.detector_batcher.submit(image)
+
+        return build_page_result(doc_type, signature_count)
+
+    async def process_pages(self, page_count: int, pages: Iterator[Image.Image]) -> dict:
+        """
+        Обрабатывает документ из одной или нескольких страниц.
+        Страницы декодируются лениво и проходят конвейер параллельно; одновременно
+        в работе не больше MAX_PAGES_IN_FLIGHT страниц, независимо от их общего числа.
+        """
+        if page_count == 1:
+            image = await asyncio.to_thread(_decode_next_page, pages)
+            if image is None:
+                raise DocumentDecodeError("Document has no pages")
+            return await self.process(image)
+
+        slots = asyncio.Semaphore(settings.MAX_PAGES_IN_FLIGHT)
+        tasks = []
+
+        async def process_page(image: Image.Image) -> dict:
+            try:
+                return await self.process(image)
+            finally:
+                slots.release()
+
+        try:
+            while True:
+                # Следующую страницу декодируем только когда освободился слот
+                await slots.acquire()
+                try:
+                    image = await asyncio.to_thread(_decode_next_page, pages)
+                except Exception:
+                    slots.release()
+                    raise
+                if image is None:
+                    slots.release()
+                    break
+                tasks.append(asyncio.create_task(process_page(image)))
+                del image
+
+            page_results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        pages_response = [
+            {"page": number, **result}
+            for number, result in enumerate(page_results, start=1)
+        ]
+        return {
+            "number_of_pages": len(pages_response),
+            "number_of_signatures": sum(page["number_of_signatures"] for page in pages_response),
+            "pages": pages_response,
+        }
@@ -0,0 +1,71 @@
+import logging
+from typing import Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def box_iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """
+    Вычисляет IoU одной рамки [x1, y1, x2, y2] со всеми рамками массива (N, 4).
+    Арифметика повторяет попарный расчёт (в том же типе данных), поэтому
+    результаты совпадают с ним бит в бит.
+    """
+    x1_min = np.maximum(box[0], boxes[:, 0])
+    y1_min = np.maximum(box[1], boxes[:, 1])
+    x2_max = np.minimum(box[2], boxes[:, 2])
+    y2_max = np.minimum(box[3], boxes[:, 3])
+
+    intersection_area = np.maximum(0, x2_max - x1_min) * np.maximum(0, y2_max - y1_min)
+    box_area = (box[2] - box[0]) * (box[3] - box[1])
+    boxes_area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    union_area = box_area + boxes_area - intersection_area
+
+    return np.divide(
+        intersection_area,
+        union_area,
+        out=np.zeros_like(intersection_area),
+        where=union_area > 0,
+    )
+
+
+def non_max_suppression(
+    boxes: np.ndarray,
+    confidences: np.ndarray,
+    iou_threshold: float,
+    max_candidates: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Жадный NMS: рамки перебираются по убыванию уверенности, рамка отбрасывается,
+    если её IoU с уже оставленной рамкой не меньше iou_threshold.
+    IoU текущей рамки со всеми оставшимися считается одной векторной операцией.
+    max_candidates ограничивает число рамок с наибольшей уверенностью до NMS.
+    Возвращает индексы оставленных рамок.
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    order = np.argsort(confidences)[::-1]
+    if max_candidates is not None:
+        order = order[:max_candidates]
+
+    keep = []
+    while order.size > 0:
+        current = order[0]
+        keep.append(current)
+        remaining = order[1:]
+        ious = box_iou(boxes[current], boxes[remaining])
+        order = remaining[ious < iou_threshold]
+
+    return np.asarray(keep, dtype=np.int64)
+
+
+def log_boxes(title: str, boxes: np.ndarray, confidences: np.ndarray) -> None:
+    """Печатает рамки в отладочный лог (только если включён уровень DEBUG)."""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    logger.debug(title)
+    for i, (box, confidence) in enumerate(zip(boxes, confidences)):
+        logger.debug(
+            f"  Box{i+1}: [{box[0]:.1f}, {box[1]:.1f}, {box[2]:.1f}, {box[3]:.1f}] - confidence: {confidence:.3f}"
+        )
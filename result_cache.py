@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# Меняется, когда меняется формат ответа или логика конвейера, влияющая на результат
+CACHE_VERSION = "1"
+
+
+def _update_digest(digest, path: str) -> None:
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+
+def file_fingerprint(path: str) -> str:
+    """
+    SHA-256 содержимого файла модели (или пометка об отсутствии файла).
+    Для папки модели (*_openvino_model: .xml, .bin, metadata.yaml) хэшируются все её файлы
+    в порядке относительных путей, вместе с самими путями.
+    """
+    if not os.path.exists(path):
+        return f"missing:{path}"
+
+    digest = hashlib.sha256()
+    if not os.path.isdir(path):
+        _update_digest(digest, path)
+        return digest.hexdigest()
+
+    files = []
+    for directory, _, filenames in os.walk(path):
+        for filename in filenames:
+            full_path = os.path.join(directory, filename)
+            files.append((os.path.relpath(full_path, path).replace(os.sep, "/"), full_path))
+    for relative_path, full_path in sorted(files):
+        digest.update(relative_path.encode("utf-8") + b"\0")
+        _update_digest(digest, full_path)
+    return digest.hexdigest()
+
+
+def model_fingerprint(model_paths: List[str], parameters: Dict[str, object]) -> str:
+    """
+    Отпечаток всего, что влияет на результат: веса всех моделей и параметры
+    постобработки (порог IoU и т.п.). Замена любой модели даёт новый отпечаток,
+    и старые записи кэша перестают находиться.
+    """
+    parts = [CACHE_VERSION]
+    parts.extend(f"{name}={parameters[name]}" for name in sorted(parameters))
+    parts.extend(file_fingerprint(path) for path in model_paths)
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Кэш результатов по содержимому загрузки.
+    Первый уровень - LRU в памяти процесса с ограничением по размеру и TTL.
+    Второй (необязательный) - SQLite-файл, общий для всех воркеров uvicorn на хосте.
+    """
+
+    def __init__(
+        self,
+        fingerprint: str,
+        max_entries: int = 10000,
+        ttl_seconds: float = 86400,
+        db_path: Optional[str] = None,
+        disk_max_entries: int = 1000000,
+    ):
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.disk_max_entries = disk_max_entries
+
+        # key -> (момент истечения, результат в JSON)
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._puts_since_prune = 0
+
+        if self.db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._connection().execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._connection().execute(
+                "CREATE INDEX IF NOT EXISTS results_created_at ON results (created_at)"
+            )
+
+    def make_key(self, content: bytes, layout: str = "") -> str:
+        """
+        Ключ результата: отпечаток моделей, способ разбора загрузки на страницы
+        (см. image_io.page_layout) и содержимое.
+        """
+        digest = hashlib.sha256(self.fingerprint.encode("utf-8"))
+        digest.update(layout.encode("utf-8") + b"\0")
+        digest.update(content)
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[dict]:
+        value = self._memory_get(key)
+        if value is None and self.db_path:
+            value = await asyncio.to_thread(self._disk_get, key)
+            if value is not None:
+                self._memory_put(key, value)
+        return json.loads(value) if value is not None else None
+
+    async def put(self, key: str, result: dict) -> None:
+        value = json.dumps(result, ensure_ascii=False)
+        self._memory_put(key, value)
+        if self.db_path:
+            await asyncio.to_thread(self._disk_put, key, value)
+
+    # --- Уровень в памяти ---
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return value
+
+    def _memory_put(self, key: str, value: str) -> None:
+        with self._lock:
+            self._memory[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    # --- Уровень на диске ---
+
+    def _connection(self) -> sqlite3.Connection:
+        # Соединение SQLite нельзя делить между потоками, поэтому у каждого потока своё
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        row = self._connection().execute(
+            "SELECT value FROM results WHERE key = ? AND created_at > ?",
+            (key, time.time() - self.ttl_seconds),
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def _disk_put(self, key: str, value: str) -> None:
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO results (key, value, created_at) VALUES (?, ?, ?)",
+            (key, value, time.time()),
+        )
+
+        # Устаревшие и лишние записи чистим периодически, а не на каждой записи
+        with self._lock:
+            self._puts_since_prune += 1
+            should_prune = self._puts_since_prune >= 1000
+            if should_prune:
+                self._puts_since_prune = 0
+        if should_prune:
+            connection.execute(
+                "DELETE FROM results WHERE created_at <= ?",
+                (time.time() - self.ttl_seconds,),
+            )
+            connection.execute(
+                "DELETE FROM results WHERE key IN ("
+                "SELECT key FROM results ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.disk_max_entries,),
+            )
@@ -0,0 +1,141 @@
+import os
+
+# Настройки сервиса. Любое значение можно переопределить переменной окружения.
+
+SIGNATURE_MODEL_PATH = os.getenv("SIGNATURE_MODEL_PATH", "models/signature.pt")
+CLASSIFICATOR_MODEL_PATH = os.getenv("CLASSIFICATOR_MODEL_PATH", "models/classificator.pt")
+ORIENTATION_MODEL_PATH = os.getenv(
+    "ORIENTATION_MODEL_PATH",
+    os.path.join(
+        os.path.dirname(__file__), "deep-image-orientation-detection", "models", "best_model.pth"
+    ),
+)
+
+# Бэкенд модели ориентации: torch, onnx или auto (по расширению файла модели)
+ORIENTATION_BACKEND = os.getenv("ORIENTATION_BACKEND", "auto")
+# Каскад ориентации: сначала модель на входе этого размера (0 - каскад выключен),
+# на полном разрешении - только страницы, где разница двух лучших вероятностей меньше порога
+ORIENTATION_CASCADE_SIZE = int(os.getenv("ORIENTATION_CASCADE_SIZE", "0"))
+ORIENTATION_CASCADE_MARGIN = float(os.getenv("ORIENTATION_CASCADE_MARGIN", "0.8"))
+# Определение ориентации: neural (модель ориентации) или tesseract (Tesseract OSD)
+ORIENTATION_PROCESSOR = os.getenv("ORIENTATION_PROCESSOR", "neural")
+# Tesseract OSD: одновременно запущенных процессов tesseract на процесс сервиса
+# и предельное время одного вызова (0 - без ограничения)
+TESSERACT_WORKERS = int(os.getenv("TESSERACT_WORKERS", str(os.cpu_count() or 1)))
+TESSERACT_TIMEOUT_SECONDS = float(os.getenv("TESSERACT_TIMEOUT_SECONDS", "10"))
+# OSD выполняется на уменьшенной копии страницы: наибольшая сторона в пикселях (0 - без уменьшения),
+# бинаризация по Оцу и область: full (вся страница) или text (самая плотная по тексту часть)
+TESSERACT_OSD_MAX_SIDE = int(os.getenv("TESSERACT_OSD_MAX_SIDE", "1600"))
+TESSERACT_OSD_BINARIZE = os.getenv("TESSERACT_OSD_BINARIZE", "1") == "1"
+TESSERACT_OSD_REGION = os.getenv("TESSERACT_OSD_REGION", "full")
+# Параметры сессии ONNX Runtime (0 потоков - выбор ONNX Runtime)
+ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", "0"))
+ORT_INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", "0"))
+# disabled, basic, extended или all
+ORT_GRAPH_OPTIMIZATION = os.getenv("ORT_GRAPH_OPTIMIZATION", "all")
+ORT_ENABLE_MEM_ARENA = os.getenv("ORT_ENABLE_MEM_ARENA", "1") == "1"
+
+# Порог IoU для отсеивания дублирующих рамок подписей
+IOU_THRESHOLD = float(os.getenv("IOU_THRESHOLD", "0.4"))
+# Отсечение рамок до NMS: минимальная уверенность и число лучших кандидатов (0 - без ограничения)
+DETECTION_CONF_THRESHOLD = float(os.getenv("DETECTION_CONF_THRESHOLD", "0.0"))
+DETECTION_MAX_CANDIDATES = int(os.getenv("DETECTION_MAX_CANDIDATES", "0"))
+
+# --- Порядок стадий конвейера ---
+# orientation_first - ориентация -> классификация -> подписи (исходный порядок)
+# classify_first    - сначала дешёвая классификация, ориентация и подписи только для печатных
+PIPELINE_ORDER = os.getenv("PIPELINE_ORDER", "orientation_first")
+# Сторона квадратной миниатюры для классификации в режиме classify_first (0 - исходное изображение)
+CLASSIFY_THUMBNAIL_SIZE = int(os.getenv("CLASSIFY_THUMBNAIL_SIZE", "0"))
+
+# --- Пулы воркеров ---
+# Каждый воркер стадии держит собственную копию модели,
+# поэтому размер пула напрямую определяет расход памяти на веса.
+ORIENTATION_WORKERS = int(os.getenv("ORIENTATION_WORKERS", "1"))
+CLASSIFICATOR_WORKERS = int(os.getenv("CLASSIFICATOR_WORKERS", "1"))
+DETECTOR_WORKERS = int(os.getenv("DETECTOR_WORKERS", "1"))
+
+# --- Микро-батчинг ---
+# Максимальный размер батча каждой стадии (1 - батчинг отключён)
+ORIENTATION_MAX_BATCH_SIZE = int(os.getenv("ORIENTATION_MAX_BATCH_SIZE", "16"))
+CLASSIFICATOR_MAX_BATCH_SIZE = int(os.getenv("CLASSIFICATOR_MAX_BATCH_SIZE", "32"))
+DETECTOR_MAX_BATCH_SIZE = int(os.getenv("DETECTOR_MAX_BATCH_SIZE", "8"))
+# Сколько миллисекунд первый запрос батча может ждать попутчиков
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+
+# --- Пакетная обработка (/detect-signatures/bulk) ---
+# Сколько документов одного запроса обрабатывается (и хранится в памяти) одновременно
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "16"))
+# Максимальное число файлов в одном multipart-запросе
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "1000"))
+# Максимальный размер одного документа внутри архива
+BULK_MAX_MEMBER_BYTES = int(os.getenv("BULK_MAX_MEMBER_BYTES", str(100 * 1024 * 1024)))
+
+# --- Многостраничные документы (TIFF/PDF) ---
+# Сколько страниц одного документа обрабатывается (и хранится в памяти) одновременно
+MAX_PAGES_IN_FLIGHT = int(os.getenv("MAX_PAGES_IN_FLIGHT", "4"))
+# Разрешение, с которым растеризуются страницы PDF
+PDF_RENDER_DPI = int(os.getenv("PDF_RENDER_DPI", "200"))
+
+# --- Кэш результатов ---
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+# Уровень в памяти процесса
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "86400"))
+# Уровень на диске, общий для всех воркеров на хосте (пустая строка - отключён)
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "cache/results.sqlite3")
+CACHE_DISK_MAX_ENTRIES = int(os.getenv("CACHE_DISK_MAX_ENTRIES", "1000000"))
+
+# --- Запуск ---
+# Сколько раз каждая копия модели прогоняет синтетическую страницу до готовности сервиса
+# (0 - без прогрева; тогда ленивую инициализацию torch/ultralytics оплачивает первый запрос)
+WARMUP_RUNS = int(os.getenv("WARMUP_RUNS", "1"))
+
+# --- Режим инференса ---
+# local  - модели загружаются в каждом HTTP-воркере
+# server - HTTP-воркеры только декодируют загрузки и передают пиксели через
+#          разделяемую память процессам model_server.py
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "local")
+# Каталог Unix-сокетов процессов инференса (процесс i слушает inference-i.sock).
+# Пустая строка - TCP: процесс i слушает MODEL_SERVER_HOST:MODEL_SERVER_PORT + i
+MODEL_SERVER_SOCKET_DIR = os.getenv("MODEL_SERVER_SOCKET_DIR", "")
+# Только loopback: процесс инференса не должен быть доступен с других хостов
+MODEL_SERVER_HOST = os.getenv("MODEL_SERVER_HOST", "127.0.0.1")
+MODEL_SERVER_PORT = int(os.getenv("MODEL_SERVER_PORT", "8765"))
+MODEL_SERVER_WORKERS = int(os.getenv("MODEL_SERVER_WORKERS", "1"))
+# Общий секрет HTTP-воркеров и процессов инференса. Значения по умолчанию нет:
+# multiprocessing.connection распаковывает (unpickle) сообщения, поэтому знание ключа
+# даёт выполнение произвольного кода в процессе инференса
+MODEL_SERVER_AUTHKEY = os.getenv("MODEL_SERVER_AUTHKEY", "")
+MODEL_SERVER_AUTHKEY_MIN_LENGTH = 16
+# Пауза между попытками переподключиться к упавшему процессу инференса
+MODEL_SERVER_RECONNECT_SECONDS = float(os.getenv("MODEL_SERVER_RECONNECT_SECONDS", "5"))
+# Сколько страниц процесс инференса объединяет в один проход модели
+MODEL_SERVER_MAX_BATCH_SIZE = int(os.getenv("MODEL_SERVER_MAX_BATCH_SIZE", "16"))
+
+
+def model_server_addresses(workers: int = None) -> list:
+    """Адреса процессов инференса: пути Unix-сокетов или (host, port) на loopback."""
+    workers = MODEL_SERVER_WORKERS if workers is None else workers
+    if MODEL_SERVER_SOCKET_DIR:
+        return [
+            os.path.join(MODEL_SERVER_SOCKET_DIR, f"inference-{index}.sock")
+            for index in range(workers)
+        ]
+
+    if MODEL_SERVER_HOST not in ("127.0.0.1", "::1", "localhost"):
+        raise RuntimeError(
+            f"MODEL_SERVER_HOST must be a loopback address, got {MODEL_SERVER_HOST!r}. "
+            f"Use MODEL_SERVER_SOCKET_DIR for Unix sockets."
+        )
+    return [(MODEL_SERVER_HOST, MODEL_SERVER_PORT + index) for index in range(workers)]
+
+
+def model_server_authkey() -> bytes:
+    """Ключ MODEL_SERVER_AUTHKEY; без явно заданного достаточно длинного секрета режим server не запускается."""
+    if len(MODEL_SERVER_AUTHKEY) < MODEL_SERVER_AUTHKEY_MIN_LENGTH:
+        raise RuntimeError(
+            f"MODEL_SERVER_AUTHKEY must be set to a secret of at least {MODEL_SERVER_AUTHKEY_MIN_LENGTH} "
+            f"characters (e.g. python -c \"import secrets; print(secrets.token_hex(32))\")"
+        )
+    return MODEL_SERVER_AUTHKEY.encode("utf-8")
@@ -0,0 +1,49 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_cache import ResultCache, file_fingerprint, model_fingerprint  # noqa: E402
+
+
+def make_openvino_model(root, weights=b"weights"):
+    model_dir = os.path.join(root, "signature_openvino_model")
+    os.makedirs(model_dir)
+    for name, content in (
+        ("signature.xml", b"<net/>"),
+        ("signature.bin", weights),
+        ("metadata.yaml", b"names: {0: signature}"),
+    ):
+        with open(os.path.join(model_dir, name), "wb") as f:
+            f.write(content)
+    return model_dir
+
+
+def test_openvino_model_directory_is_fingerprinted(tmp_path):
+    model_dir = make_openvino_model(str(tmp_path))
+
+    fingerprint = file_fingerprint(model_dir)
+    assert fingerprint == file_fingerprint(model_dir)
+    assert len(model_fingerprint([model_dir], {"iou": 0.4})) == 64
+
+    # Новые веса в папке дают новый отпечаток
+    with open(os.path.join(model_dir, "signature.bin"), "wb") as f:
+        f.write(b"retrained")
+    assert file_fingerprint(model_dir) != fingerprint
+
+
+def test_same_directory_content_gives_same_fingerprint(tmp_path):
+    first = make_openvino_model(str(tmp_path / "a"))
+    second = make_openvino_model(str(tmp_path / "b"))
+    assert file_fingerprint(first) == file_fingerprint(second)
+
+
+def test_missing_model(tmp_path):
+    assert file_fingerprint(str(tmp_path / "absent.pt")).startswith("missing:")
+
+
+def test_key_depends_on_page_layout():
+    # Многостраничный TIFF, загруженный как .png, разбирается как одна страница
+    cache = ResultCache("fingerprint")
+    assert cache.make_key(b"tiff", "multipage") != cache.make_key(b"tiff", "single")
+    assert cache.make_key(b"tiff", "single") == cache.make_key(b"tiff", "single")
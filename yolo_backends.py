@@ -0,0 +1,294 @@
+import ast
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+from PIL import Image
+from onnx_session import create_onnx_session
+from postprocessing import non_max_suppression
+import settings
+
+# Параметры постобработки ultralytics по умолчанию (model.predict без аргументов),
+# чтобы экспортированные модели давали те же рамки, что и .pt
+DEFAULT_CONF_THRESHOLD = 0.25
+DEFAULT_IOU_THRESHOLD = 0.7
+DEFAULT_MAX_DETECTIONS = 300
+# Сколько кандидатов с наибольшей уверенностью попадает в NMS
+MAX_NMS_CANDIDATES = 30000
+# Смещение рамок разных классов, чтобы NMS подавлял рамки только внутри класса
+MAX_BOX_SIZE = 7680
+LETTERBOX_COLOR = (114, 114, 114)
+
+
+class Detections(NamedTuple):
+    """Рамки одного изображения в координатах исходного изображения."""
+    boxes: np.ndarray        # (N, 4) x1, y1, x2, y2
+    confidences: np.ndarray  # (N,)
+    class_ids: np.ndarray    # (N,)
+
+
+def load_yolo_backend(model_path: str):
+    """
+    Выбирает бэкенд по артефакту модели:
+    .onnx - ONNX Runtime, .xml или папка *_openvino_model - OpenVINO,
+    остальное (.pt, .yaml) - ultralytics.
+    """
+    if model_path.lower().endswith(".onnx"):
+        return OnnxYoloBackend(model_path)
+    if model_path.lower().endswith(".xml") or os.path.isdir(model_path):
+        return OpenVinoYoloBackend(model_path)
+    return UltralyticsYoloBackend(model_path)
+
+
+class UltralyticsYoloBackend:
+    """Исходный вариант: ultralytics.YOLO на весах PyTorch."""
+
+    def __init__(self, model_path: str):
+        # ultralytics и torch нужны только этому бэкенду
+        from ultralytics import YOLO
+
+        self.model = YOLO(model_path)
+        self.names: Dict[int, str] = dict(self.model.names)
+
+    def classify(self, images: List[Image.Image]) -> List[Optional[int]]:
+        results = self.model(images, verbose=False)
+        return [r.probs.top1 if r.probs is not None else None for r in results]
+
+    def detect(self, images: List[Image.Image]) -> List[Detections]:
+        results = self.model(images, verbose=False)
+        detections = []
+        for r in results:
+            if r.boxes is None or len(r.boxes) == 0:
+                detections.append(_empty_detections())
+                continue
+            # Все рамки переносятся на CPU одной операцией на тензор, а не по одной
+            detections.append(Detections(
+                r.boxes.xyxy.cpu().numpy(),
+                r.boxes.conf.cpu().numpy().astype(np.float64),
+                r.boxes.cls.cpu().numpy().astype(np.int64),
+            ))
+        return detections
+
+
+class RawYoloBackend:
+    """
+    Общая часть бэкендов, выполняющих "сырую" экспортированную модель:
+    letterbox/center-crop предобработка и декодирование выходов в numpy,
+    как в ultralytics, но без импорта ultralytics и torch.
+    Подклассы задают _infer и описание входа модели.
+    """
+
+    def __init__(self, metadata: Dict[str, object], input_shape: Tuple):
+        self.task = metadata.get("task", "detect")
+        self.names = {int(k): v for k, v in metadata["names"].items()}
+        self.stride = int(metadata.get("stride", 32))
+        imgsz = metadata.get("imgsz", [640, 640])
+        self.image_size = (int(imgsz[0]), int(imgsz[1]))
+
+        batch_size, _, height, width = input_shape
+        # Модель с фиксированным батчем выполняется кусками этого размера
+        self.static_batch_size = batch_size if isinstance(batch_size, int) else None
+        # Модель с динамическим размером входа принимает letterbox с минимальными полями
+        self.dynamic_shape = not (isinstance(height, int) and isinstance(width, int))
+
+    def _infer(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        if self.static_batch_size is None or len(batch) == self.static_batch_size:
+            return self._infer(batch)
+        outputs = [
+            self._infer(batch[start:start + self.static_batch_size])
+            for start in range(0, len(batch), self.static_batch_size)
+        ]
+        return np.concatenate(outputs)
+
+    # --- Классификация ---
+
+    def classify(self, images: List[Image.Image]) -> List[Optional[int]]:
+        batch = np.stack([self._classification_input(image) for image in images])
+        probabilities = self._run(batch)
+        return probabilities.argmax(axis=1).tolist()
+
+    def _classification_input(self, image: Image.Image) -> np.ndarray:
+        """Resize по короткой стороне + CenterCrop + ToTensor (как classify_transforms)."""
+        size = self.image_size[0]
+        width, height = image.size
+        if width <= height:
+            new_size = (size, int(size * height / width))
+        else:
+            new_size = (int(size * width / height), size)
+        resized = image.convert("RGB").resize(new_size, Image.BILINEAR)
+        left = int(round((resized.width - size) / 2.0))
+        top = int(round((resized.height - size) / 2.0))
+        cropped = resized.crop((left, top, left + size, top + size))
+        return np.asarray(cropped, dtype=np.float32).transpose(2, 0, 1) / 255.0
+
+    # --- Детекция ---
+
+    def detect(self, images: List[Image.Image]) -> List[Detections]:
+        import cv2
+
+        arrays = [np.asarray(image.convert("RGB")) for image in images]
+        # Как в ultralytics: минимальные поля допустимы, только если все изображения одного размера
+        same_shapes = len({array.shape for array in arrays}) == 1
+        target = self._letterbox_shape(arrays[0].shape[:2], auto=self.dynamic_shape and same_shapes)
+
+        letterboxed = [_letterbox(cv2, array, target) for array in arrays]
+        batch = np.stack([array for array, _, _ in letterboxed])
+        batch = batch.transpose(0, 3, 1, 2).astype(np.float32) / 255.0
+
+        predictions = self._run(np.ascontiguousarray(batch))
+        return [
+            self._decode_detections(prediction, array.shape[:2], gain, padding)
+            for prediction, array, (_, gain, padding) in zip(predictions, arrays, letterboxed)
+        ]
+
+    def _letterbox_shape(self, shape: Tuple[int, int], auto: bool) -> Tuple[int, int]:
+        if not auto:
+            return self.image_size
+        height, width = shape
+        ratio = min(self.image_size[0] / height, self.image_size[1] / width)
+        new_height, new_width = round(height * ratio), round(width * ratio)
+        # Дополняем только до кратного шагу сети
+        return (
+            new_height + (self.image_size[0] - new_height) % self.stride,
+            new_width + (self.image_size[1] - new_width) % self.stride,
+        )
+
+    def _decode_detections(
+        self,
+        prediction: np.ndarray,
+        original_shape: Tuple[int, int],
+        gain: float,
+        padding: Tuple[int, int],
+    ) -> Detections:
+        """
+        Декодирует выход детектора (4 + число классов, число якорей):
+        порог уверенности, лучший класс на якорь и NMS внутри каждого класса.
+        """
+        prediction = prediction.T
+        scores = prediction[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+
+        mask = confidences > DEFAULT_CONF_THRESHOLD
+        if not mask.any():
+            return _empty_detections()
+
+        boxes = _xywh_to_xyxy(prediction[mask, :4])
+        confidences = confidences[mask].astype(np.float64)
+        class_ids = class_ids[mask].astype(np.int64)
+
+        offset_boxes = boxes + class_ids[:, None] * MAX_BOX_SIZE
+        keep = non_max_suppression(
+            offset_boxes, confidences, DEFAULT_IOU_THRESHOLD, MAX_NMS_CANDIDATES
+        )[:DEFAULT_MAX_DETECTIONS]
+
+        boxes = boxes[keep]
+        # Обратно в координаты исходного изображения
+        boxes[:, [0, 2]] -= padding[0]
+        boxes[:, [1, 3]] -= padding[1]
+        boxes /= gain
+        height, width = original_shape
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+
+        return Detections(boxes, confidences[keep], class_ids[keep])
+
+
+class OnnxYoloBackend(RawYoloBackend):
+    """Модель YOLO, экспортированная в ONNX, в ONNX Runtime."""
+
+    def __init__(self, model_path: str):
+        self.session = create_onnx_session(
+            model_path,
+            settings.ORT_INTRA_OP_THREADS,
+            settings.ORT_INTER_OP_THREADS,
+            settings.ORT_GRAPH_OPTIMIZATION,
+            settings.ORT_ENABLE_MEM_ARENA,
+        )
+        # ultralytics сохраняет имена классов, размер входа и шаг в метаданных модели
+        metadata = {
+            key: _parse_metadata_value(value)
+            for key, value in self.session.get_modelmeta().custom_metadata_map.items()
+        }
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        super().__init__(metadata, tuple(model_input.shape))
+
+    def _infer(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoYoloBackend(RawYoloBackend):
+    """Модель YOLO, экспортированная в OpenVINO IR (папка *_openvino_model или .xml)."""
+
+    def __init__(self, model_path: str):
+        import openvino
+        import yaml
+
+        if os.path.isdir(model_path):
+            model_dir = model_path
+            xml_files = [name for name in os.listdir(model_dir) if name.endswith(".xml")]
+            if not xml_files:
+                raise FileNotFoundError(f"No OpenVINO .xml model found in {model_dir}")
+            model_path = os.path.join(model_dir, xml_files[0])
+        else:
+            model_dir = os.path.dirname(model_path)
+
+        # ultralytics кладёт метаданные модели рядом с IR
+        with open(os.path.join(model_dir, "metadata.yaml")) as f:
+            metadata = yaml.safe_load(f)
+
+        core = openvino.Core()
+        model = core.read_model(model_path)
+        input_shape = tuple(
+            dimension.get_length() if dimension.is_static else None
+            for dimension in model.input(0).get_partial_shape()
+        )
+        self.compiled_model = core.compile_model(model, "CPU")
+        self.output = self.compiled_model.output(0)
+        super().__init__(metadata, input_shape)
+
+    def _infer(self, batch: np.ndarray) -> np.ndarray:
+        return self.compiled_model(batch)[self.output]
+
+
+def _letterbox(cv2, image: np.ndarray, target: Tuple[int, int]):
+    """
+    Масштабирует изображение с сохранением пропорций и дополняет серыми полями
+    до target (как LetterBox в ultralytics). Возвращает изображение, масштаб и поля.
+    """
+    height, width = image.shape[:2]
+    gain = min(target[0] / height, target[1] / width)
+    new_width, new_height = round(width * gain), round(height * gain)
+    pad_x, pad_y = (target[1] - new_width) / 2, (target[0] - new_height) / 2
+
+    if (width, height) != (new_width, new_height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    top, bottom = round(pad_y - 0.1), round(pad_y + 0.1)
+    left, right = round(pad_x - 0.1), round(pad_x + 0.1)
+    image = cv2.copyMakeBorder(
+        image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR
+    )
+    return image, gain, (left, top)
+
+
+def _xywh_to_xyxy(boxes: np.ndarray) -> np.ndarray:
+    half_size = boxes[:, 2:] / 2
+    return np.concatenate([boxes[:, :2] - half_size, boxes[:, :2] + half_size], axis=1)
+
+
+def _empty_detections() -> Detections:
+    return Detections(
+        np.empty((0, 4), dtype=np.float32),
+        np.empty(0, dtype=np.float64),
+        np.empty(0, dtype=np.int64),
+    )
+
+
+def _parse_metadata_value(value: str):
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value